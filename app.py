@@ -1,20 +1,28 @@
 import os
+import re
 import json
 import sys
+import mimetypes
 import time
+import atexit
 import random
+import threading
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory, abort
+from flask import Flask, render_template, request, jsonify, send_from_directory, abort, Response, stream_with_context
+from werkzeug.utils import safe_join
 import logging
 from logging.handlers import RotatingFileHandler
 
-# Add parent directory to path to import our modules
+# Add parent directory to path to import our modules. The pipeline modules
+# (and the pandas/cv2/MoviePy stack behind them) are imported by the stages
+# that use them, so workers that only serve status and video listings start fast.
 sys.path.append('/home/ubuntu')
-try:
-    from data_collection_module import CollegeDataScraper, CampusImageCollector, TrendingAudioTracker
-    from video_generation_module import RankingFormatter, VideoCompositionEngine, AudioIntegrationSystem
-except ImportError as e:
-    print(f"Error importing modules: {e}")
+from metrics_module import REGISTRY, span
+from profiling_module import JobProfiler
+from render_queue_module import PRIORITY_CLASSES
+from pipeline_module import (VIDEOS_DIR, METRICS_DIR, video_index, video_publisher, state_store, render_queue,
+                             category_registry, update_pipeline_status, reset_pipeline_status, new_ranking_formatter,
+                             new_video_engine, run_job)
 
 # Configure logging
 log_dir = '/home/ubuntu/web_interface/logs'
@@ -36,13 +44,55 @@ os.makedirs('/home/ubuntu/web_interface/static/videos', exist_ok=True)
 os.makedirs('/home/ubuntu/web_interface/static/images', exist_ok=True)
 os.makedirs('/home/ubuntu/web_interface/static/data', exist_ok=True)
 
-# Global variables to store pipeline state
-pipeline_status = {
-    "data_collection": "not_started",
-    "video_generation": "not_started",
-    "last_run": None,
-    "videos_generated": []
-}
+# Video delivery settings. Published video names embed a content hash, so
+# they can be cached forever. Behind nginx, set USE_X_ACCEL_REDIRECT=1 to hand
+# the file transfer to nginx's sendfile path instead of streaming it in Python.
+HASHED_VIDEO_PATTERN = re.compile(r'^video_[0-9a-f]{12}_[\w.-]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+USE_X_ACCEL_REDIRECT = os.environ.get('USE_X_ACCEL_REDIRECT') == '1'
+X_ACCEL_VIDEOS_PREFIX = '/internal/videos/'
+
+# Seconds between keepalive comments on idle status streams, and before a
+# status stream is closed so the worker thread holding it is freed; the
+# browser reconnects and resumes from Last-Event-ID
+STATUS_STREAM_KEEPALIVE = 15
+STATUS_STREAM_MAX_AGE = int(os.environ.get('STATUS_STREAM_MAX_AGE', '300'))
+
+def new_job_id():
+    """Unique id for a pipeline run"""
+    return f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{random.randint(1000, 9999)}"
+
+def get_status_events(since, timeout):
+    """
+    Return status events newer than `since`, waiting up to `timeout` seconds.
+    Returns None if `since` is older than the retained event window, in which
+    case the caller should resend a full snapshot.
+    """
+    return state_store.wait_for_events(since, timeout)
+
+def get_status_snapshot(job_id=None):
+    """Return a consistent copy of a job's (default: the current) pipeline status and its version"""
+    return state_store.get_snapshot(job_id)
+
+# Render mode. "inline" runs jobs inside the request; "queue" only enqueues
+# them for render_worker.py processes, on this node or others sharing the
+# data directories.
+RENDER_MODE = os.environ.get('RENDER_MODE', 'inline')
+REGISTRY.add_collector(render_queue.render_metrics)
+
+# Every web worker process shares its metrics, so a scrape of any one of
+# them reports totals for the whole service
+REGISTRY.share(METRICS_DIR)
+
+# Previews render inline on one shared low-resolution engine, so overlays,
+# backgrounds and prestarted encoders are kept between previews; the lock
+# serializes its use
+PREVIEWS_DIR = '/home/ubuntu/generated_videos/previews'
+preview_engine = None
+preview_lock = threading.Lock()
+
+# Profiles of jobs run inline with "profile": true are saved next to the final videos
+PROFILES_DIR = '/home/ubuntu/final_videos/profiles'
 
 # Default audio moods in case file loading fails
 DEFAULT_AUDIO_MOODS = {
@@ -134,101 +184,75 @@ def load_audio_tracks():
                 default_tracks.append({"name": track, "mood": mood})
         return default_tracks
 
-# Run the actual pipeline
-def run_actual_pipeline(selected_categories, selected_audio_mood):
-    try:
-        logger.info(f"Starting pipeline with categories: {selected_categories}, audio mood: {selected_audio_mood}")
-        
-        # Create output directories if they don't exist
-        os.makedirs('/home/ubuntu/college_data', exist_ok=True)
-        os.makedirs('/home/ubuntu/campus_images', exist_ok=True)
-        os.makedirs('/home/ubuntu/trending_audio', exist_ok=True)
-        os.makedirs('/home/ubuntu/formatted_rankings', exist_ok=True)
-        os.makedirs('/home/ubuntu/generated_videos', exist_ok=True)
-        os.makedirs('/home/ubuntu/final_videos', exist_ok=True)
-        
-        # Run data collection
-        logger.info("Starting data collection")
-        college_scraper = CollegeDataScraper()
-        college_scraper.run_all_scrapers()
-        
-        image_collector = CampusImageCollector()
-        image_collector.download_sample_images()
-        
-        audio_tracker = TrendingAudioTracker()
-        audio_tracker.collect_trending_audio()
-        logger.info("Data collection completed")
-        
-        # Format rankings
-        logger.info("Starting ranking formatting")
-        formatter = RankingFormatter()
-        formatter.format_all_rankings()
-        logger.info("Ranking formatting completed")
-        
-        # Generate videos for selected categories only
-        logger.info("Starting video generation")
-        video_engine = VideoCompositionEngine()
-        
-        # Get all available ranking files
-        ranking_files = [f for f in os.listdir('/home/ubuntu/formatted_rankings') if f.endswith('.json')]
-        
-        # Filter to only include selected categories
-        selected_ranking_files = []
-        for ranking_file in ranking_files:
-            # Extract category name from filename
-            category_name = ranking_file.replace('.json', '').replace('_', ' ').title()
-            
-            # Check if this category was selected
-            for selected_category in selected_categories:
-                if selected_category.lower() in category_name.lower():
-                    selected_ranking_files.append(ranking_file)
-                    break
-        
-        # Generate videos for selected categories
-        for ranking_file in selected_ranking_files:
-            video_engine.create_ranking_video(ranking_file, selected_audio_mood)
-        
-        logger.info("Video generation completed")
-        
-        # Add audio to videos
-        logger.info("Starting audio integration")
-        audio_system = AudioIntegrationSystem()
-        audio_system.process_all_videos()
-        logger.info("Audio integration completed")
-        
-        # Get list of generated videos
-        generated_videos = []
-        video_files = [f for f in os.listdir('/home/ubuntu/final_videos') if f.endswith('.txt')]
-        
-        for video_file in video_files:
-            # Extract category from filename
-            category = video_file.replace('_with_', ' ').replace('_audio.txt', '').replace('_', ' ').title()
-            
-            # Create video info
-            video_id = f"video_{int(time.time())}_{category.lower().replace(' ', '_')}"
-            video_info = {
-                "id": video_id,
-                "category": category,
-                "audio_mood": selected_audio_mood,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "url": f"/static/videos/{video_id}.txt"
-            }
-            
-            # Copy the video file to the web static directory
-            with open(os.path.join('/home/ubuntu/final_videos', video_file), 'r') as src_file:
-                content = src_file.read()
-                
-                with open(f"/home/ubuntu/web_interface/static/videos/{video_id}.txt", 'w') as dest_file:
-                    dest_file.write(content)
-            
-            generated_videos.append(video_info)
-        
-        logger.info(f"Pipeline completed successfully, generated {len(generated_videos)} videos")
-        return generated_videos
+def get_request_user():
+    """User a job is accounted to for fair-share scheduling"""
+    return request.headers.get('X-User-Id') or request.remote_addr or 'anonymous'
+
+def estimate_job_cost(params):
+    """Estimated render cost of a whole job, before its rankings are formatted"""
+    from video_generation_module import estimate_render_cost
     
-    except Exception as e:
-        logger.error(f"Error running pipeline: {e}")
-        return []
+    videos = len(params["categories"])
+    if "template_types" in params:
+        videos *= len(params["audio_moods"]) * len(params["template_types"])
+    return videos * estimate_render_cost(5)
+
+def profile_request_error(profile):
+    """Error response for a profiled job this server can't profile, or None"""
+    if profile and RENDER_MODE == 'queue':
+        return jsonify({"error": "Profiling is not available in queue mode, where render workers run the job"}), 400
+    return None
+
+def execute_job(job_id, params, profile=False):
+    """Run a (new or resumed) job and build the API response"""
+    # In queue mode the API server only enqueues; render workers run the job
+    if RENDER_MODE == 'queue':
+        render_queue.enqueue(job_id, "prepare", params, params.get("priority_class", "batch"),
+                             params.get("user_id", "anonymous"), estimate_job_cost(params))
+        logger.info(f"Queued pipeline {job_id} with {params}")
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
+    
+    logger.info(f"Starting pipeline {job_id} with {params}")
+    
+    # Run the actual pipeline, under the profiler only when asked to
+    profile_files = None
+    if profile:
+        profiler = JobProfiler(os.path.join(PROFILES_DIR, job_id))
+        with profiler:
+            generated_videos = run_job(job_id, params, profiler)
+        profile_files = profiler.save()
+        logger.info(f"Saved profile for {job_id} to {profiler.output_dir}")
+    else:
+        generated_videos = run_job(job_id, params)
+    
+    if generated_videos is None:
+        job = state_store.get_job(job_id)
+        if job["data_collection"] != "completed":
+            update_pipeline_status(job_id, data_collection="failed", video_generation="failed")
+        else:
+            update_pipeline_status(job_id, video_generation="failed")
+        return jsonify({
+            "error": "The pipeline failed; completed work was checkpointed",
+            "job_id": job_id,
+            "resume_url": f"/api/jobs/{job_id}/resume"
+        }), 500
+    
+    # Update status
+    update_pipeline_status(job_id, data_collection="completed", video_generation="completed")
+    
+    response = {
+        "status": "success",
+        "job_id": job_id,
+        "message": f"Generated {len(generated_videos)} videos",
+        "videos": generated_videos
+    }
+    if profile_files:
+        response["profile"] = profile_files
+    return jsonify(response)
 
 @app.route('/')
 def index():
@@ -261,7 +285,7 @@ def index():
         return render_template('index.html', 
                               categories=grouped_categories,
                               audio_tracks=grouped_tracks,
-                              pipeline_status=pipeline_status)
+                              pipeline_status=get_status_snapshot()[1])
     except Exception as e:
         logger.error(f"Error rendering index page: {e}")
         return "An error occurred while loading the page. Please check the logs for details.", 500
@@ -269,65 +293,361 @@ def index():
 @app.route('/api/status')
 def get_status():
     try:
-        return jsonify(pipeline_status)
+        version, snapshot = get_status_snapshot()
+        etag = f"status-{version}"
+        if etag in request.if_none_match:
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+        
+        snapshot["version"] = version
+        response = jsonify(snapshot)
+        response.set_etag(etag)
+        return response
     except Exception as e:
         logger.error(f"Error getting status: {e}")
         return jsonify({"error": "An error occurred while getting status"}), 500
 
+@app.route('/api/jobs/<job_id>')
+def get_job_status(job_id):
+    try:
+        job = state_store.get_job(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        return jsonify({"error": "An error occurred while getting the job"}), 500
+
+@app.route('/api/status/stream')
+def stream_status():
+    """
+    Server-Sent Events stream of status deltas, for every job or only the
+    one named by ?job_id=. Connections close after STATUS_STREAM_MAX_AGE.
+    """
+    job_id = request.args.get('job_id')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        since = None
+    
+    def format_event(version, delta):
+        return f"id: {version}\nevent: {delta['type']}\ndata: {json.dumps(delta)}\n\n"
+    
+    def generate():
+        version = since
+        deadline = time.monotonic() + STATUS_STREAM_MAX_AGE
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = None
+            if version is not None:
+                events = get_status_events(version, min(STATUS_STREAM_KEEPALIVE, remaining))
+            
+            if events is None:
+                # New client or one that fell behind the retained window
+                version, snapshot = get_status_snapshot(job_id)
+                yield format_event(version, {"type": "snapshot", "status": snapshot})
+            elif not events:
+                yield ": keepalive\n\n"
+            else:
+                matching = [(v, delta) for v, delta in events if job_id is None or delta.get("job_id") == job_id]
+                for event_version, delta in matching:
+                    yield format_event(event_version, delta)
+                version = events[-1][0]
+                if not matching or matching[-1][0] != version:
+                    # Advance the client's Last-Event-ID past other jobs' events
+                    yield f"id: {version}\n\n"
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={
+                        "Cache-Control": "no-cache",
+                        "X-Accel-Buffering": "no"
+                    })
+
 @app.route('/api/run_pipeline', methods=['POST'])
 def run_pipeline():
+    job_id = None
     try:
         data = request.json
         selected_categories = data.get('categories', [])
         selected_audio_mood = data.get('audio_mood', 'calm')
+        profile = bool(data.get('profile', False))
         
         if not selected_categories:
             return jsonify({"error": "No categories selected"}), 400
         
+        # Single-category runs are previews unless the caller says otherwise
+        priority_class = data.get('priority', 'preview' if len(selected_categories) == 1 else 'batch')
+        if priority_class not in PRIORITY_CLASSES:
+            return jsonify({"error": f"Unknown priority class: {priority_class}"}), 400
+        error = profile_request_error(profile)
+        if error:
+            return error
+        
         # Update status
-        pipeline_status["data_collection"] = "in_progress"
-        pipeline_status["video_generation"] = "not_started"
-        pipeline_status["last_run"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        pipeline_status["videos_generated"] = []
+        job_id = new_job_id()
+        params = {
+            "categories": selected_categories,
+            "audio_mood": selected_audio_mood,
+            "priority_class": priority_class,
+            "user_id": get_request_user()
+        }
+        reset_pipeline_status(job_id, params, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        
+        return execute_job(job_id, params, profile)
+    except Exception as e:
+        logger.error(f"Error running pipeline: {e}")
         
-        logger.info(f"Starting pipeline with categories: {selected_categories}, audio mood: {selected_audio_mood}")
+        # Update status to failed
+        if job_id:
+            update_pipeline_status(job_id, data_collection="failed", video_generation="failed")
         
-        # Run the actual pipeline
-        generated_videos = run_actual_pipeline(selected_categories, selected_audio_mood)
+        return jsonify({"error": f"An error occurred while running the pipeline: {str(e)}"}), 500
+
+@app.route('/api/run_batch', methods=['POST'])
+def run_batch():
+    from video_generation_module import RANKING_TEMPLATES
+    
+    job_id = None
+    try:
+        data = request.json
+        selected_categories = data.get('categories', [])
+        audio_moods = data.get('audio_moods', ['calm'])
+        template_types = data.get('template_types', ['standard'])
+        profile = bool(data.get('profile', False))
         
-        # Update status
-        pipeline_status["data_collection"] = "completed"
-        pipeline_status["video_generation"] = "completed"
-        pipeline_status["videos_generated"] = generated_videos
+        if not selected_categories:
+            return jsonify({"error": "No categories selected"}), 400
+        if not audio_moods or not template_types:
+            return jsonify({"error": "At least one audio mood and template type is required"}), 400
+        unknown_templates = [t for t in template_types if t not in RANKING_TEMPLATES]
+        if unknown_templates:
+            return jsonify({"error": f"Unknown template types: {', '.join(map(str, unknown_templates))}"}), 400
+        
+        priority_class = data.get('priority', 'batch')
+        if priority_class not in PRIORITY_CLASSES:
+            return jsonify({"error": f"Unknown priority class: {priority_class}"}), 400
+        error = profile_request_error(profile)
+        if error:
+            return error
+        
+        job_id = new_job_id()
+        params = {
+            "categories": selected_categories,
+            "audio_moods": audio_moods,
+            "template_types": template_types,
+            "priority_class": priority_class,
+            "user_id": get_request_user()
+        }
+        reset_pipeline_status(job_id, params, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        
+        return execute_job(job_id, params, profile)
+    except Exception as e:
+        logger.error(f"Error running batch: {e}")
+        
+        if job_id:
+            update_pipeline_status(job_id, data_collection="failed", video_generation="failed")
+        
+        return jsonify({"error": f"An error occurred while running the batch: {str(e)}"}), 500
+
+@app.route('/api/preview', methods=['POST'])
+def preview_video():
+    """
+    Render one category at preview resolution (270x480, 10fps) with the fast
+    preview encoder profile to check its layout and text. A later full render
+    reuses the preview's layout plan. Template variants are formatted in
+    memory, so a preview never writes ranking files. "aspects" adds extra
+    cuts (square, landscape), returned in aspect_urls.
+    """
+    global preview_engine
+    from video_generation_module import RANKING_TEMPLATES, ASPECT_FORMATS
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        category = data.get('category')
+        audio_mood = data.get('audio_mood', 'calm')
+        template_type = data.get('template_type')
+        aspects = data.get('aspects', [])
+        
+        if not category:
+            return jsonify({"error": "No category selected"}), 400
+        if template_type and template_type not in RANKING_TEMPLATES:
+            return jsonify({"error": f"Unknown template type: {template_type}"}), 400
+        if not isinstance(aspects, list):
+            return jsonify({"error": "aspects must be a list"}), 400
+        unknown_aspects = [a for a in aspects if a not in ASPECT_FORMATS]
+        if unknown_aspects:
+            return jsonify({"error": f"Unknown aspects: {', '.join(map(str, unknown_aspects))}"}), 400
+        
+        ranking_data = None
+        if template_type:
+            variant = new_ranking_formatter().build_variant(category, template_type)
+            if variant:
+                ranking_file, ranking_data = variant
+            else:
+                ranking_file = None
+        else:
+            ranking_file = category_registry.lookup(category)
+        if not ranking_file:
+            return jsonify({"error": "No formatted ranking for this category; run the pipeline first"}), 404
+        
+        start = time.perf_counter()
+        with preview_lock:
+            if preview_engine is None:
+                from encoder_module import EncoderPool
+                encoder_pool = EncoderPool()
+                atexit.register(encoder_pool.close)
+                preview_engine = new_video_engine(encoder_pool, output_dir=PREVIEWS_DIR, render_mode="preview")
+                preview_engine.render_mp4 = True
+            preview_engine.extra_aspects = aspects
+            output_name = f"{os.path.splitext(ranking_file)[0]}__preview"
+            with span("preview", logger):
+                rendered_video = preview_engine.create_ranking_video(ranking_file, audio_mood, output_name,
+                                                                     ranking_data)
+            if not rendered_video:
+                return jsonify({"error": "Preview render failed"}), 500
+            video_file = os.path.splitext(rendered_video)[0] + ".mp4"
+            poster_file, preview_file = preview_engine.get_thumbnail_paths(rendered_video)
+            
+            # Previews are published under content-hashed names like the
+            # videos, but are not added to the index. Publishing under the
+            # lock keeps the next preview from replacing the files meanwhile.
+            def publish_preview(path, kind, extension):
+                name = f"preview_{video_publisher.content_hash(path)[:12]}_{output_name}_{kind}.{extension}"
+                video_publisher.publish(path, name)
+                return f"/static/videos/{name}"
+            
+            urls = {f"{kind}_url": publish_preview(path, kind, extension)
+                    for kind, path, extension in (("video", video_file, "mp4"), ("poster", poster_file, "webp"),
+                                                  ("preview", preview_file, "webp"))}
+            urls["aspect_urls"] = {aspect: publish_preview(path, aspect, "mp4")
+                                   for aspect, path in preview_engine.get_aspect_outputs(video_file).items()
+                                   if aspect != "vertical"}
         
         return jsonify({
             "status": "success",
-            "message": f"Generated {len(generated_videos)} videos",
-            "videos": generated_videos
+            "category": category,
+            "render_mode": "preview",
+            "width": preview_engine.video_width,
+            "height": preview_engine.video_height,
+            "fps": preview_engine.fps,
+            "render_seconds": round(time.perf_counter() - start, 3),
+            **urls
         })
     except Exception as e:
-        logger.error(f"Error running pipeline: {e}")
-        
-        # Update status to failed
-        pipeline_status["data_collection"] = "failed"
-        pipeline_status["video_generation"] = "failed"
-        
-        return jsonify({"error": f"An error occurred while running the pipeline: {str(e)}"}), 500
+        logger.error(f"Error rendering preview: {e}")
+        return jsonify({"error": f"An error occurred while rendering the preview: {str(e)}"}), 500
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    try:
+        job = state_store.get_job(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        
+        data = request.get_json(silent=True) or {}
+        params = job["params"]
+        profile = bool(data.get('profile', False))
+        error = profile_request_error(profile)
+        if error:
+            return error
+        
+        summary = render_queue.get_job_summary(job_id)
+        if summary["queued"] or summary["leased"]:
+            return jsonify({"error": "Job is still queued or rendering"}), 409
+        render_queue.discard_failed(job_id)
+        
+        # Restarting keeps the job's checkpoints, so completed stages and
+        # already-rendered videos are skipped
+        reset_pipeline_status(job_id, params, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        
+        return execute_job(job_id, params, profile)
+    except Exception as e:
+        logger.error(f"Error resuming pipeline {job_id}: {e}")
+        update_pipeline_status(job_id, data_collection="failed", video_generation="failed")
+        return jsonify({"error": f"An error occurred while resuming the pipeline: {str(e)}"}), 500
 
 @app.route('/api/videos')
 def get_videos():
     try:
-        return jsonify({
-            "videos": pipeline_status["videos_generated"]
+        query = {
+            "limit": request.args.get('limit'),
+            "cursor": request.args.get('cursor'),
+            "category": request.args.get('category'),
+            "audio_mood": request.args.get('audio_mood') or request.args.get('mood'),
+            "since": request.args.get('since'),
+            "until": request.args.get('until')
+        }
+        
+        # The ETag only depends on the index version and the query, so
+        # unchanged pages are answered without touching the videos table
+        etag = video_index.get_etag(**query)
+        if etag in request.if_none_match:
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+        
+        try:
+            videos, next_cursor = video_index.list_videos(**query)
+        except ValueError:
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+        
+        response = jsonify({
+            "videos": videos,
+            "next_cursor": next_cursor
         })
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     except Exception as e:
         logger.error(f"Error getting videos: {e}")
         return jsonify({"error": "An error occurred while getting videos"}), 500
 
+@app.route('/metrics')
+def get_metrics():
+    try:
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return "An error occurred while rendering metrics", 500
+
+@app.route('/api/videos/<video_id>/thumb')
+def get_video_thumbnail(video_id):
+    try:
+        kind = request.args.get('kind', 'poster')
+        video_info = video_index.get_video(video_id)
+        if not video_info or kind not in video_info.get("thumbnails", {}):
+            abort(404)
+        
+        # Video ids embed a content hash, so a thumbnail never changes
+        response = send_from_directory(VIDEOS_DIR, video_info["thumbnails"][kind], conditional=True)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+    except Exception as e:
+        logger.error(f"Error serving thumbnail for {video_id}: {e}")
+        abort(404)
+
 @app.route('/static/videos/<path:filename>')
 def serve_video(filename):
     try:
-        return send_from_directory('/home/ubuntu/web_interface/static/videos', filename)
+        if USE_X_ACCEL_REDIRECT:
+            # nginx serves the bytes (including Range requests) from an
+            # internal location with sendfile; we only check the file exists
+            video_path = safe_join(VIDEOS_DIR, filename)
+            if video_path is None or not os.path.isfile(video_path):
+                abort(404)
+            response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = X_ACCEL_VIDEOS_PREFIX + filename
+        else:
+            # conditional=True answers Range requests with 206 Partial Content
+            response = send_from_directory(VIDEOS_DIR, filename, conditional=True)
+        
+        response.headers['Accept-Ranges'] = 'bytes'
+        if HASHED_VIDEO_PATTERN.match(filename):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         logger.error(f"Error serving video file {filename}: {e}")
         abort(404)
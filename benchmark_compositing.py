@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Compositing micro-benchmark for the AI Video Pipeline for College Rankings
+Composites the frames of one synthetic ranking video with the in-place uint8
+blending kernel (FrameCompositor into a reused buffer) and with MoviePy's
+CompositeVideoClip blit path, and records time and memory allocated per
+frame, plus the largest pixel difference between the two. The ring path is
+also timed with each transition between items, to show what they cost,
+and rendering every output aspect in one pass, against the vertical alone.
+
+Example:
+    python benchmark_compositing.py
+    python benchmark_compositing.py --render-mode preview --frames 300 --output compositing.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+sys.path.append('/home/ubuntu')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_pipeline import get_git_commit
+
+def get_ranking(items):
+    """Synthetic formatted ranking with the title, item and description overlays of a real one"""
+    return {
+        "title": f"Top {items} Synthetic Colleges",
+        "category": "Synthetic Colleges",
+        "count": items,
+        "items": [{"rank": i + 1, "text": f"#{i + 1}. Synthetic College {i + 1} - {100 - i}/100",
+                   "description": f"City {i + 1}, ST"} for i in range(items)]
+    }
+
+def get_frame_times(duration, fps, frames):
+    """frames timestamps spread over the video, so every overlay is on screen for some of them"""
+    total = int(duration * fps)
+    step = max(total // frames, 1)
+    return [n / fps for n in range(0, total, step)][:frames]
+
+def measure_path(render_frame, times, alloc_frames):
+    """Time render_frame over times, then trace the memory allocated per frame on a sample"""
+    render_frame(times[0])  # Warm caches outside the measurement
+    
+    start = time.perf_counter()
+    for t in times:
+        render_frame(t)
+    elapsed = time.perf_counter() - start
+    
+    # Peak traced allocation while rendering each frame, above what was live before it
+    allocated = 0
+    tracemalloc.start()
+    for t in times[:alloc_frames]:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        render_frame(t)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    sampled = min(alloc_frames, len(times))
+    
+    return {
+        "frames": len(times),
+        "ms_per_frame": elapsed / len(times) * 1000,
+        "fps": len(times) / elapsed if elapsed > 0 else None,
+        "alloc_kb_per_frame": allocated / sampled / 1024 if sampled else None
+    }
+
+def render_aspects(compositors, buffers):
+    """A frame renderer for several aspect compositors, each into its own buffer"""
+    def render_frame(t):
+        for compositor, buffer in zip(compositors, buffers):
+            compositor.render_into(t, buffer)
+    return render_frame
+
+def run_benchmark(render_mode, items, frames, alloc_frames, transitions):
+    """Composite the same frames with both paths and compare them"""
+    import numpy as np
+    from video_generation_module import VideoCompositionEngine, ASPECT_FORMATS
+    
+    work_dir = tempfile.mkdtemp(prefix="compositing_bench_")
+    try:
+        engine = VideoCompositionEngine(output_dir=work_dir, render_mode=render_mode)
+        ranking = get_ranking(items)
+        times = get_frame_times(engine.duration, engine.fps, frames)
+        
+        # The MoviePy path cuts between items, so paths are compared with cuts
+        engine.compositor = "ring"
+        engine.transition = "cut"
+        compositor = engine.compose_ranking_video(ranking)
+        buffer = np.empty((engine.video_height, engine.video_width, 3), dtype=np.uint8)
+        ring = measure_path(lambda t: compositor.render_into(t, buffer), times, alloc_frames)
+        
+        engine.compositor = "moviepy"
+        clip = engine.compose_ranking_video(ranking)
+        moviepy = measure_path(clip.get_frame, times, alloc_frames)
+        
+        # Both paths round differently, so frames should match to within a level or two
+        max_diff = 0
+        for t in times:
+            diff = np.abs(compositor.get_frame(t).astype(np.int16) - clip.get_frame(t).astype(np.int16))
+            max_diff = max(max_diff, int(diff.max()))
+        
+        engine.compositor = "ring"
+        paths = {"ring": ring, "moviepy": moviepy}
+        for transition in transitions:
+            engine.transition = transition
+            transitioned = engine.compose_ranking_video(ranking)
+            paths[f"ring+{transition}"] = measure_path(lambda t: transitioned.render_into(t, buffer), times,
+                                                       alloc_frames)
+        
+        # With cuts, so it compares against the plain ring path
+        engine.transition = "cut"
+        aspects = engine.compose_ranking_video(ranking, list(ASPECT_FORMATS))
+        buffers = [np.empty((c.height, c.width, 3), dtype=np.uint8) for c in aspects.values()]
+        paths[f"ring x{len(aspects)} aspects"] = measure_path(render_aspects(list(aspects.values()), buffers), times,
+                                                              alloc_frames)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        "render_mode": render_mode,
+        "width": engine.video_width,
+        "height": engine.video_height,
+        "items": items,
+        "paths": paths,
+        "speedup": moviepy["ms_per_frame"] / ring["ms_per_frame"],
+        "max_pixel_diff": max_diff
+    }
+
+def print_result(result):
+    """Print a human-readable table for one render mode"""
+    print(f"\n{result['render_mode']} ({result['width']}x{result['height']}, {result['items']} items)")
+    print(f"  {'path':<18}{'ms/frame':>10}{'fps':>10}{'alloc KB/frame':>16}")
+    for path, r in result["paths"].items():
+        print(f"  {path:<18}{r['ms_per_frame']:>10.3f}{r['fps']:>10.1f}{r['alloc_kb_per_frame']:>16.1f}")
+    print(f"  speedup {result['speedup']:.1f}x, max pixel difference {result['max_pixel_diff']}")
+
+def main():
+    """Run the compositing micro-benchmark and write machine-readable results"""
+    parser = argparse.ArgumentParser(description="Benchmark overlay compositing paths")
+    parser.add_argument("--render-mode", nargs="+", default=["full", "preview"], help="Render modes to measure")
+    parser.add_argument("--items", type=int, default=5, help="Ranked items shown in the video")
+    parser.add_argument("--frames", type=int, default=120, help="Frames timed per path")
+    parser.add_argument("--transitions", nargs="*", default=["crossfade", "slide", "wipe"],
+                        help="Transitions to time the ring path with")
+    parser.add_argument("--alloc-frames", type=int, default=20, help="Frames traced for allocations per path")
+    parser.add_argument("--output", default="compositing_bench.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+    
+    report = {
+        "commit": get_git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "results": []
+    }
+    for render_mode in args.render_mode:
+        result = run_benchmark(render_mode, args.items, args.frames, args.alloc_frames, args.transitions)
+        report["results"].append(result)
+        print_result(result)
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
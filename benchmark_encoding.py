@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Encoding benchmark for the AI Video Pipeline for College Rankings
+Encodes a synthetic ranking video with each encoder profile (libx264 on
+the CPU, no hardware encoders) and records encode fps and file size, then
+encodes the same videos again through an EncoderPool to show what
+pre-started encoders save per video.
+
+Example:
+    python benchmark_encoding.py
+    python benchmark_encoding.py --profiles publish archive --videos 5 --output encoding.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.append('/home/ubuntu')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_pipeline import get_git_commit
+from benchmark_compositing import get_ranking
+
+def time_encodes(engine, compositor, work_dir, label, videos):
+    """Encode the compositor `videos` times; returns the seconds each encode took and the last file's size"""
+    seconds = []
+    for n in range(videos):
+        output_file = os.path.join(work_dir, f"{label}_{n}.mp4")
+        start = time.perf_counter()
+        engine.write_video_file(compositor, output_file)
+        seconds.append(time.perf_counter() - start)
+    return seconds, os.path.getsize(output_file)
+
+def run_benchmark(render_mode, profile, items, videos):
+    """Encode videos with one profile, with fresh and with pooled encoders"""
+    from video_generation_module import VideoCompositionEngine
+    from encoder_module import EncoderPool
+    
+    work_dir = tempfile.mkdtemp(prefix="encoding_bench_")
+    try:
+        engine = VideoCompositionEngine(output_dir=work_dir, render_mode=render_mode)
+        engine.encoder_profile = profile
+        compositor = engine.compose_ranking_video(get_ranking(items))
+        frames = compositor.frame_count(engine.fps)
+        
+        cold, size = time_encodes(engine, compositor, work_dir, "cold", videos)
+        
+        with EncoderPool() as pool:
+            engine.encoder_pool = pool
+            pool.prewarm(work_dir, engine.video_width, engine.video_height, engine.fps, profile,
+                         engine.video_codec, engine.ffmpeg_params)
+            pooled, _ = time_encodes(engine, compositor, work_dir, "pooled", videos)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    cold_mean = sum(cold) / len(cold)
+    pooled_mean = sum(pooled) / len(pooled)
+    return {
+        "render_mode": render_mode,
+        "profile": profile,
+        "width": engine.video_width,
+        "height": engine.video_height,
+        "frames": frames,
+        "encode_fps": frames / cold_mean,
+        "file_bytes": size,
+        "kbps": size * 8 / engine.duration / 1000,
+        "seconds_per_video": cold_mean,
+        "pooled_seconds_per_video": pooled_mean,
+        "pool_saving_ms": (cold_mean - pooled_mean) * 1000
+    }
+
+def print_results(results):
+    """Print a human-readable table of every profile measured"""
+    print(f"\n{'mode':<9}{'profile':<9}{'encode fps':>12}{'size KB':>10}{'kbps':>9}{'s/video':>9}"
+          f"{'pooled s':>10}{'saved ms':>10}")
+    for r in results:
+        print(f"{r['render_mode']:<9}{r['profile']:<9}{r['encode_fps']:>12.1f}{r['file_bytes'] / 1024:>10.1f}"
+              f"{r['kbps']:>9.0f}{r['seconds_per_video']:>9.2f}{r['pooled_seconds_per_video']:>10.2f}"
+              f"{r['pool_saving_ms']:>10.0f}")
+
+def main():
+    """Run the encoding benchmark and write machine-readable results"""
+    parser = argparse.ArgumentParser(description="Benchmark encoder profiles and the encoder pool")
+    parser.add_argument("--render-mode", nargs="+", default=["full"], help="Render modes to measure")
+    parser.add_argument("--profiles", nargs="+", default=["preview", "publish", "archive"],
+                        help="Encoder profiles to measure")
+    parser.add_argument("--items", type=int, default=5, help="Ranked items shown in the video")
+    parser.add_argument("--videos", type=int, default=3, help="Videos encoded per profile, fresh and pooled")
+    parser.add_argument("--output", default="encoding_bench.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+    
+    report = {
+        "commit": get_git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "cpu_count": os.cpu_count(),
+        "results": []
+    }
+    for render_mode in args.render_mode:
+        for profile in args.profiles:
+            report["results"].append(run_benchmark(render_mode, profile, args.items, args.videos))
+    print_results(report["results"])
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
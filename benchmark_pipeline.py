@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the AI Video Pipeline for College Rankings
+Runs the scrape, format, render and audio stages against synthetic data and
+records wall time, CPU time, peak RSS and frames per second for each stage.
+
+Example:
+    python benchmark_pipeline.py --rankings 10 1000 --videos 1 50 --output bench.json
+    python benchmark_pipeline.py --rankings 1000 --videos 50 --baseline bench.json --threshold 0.15
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+sys.path.append('/home/ubuntu')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ["scrape", "format", "render", "audio"]
+
+# Metrics compared against the baseline; lower is better for all of them
+REGRESSION_METRICS = ["wall_s", "cpu_s", "peak_rss_mb"]
+
+# Import-time budgets in seconds. Web workers import app, which adds only
+# Flask to the modules below; pipeline_module is also all a render worker
+# imports at startup. None of them may pull in pandas, cv2 or MoviePy.
+IMPORT_BUDGETS = {
+    "pipeline_module": 0.3,
+    "profiling_module": 0.05,
+    "video_generation_module": 0.1,
+    "data_collection_module": 0.1
+}
+
+# Modules that must not be loaded as a side effect of importing these
+HEAVY_MODULES = ["numpy", "cv2", "moviepy", "pandas", "bs4", "PIL"]
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": elapsed,
+    "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules]
+}}))
+"""
+
+def get_dirs(work_dir):
+    """Directory layout used by one benchmark run"""
+    return {
+        "college_data": os.path.join(work_dir, "college_data"),
+        "formatted_rankings": os.path.join(work_dir, "formatted_rankings"),
+        "campus_images": os.path.join(work_dir, "campus_images"),
+        "trending_audio": os.path.join(work_dir, "trending_audio"),
+        "generated_videos": os.path.join(work_dir, "generated_videos"),
+        "final_videos": os.path.join(work_dir, "final_videos")
+    }
+
+def get_category_name(index):
+    """Synthetic category names, cycling through the keywords the renderer styles"""
+    keywords = ["Most Beautiful", "Best Food", "Best Dorm", "Ivy League", "Top"]
+    return f"{keywords[index % len(keywords)]} Synthetic Colleges {index + 1:03d}"
+
+def stage_scrape(dirs, rankings, videos):
+    """Write synthetic raw ranking files, as the scrapers do"""
+    os.makedirs(dirs["college_data"], exist_ok=True)
+    rng = random.Random(42)
+    for v in range(videos):
+        data = []
+        for r in range(rankings):
+            data.append({
+                "rank": r + 1,
+                "name": f"Synthetic College {v + 1}-{r + 1}",
+                "location": f"City {rng.randint(1, 500)}, ST",
+                "score": max(0, 100 - r * 100 // max(rankings, 1))
+            })
+        with open(os.path.join(dirs["college_data"], f"synthetic_{v:04d}.json"), 'w') as f:
+            json.dump(data, f, indent=4)
+    return {"items": rankings * videos}
+
+def stage_format(dirs, rankings, videos):
+    """Format every synthetic ranking with RankingFormatter"""
+    from video_generation_module import RankingFormatter
+    
+    formatter = RankingFormatter(data_dir=dirs["college_data"], output_dir=dirs["formatted_rankings"])
+    formatter.format_rankings((formatter.load_ranking_data(f"synthetic_{v:04d}.json"), get_category_name(v),
+                               "score_based" if v % 2 else "standard", rankings)
+                              for v in range(videos))
+    return {"items": rankings * videos}
+
+def stage_render(dirs, rankings, videos, render_mp4=False):
+    """Render one video per formatted ranking with VideoCompositionEngine"""
+    from video_generation_module import VideoCompositionEngine
+    from metrics_module import FRAME_BYTES_ALLOCATED
+    
+    engine = VideoCompositionEngine(rankings_dir=dirs["formatted_rankings"],
+                                    images_dir=dirs["campus_images"],
+                                    audio_dir=dirs["trending_audio"],
+                                    output_dir=dirs["generated_videos"])
+    engine.render_mp4 = render_mp4
+    
+    rendered = 0
+    for ranking_file in sorted(os.listdir(dirs["formatted_rankings"])):
+        if ranking_file.endswith('.json') and engine.create_ranking_video(ranking_file, "calm"):
+            rendered += 1
+    
+    # Frames produced per video: the full encode, or only the thumbnail samples
+    if render_mp4:
+        frames_per_video = engine.fps * engine.duration
+    else:
+        frames_per_video = 1 + int(engine.duration * engine.preview_fps)
+    
+    # Frame memory allocated by the compositor: the frame ring once, plus
+    # one frame per thumbnail sample
+    allocated = FRAME_BYTES_ALLOCATED.get(path="ring") + FRAME_BYTES_ALLOCATED.get(path="sampled")
+    return {"items": rendered, "frames": rendered * frames_per_video, "frame_alloc_mb": allocated / (1024 * 1024)}
+
+def stage_audio(dirs, rankings, videos):
+    """Add audio to every rendered video with AudioIntegrationSystem"""
+    from video_generation_module import AudioIntegrationSystem
+    
+    audio_system = AudioIntegrationSystem(audio_dir=dirs["trending_audio"],
+                                          videos_dir=dirs["generated_videos"],
+                                          output_dir=dirs["final_videos"])
+    return {"items": len(audio_system.process_all_videos())}
+
+def run_stage_in_child(stage, dirs, rankings, videos, render_mp4, results):
+    """Run one stage and report its measurements; executed in a forked child"""
+    # Silence the per-item progress output of the pipeline modules
+    sys.stdout = open(os.devnull, 'w')
+    
+    # The audio library is setup, not part of the measured work
+    if stage == "audio" and not os.path.exists(os.path.join(dirs["trending_audio"], "metadata.json")):
+        from data_collection_module import TrendingAudioTracker
+        TrendingAudioTracker(output_dir=dirs["trending_audio"]).collect_trending_audio()
+    
+    stage_functions = {
+        "scrape": stage_scrape,
+        "format": stage_format,
+        "render": lambda d, r, v: stage_render(d, r, v, render_mp4),
+        "audio": stage_audio
+    }
+    
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        counts = stage_functions[stage](dirs, rankings, videos)
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    
+    result = {"wall_s": wall, "cpu_s": cpu, "peak_rss_mb": peak_rss_mb}
+    result.update(counts)
+    if "frames" in counts and wall > 0:
+        result["fps"] = counts["frames"] / wall
+    results.put(result)
+
+def measure_stage(stage, dirs, rankings, videos, render_mp4):
+    """
+    Run a stage in a fresh forked process so peak RSS is attributable to that
+    stage alone. Stages only communicate through files, so this is safe.
+    """
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=run_stage_in_child,
+                              args=(stage, dirs, rankings, videos, render_mp4, results))
+    process.start()
+    result = results.get()
+    process.join()
+    if "error" in result:
+        raise RuntimeError(f"Stage {stage} failed: {result['error']}")
+    return result
+
+def run_benchmark(rankings, videos, repeat=1, render_mp4=False, keep=False):
+    """Benchmark all stages for one data size; repeated runs keep the best time"""
+    work_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    dirs = get_dirs(work_dir)
+    stages = {}
+    
+    try:
+        for attempt in range(repeat):
+            # Start every attempt from empty output directories
+            for directory in dirs.values():
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory, exist_ok=True)
+            
+            for stage in STAGES:
+                result = measure_stage(stage, dirs, rankings, videos, render_mp4)
+                best = stages.get(stage)
+                if best is None or result["wall_s"] < best["wall_s"]:
+                    stages[stage] = result
+    finally:
+        if keep:
+            print(f"Kept benchmark data in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        "rankings": rankings,
+        "videos": videos,
+        "render_mp4": render_mp4,
+        "stages": stages,
+        "total_wall_s": sum(s["wall_s"] for s in stages.values())
+    }
+
+def measure_imports(budgets=IMPORT_BUDGETS):
+    """Import each module in a fresh interpreter and check it against its budget"""
+    results = {}
+    path = os.path.dirname(os.path.abspath(__file__))
+    for module, budget in budgets.items():
+        probe = IMPORT_PROBE.format(path=path, module=module, heavy=HEAVY_MODULES)
+        completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True)
+        if completed.returncode == 0:
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+        else:
+            stderr_lines = completed.stderr.strip().splitlines()
+            result = {"error": stderr_lines[-1] if stderr_lines else f"exit status {completed.returncode}"}
+        result["budget_s"] = budget
+        result["within_budget"] = ("import_s" in result and result["import_s"] <= budget
+                                   and not result["heavy_modules"])
+        results[module] = result
+    return results
+
+def print_imports(imports):
+    """Print the import-time table"""
+    print(f"\n  {'module':<26}{'import s':>10}{'budget s':>10}{'rss MB':>10}  heavy modules")
+    for module, result in imports.items():
+        if "error" in result:
+            print(f"  {module:<26}{'error':>10}{result['budget_s']:>10.2f}  {result['error']}")
+            continue
+        flag = "" if result["within_budget"] else "  OVER BUDGET"
+        heavy = ", ".join(result["heavy_modules"]) or "-"
+        print(f"  {module:<26}{result['import_s']:>10.3f}{result['budget_s']:>10.2f}"
+              f"{result['peak_rss_kb'] / 1024:>10.1f}  {heavy}{flag}")
+
+def get_git_commit():
+    """Current git commit, so results can be compared across commits"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def compare_with_baseline(report, baseline, threshold):
+    """Return a list of regressions beyond `threshold` (0.1 = 10% slower)"""
+    baseline_runs = {(r["rankings"], r["videos"], r.get("render_mp4", False)): r for r in baseline["runs"]}
+    regressions = []
+    
+    for run in report["runs"]:
+        base_run = baseline_runs.get((run["rankings"], run["videos"], run["render_mp4"]))
+        if not base_run:
+            continue
+        for stage, result in run["stages"].items():
+            base_result = base_run["stages"].get(stage)
+            if not base_result:
+                continue
+            for metric in REGRESSION_METRICS:
+                old, new = base_result.get(metric), result.get(metric)
+                if old and new and new > old * (1 + threshold):
+                    regressions.append({
+                        "rankings": run["rankings"],
+                        "videos": run["videos"],
+                        "stage": stage,
+                        "metric": metric,
+                        "baseline": old,
+                        "current": new,
+                        "change": new / old - 1
+                    })
+    
+    return regressions
+
+def print_run(run):
+    """Print a human-readable table for one run"""
+    print(f"\n{run['rankings']} rankings x {run['videos']} videos (render_mp4={run['render_mp4']})")
+    print(f"  {'stage':<8}{'wall s':>10}{'cpu s':>10}{'rss MB':>10}{'items':>8}{'fps':>10}{'alloc MB':>10}")
+    for stage in STAGES:
+        s = run["stages"][stage]
+        fps = f"{s['fps']:.1f}" if "fps" in s else "-"
+        alloc = f"{s['frame_alloc_mb']:.1f}" if "frame_alloc_mb" in s else "-"
+        print(f"  {stage:<8}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}{s['peak_rss_mb']:>10.1f}{s['items']:>8}{fps:>10}"
+              f"{alloc:>10}")
+
+def main():
+    """Run the benchmark matrix and write machine-readable results"""
+    parser = argparse.ArgumentParser(description="Benchmark the college rankings video pipeline")
+    parser.add_argument("--rankings", type=int, nargs="+", default=[10],
+                        help="Ranked items per ranking list (10 to 10000)")
+    parser.add_argument("--videos", type=int, nargs="+", default=[1],
+                        help="Ranking lists, and so videos, per run (1 to 500)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat each run and keep the best time")
+    parser.add_argument("--render-mp4", action="store_true", help="Encode MP4 files, not just placeholders")
+    parser.add_argument("--output", default="bench_output.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated benchmark data")
+    parser.add_argument("--imports-only", action="store_true", help="Only check the import-time budgets")
+    args = parser.parse_args()
+    
+    report = {
+        "commit": get_git_commit(),
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "imports": measure_imports(),
+        "runs": []
+    }
+    print_imports(report["imports"])
+    
+    exit_code = 0
+    if not all(result["within_budget"] for result in report["imports"].values()):
+        exit_code = 1
+    
+    for rankings in ([] if args.imports_only else args.rankings):
+        for videos in args.videos:
+            run = run_benchmark(rankings, videos, args.repeat, args.render_mp4, args.keep)
+            report["runs"].append(run)
+            print_run(run)
+    
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("commit")
+        report["regressions"] = compare_with_baseline(report, baseline, args.threshold)
+        
+        if report["regressions"]:
+            exit_code = 1
+            print(f"\n{len(report['regressions'])} regressions beyond {args.threshold:.0%}:")
+            for r in report["regressions"]:
+                print(f"  {r['rankings']}x{r['videos']} {r['stage']} {r['metric']}: "
+                      f"{r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.0%})")
+        else:
+            print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+    
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
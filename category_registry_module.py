@@ -0,0 +1,47 @@
+import re
+from record_stream_module import JsonlWriter, JsonlIndex
+
+
+def category_id(category):
+    """Canonical id of a category name: "Best Campus Food" -> "best_campus_food" """
+    return re.sub(r"[^a-z0-9]+", "_", category.lower()).strip("_")
+
+
+class CategoryRegistry:
+    """
+    Maps canonical category ids to the formatted ranking each category is
+    rendered from. Entries are appended to a JSON Lines file by the
+    formatter (the latest entry per category wins) and looked up through a
+    byte-offset index, so selecting a category is an exact, constant-time
+    lookup however many categories there are.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.index = JsonlIndex(path)
+    
+    def entry(self, category, ranking_file, template_type):
+        """Registry record for a category's formatted ranking"""
+        return {"id": category_id(category), "category": category, "ranking_file": ranking_file,
+                "template_type": template_type}
+    
+    def register(self, entries, replace=False):
+        """
+        Point categories at their newly formatted rankings; entries come from
+        entry(). replace swaps in a registry of just these entries.
+        """
+        with JsonlWriter(self.path, replace=replace) as writer:
+            for entry in entries:
+                writer.write(entry)
+    
+    def get(self, category):
+        """Registry record for a category name or id, or None"""
+        return self.index.get(category_id(category))
+    
+    def lookup(self, category):
+        """Ranking file (or stream record id) for a category name or id, or None"""
+        entry = self.get(category)
+        return entry["ranking_file"] if entry else None
+    
+    def categories(self):
+        """Ids of the registered categories, in the order they were first formatted"""
+        return self.index.keys()
@@ -0,0 +1,368 @@
+import queue
+import shutil
+import threading
+import subprocess
+from collections import namedtuple
+from metrics_module import FRAME_BYTES_ALLOCATED
+from transition_module import fade_tables
+
+
+def ffmpeg_binary():
+    """ffmpeg executable: the one bundled with imageio-ffmpeg (installed with MoviePy), else from PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+class FrameRing:
+    """
+    A fixed ring of preallocated RGB frame buffers shared by a compositor and
+    an encoder. The compositor acquires a free slot, composites into it in
+    place and submits it; the encoder writes it out and releases it. Buffers
+    are allocated once, so rendering allocates no frame memory per frame, and
+    a compositor that gets a full ring ahead of the encoder waits for it.
+    """
+    def __init__(self, width, height, slots=3):
+        import numpy as np
+        
+        self.width = width
+        self.height = height
+        self.buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(slots)]
+        FRAME_BYTES_ALLOCATED.inc(sum(buffer.nbytes for buffer in self.buffers), path="ring")
+        
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.filled = queue.Queue()
+    
+    def acquire(self):
+        """Wait for a free slot; returns (slot, buffer)"""
+        slot = self.free.get()
+        return slot, self.buffers[slot]
+    
+    def submit(self, slot):
+        """Hand a composited slot to the encoder"""
+        self.filled.put(slot)
+    
+    def next_filled(self):
+        """Wait for the next submitted slot; None once the compositor is done"""
+        return self.filled.get()
+    
+    def release(self, slot):
+        """Return a written slot to the compositor"""
+        self.free.put(slot)
+    
+    def finish(self):
+        """Tell the encoder side that no more slots will be submitted"""
+        self.filled.put(None)
+
+
+def crop_canvas(canvas, width, height):
+    """Centered width x height view of a larger canvas; no pixels are copied"""
+    y = (canvas.shape[0] - height) // 2
+    x = (canvas.shape[1] - width) // 2
+    return canvas[y:y + height, x:x + width]
+
+
+def prepare_overlay(alpha, color):
+    """
+    Premultiplied overlay of a solid color through a uint8 coverage mask,
+    cropped to its visible pixels. Returns (premultiplied, inverse_alpha,
+    x_offset, y_offset), or None when nothing is visible. Done once per
+    overlay, so blending never converts or scales per frame.
+    """
+    import numpy as np
+    
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if not rows.size:
+        return None
+    y0, y1, x0, x1 = int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+    
+    coverage = alpha[y0:y1, x0:x1, np.newaxis]
+    premultiplied = ((coverage.astype(np.uint16) * np.array(color, dtype=np.uint16) + 127) // 255).astype(np.uint8)
+    inverse_alpha = np.subtract(255, coverage, dtype=np.uint8)
+    premultiplied.flags.writeable = False
+    inverse_alpha.flags.writeable = False
+    return premultiplied, inverse_alpha, x0, y0
+
+
+class AlphaBlender:
+    """
+    Blends premultiplied uint8 overlays into frames in place with integer
+    math: dst = premultiplied + dst * (255 - alpha) / 255, where the division
+    is the exact rounding (x + 128 + ((x + 128) >> 8)) >> 8. Every step is an
+    in-place NumPy ufunc on uint16 scratch buffers sized to the largest band
+    seen, so blending allocates nothing per frame and never touches floats.
+    """
+    def __init__(self):
+        self.product = None
+        self.carry = None
+        self.faded_pixels = None
+        self.faded_inverse = None
+    
+    def _scratch(self, height, width):
+        import numpy as np
+        
+        if self.product is None or self.product.shape[0] < height or self.product.shape[1] < width:
+            shape = (max(height, 0 if self.product is None else self.product.shape[0]),
+                     max(width, 0 if self.product is None else self.product.shape[1]), 3)
+            self.product = np.empty(shape, dtype=np.uint16)
+            self.carry = np.empty(shape, dtype=np.uint16)
+            FRAME_BYTES_ALLOCATED.inc(self.product.nbytes + self.carry.nbytes, path="scratch")
+        return self.product[:height, :width], self.carry[:height, :width]
+    
+    def blend(self, dst, premultiplied, inverse_alpha):
+        """Blend an overlay into dst, a uint8 view of the same height and width, in place"""
+        import numpy as np
+        
+        product, carry = self._scratch(*dst.shape[:2])
+        np.multiply(dst, inverse_alpha, out=product, dtype=np.uint16)
+        product += 128
+        np.right_shift(product, 8, out=carry)
+        product += carry
+        product >>= 8
+        product += premultiplied
+        np.copyto(dst, product, casting="unsafe")
+        return dst
+    
+    def blend_faded(self, dst, premultiplied, inverse_alpha, weight):
+        """
+        blend() with the overlay's opacity scaled by weight (0..255), faded
+        through transition_module.fade_tables() into uint8 scratch buffers
+        """
+        import numpy as np
+        
+        height, width = premultiplied.shape[:2]
+        size = height * width * 3
+        if self.faded_pixels is None or self.faded_pixels.size < size:
+            # Flat, so a prefix reshapes to a C-contiguous buffer of any band shape
+            self.faded_pixels = np.empty(size, dtype=np.uint8)
+            self.faded_inverse = np.empty(size // 3, dtype=np.uint8)
+            FRAME_BYTES_ALLOCATED.inc(self.faded_pixels.nbytes + self.faded_inverse.nbytes, path="scratch")
+        pixels = self.faded_pixels[:size].reshape(premultiplied.shape)
+        inverse = self.faded_inverse[:size // 3].reshape(inverse_alpha.shape)
+        
+        scale, inverse_scale = fade_tables()
+        np.take(scale[weight], premultiplied, out=pixels, mode="clip")
+        np.take(inverse_scale[weight], inverse_alpha, out=inverse, mode="clip")
+        return self.blend(dst, pixels, inverse)
+
+
+# An overlay as composited: shown from start to end, entering or leaving
+# through the compositor's transition at its cut times, and clipped to the
+# frame for the frames in between (placed is None when entirely off-frame)
+Layer = namedtuple("Layer", ["start", "end", "enters", "leaves", "cut", "image", "inverse_alpha", "x", "y",
+                             "placed"])
+
+
+class FrameCompositor:
+    """
+    Composites a still background and timed overlays into frame buffers
+    owned by the caller. Layers are prepared once per video, and a frame is
+    one copy of the background plus, per visible overlay, a slice copy
+    (opaque) or an AlphaBlender pass over just the overlay's band, with no
+    per-frame allocation. get_frame() allocates, for the few frames sampled
+    for thumbnails, so a compositor can stand in for a MoviePy clip there.
+    """
+    def __init__(self, background, overlays, duration, blender=None, transition=None):
+        """
+        overlays are (image, inverse_alpha, start, end, x, y), with image
+        premultiplied, or inverse_alpha None for an opaque image. Later
+        overlays are drawn on top. With a transition_module.Transition,
+        blended overlays enter at their start (after the first frame) and
+        leave at their end (before the last), the leaving one held for the
+        transition so it overlaps the one replacing it; opaque ones cut.
+        """
+        self.background = background
+        self.height, self.width = background.shape[:2]
+        self.duration = duration
+        self.blender = blender or AlphaBlender()
+        self.transition = transition
+        
+        self.layers = []
+        for image, inverse_alpha, start, end, x, y in overlays:
+            transitions = transition is not None and inverse_alpha is not None
+            enters = transitions and start > 0
+            leaves = transitions and end < duration
+            placed = self.place(image, inverse_alpha, x, y)
+            if placed is None and not (enters or leaves):
+                continue
+            self.layers.append(Layer(start, end + transition.duration if leaves else end, enters, leaves, end,
+                                     image, inverse_alpha, x, y, placed))
+    
+    def place(self, image, inverse_alpha, x, y):
+        """Clip an overlay at (x, y) to the frame: (region, pixels, inverse alpha), or None if off-frame"""
+        height, width = image.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        crop = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        return ((slice(y0, y1), slice(x0, x1)), image[crop],
+                None if inverse_alpha is None else inverse_alpha[crop])
+    
+    def frame_count(self, fps):
+        """Frames in the video at fps"""
+        return int(self.duration * fps)
+    
+    def draw(self, frame, placed, weight=255):
+        """Draw a placed overlay into frame at an opacity of weight (0..255)"""
+        region, pixels, inverse_alpha = placed
+        if inverse_alpha is None:
+            frame[region] = pixels
+        elif weight == 255:
+            self.blender.blend(frame[region], pixels, inverse_alpha)
+        elif weight:
+            self.blender.blend_faded(frame[region], pixels, inverse_alpha, weight)
+    
+    def draw_transition(self, frame, layer, state):
+        """Draw a layer mid-transition: faded, shifted and/or cut to the state's columns"""
+        weight, shift, (reveal_from, reveal_to) = state
+        width = layer.image.shape[1]
+        c0, c1 = int(reveal_from * width), int(reveal_to * width)
+        if c1 <= c0:
+            return
+        x = layer.x + c0 + round(shift * self.width)
+        placed = self.place(layer.image[:, c0:c1], layer.inverse_alpha[:, c0:c1], x, layer.y)
+        if placed is not None:
+            self.draw(frame, placed, weight)
+    
+    def render_into(self, t, frame):
+        """Composite the frame at time t into frame (height x width x 3, uint8) in place"""
+        frame[...] = self.background
+        transition = self.transition
+        for layer in self.layers:
+            if not layer.start <= t < layer.end:
+                continue
+            # Only the bands of overlays mid-transition take the transition path
+            if layer.enters and t < layer.start + transition.duration:
+                self.draw_transition(frame, layer, transition.entering[transition.step(t - layer.start)])
+            elif layer.leaves and t >= layer.cut:
+                self.draw_transition(frame, layer, transition.leaving[transition.step(t - layer.cut)])
+            elif layer.placed is not None:
+                self.draw(frame, layer.placed)
+        return frame
+    
+    def get_frame(self, t):
+        """Composite the frame at time t into a new array"""
+        import numpy as np
+        
+        FRAME_BYTES_ALLOCATED.inc(self.background.nbytes, path="sampled")
+        return self.render_into(t, np.empty_like(self.background))
+
+
+class PipeEncoder:
+    """
+    Encodes raw RGB frames by piping them into an ffmpeg process. Frames are
+    written straight from the caller's buffers through memoryviews, so no
+    bytes object is created per frame on the way to the pipe. Used as a
+    context manager, the encode is finished on success and killed on error.
+    """
+    def __init__(self, output_file, width, height, fps, codec="libx264", preset="medium", ffmpeg_params=()):
+        self.output_file = output_file
+        command = [ffmpeg_binary(), "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                   "-an", "-c:v", codec, "-preset", preset, "-pix_fmt", "yuv420p"]
+        command.extend(ffmpeg_params)
+        command.append(output_file)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+    
+    def write(self, frame):
+        """Write one C-contiguous uint8 frame without copying it"""
+        view = memoryview(frame).cast("B")
+        try:
+            while view:
+                written = self.process.stdin.write(view)
+                view = view[written:]
+        except BrokenPipeError:
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg exited while encoding {self.output_file}: {self._stderr()}")
+    
+    def close(self):
+        """Finish the encode and wait for ffmpeg"""
+        self.process.stdin.close()
+        returncode = self.process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed with status {returncode} encoding {self.output_file}: "
+                               f"{self._stderr()}")
+    
+    def abort(self):
+        """Stop ffmpeg without finishing the file"""
+        self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+    
+    def _stderr(self):
+        return self.process.stderr.read().decode(errors="replace").strip()
+
+
+def encode_compositions(outputs, fps):
+    """
+    Render the frames of compositors of the same duration in one pass, each
+    into its FrameRing, while a writer thread per output feeds the filled
+    slots to its encoder. outputs are (compositor, ring, encoder); every
+    output advances a frame at a time, so separate encoders (e.g. one per
+    aspect) run in parallel, and compositing the next frame overlaps writing
+    the last one. Returns the number of frames encoded per output.
+    """
+    errors = []
+    
+    def write_frames(ring, encoder):
+        # Every slot is released, even after an error, so the compositor never waits forever
+        while True:
+            slot = ring.next_filled()
+            if slot is None:
+                return
+            try:
+                if not errors:
+                    encoder.write(ring.buffers[slot])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                ring.release(slot)
+    
+    writers = [threading.Thread(target=write_frames, args=(ring, encoder), name=f"frame-writer-{i}", daemon=True)
+               for i, (_, ring, encoder) in enumerate(outputs)]
+    for writer in writers:
+        writer.start()
+    frames = outputs[0][0].frame_count(fps)
+    try:
+        for n in range(frames):
+            if errors:
+                break
+            for compositor, ring, _ in outputs:
+                slot, buffer = ring.acquire()
+                try:
+                    compositor.render_into(n / fps, buffer)
+                except Exception:
+                    # The ring outlives this render, so its slots must all come back
+                    ring.release(slot)
+                    raise
+                ring.submit(slot)
+    finally:
+        for _, ring, _ in outputs:
+            ring.finish()
+        for writer in writers:
+            writer.join()
+    
+    if errors:
+        raise errors[0]
+    return frames
+
+
+def encode_composition(compositor, ring, encoder, fps):
+    """Render every frame of one compositor into a FrameRing and encode it; see encode_compositions"""
+    return encode_compositions([(compositor, ring, encoder)], fps)
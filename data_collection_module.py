@@ -1,8 +1,5 @@
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 from datetime import datetime
 import time
 import random
@@ -229,9 +226,7 @@ class CollegeDataScraper:
                 school["rank"] = i+1
             
             # Save custom ranking
-            output_file = os.path.join(self.output_dir, "custom_ivy_league_beauty.json")
-            with open(output_file, 'w') as f:
-                json.dump(ivy_beauty, f, indent=4)
+            self.save_json_data("custom_ivy_league_beauty.json", ivy_beauty)
             
             # Create another custom ranking: "Top 10 Schools with Best Student Life"
             student_life = [
@@ -250,15 +245,23 @@ class CollegeDataScraper:
             for i, school in enumerate(student_life):
                 school["rank"] = i+1
             
-            output_file = os.path.join(self.output_dir, "custom_best_student_life.json")
-            with open(output_file, 'w') as f:
-                json.dump(student_life, f, indent=4)
+            self.save_json_data("custom_best_student_life.json", student_life)
                 
             print("Successfully created custom ranking categories")
             
         except Exception as e:
             print(f"Error creating custom rankings: {e}")
     
+    def save_json_data(self, filename, data):
+        """
+        Save data to a JSON file under a temporary name and rename it, so a
+        reader never sees a half-written file
+        """
+        output_file = os.path.join(self.output_dir, filename)
+        with open(output_file + ".tmp", 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(output_file + ".tmp", output_file)
+    
     def load_json_data(self, filename):
         """Load data from JSON file"""
         try:
@@ -267,6 +270,27 @@ class CollegeDataScraper:
         except FileNotFoundError:
             return []
     
+    def is_custom_ranking(self, filename):
+        """Whether a raw ranking file is a custom ranking, all of which are created together"""
+        return not filename.startswith(("us_news_", "princeton_review_", "niche_"))
+    
+    def scrape_ranking(self, filename):
+        """
+        Collect the data behind one raw ranking file (as named in the output
+        directory) and return it, so rankings can be scraped one at a time.
+        A custom ranking recreates every custom ranking.
+        """
+        scrapers = (("us_news_", self.scrape_us_news_rankings),
+                    ("princeton_review_", self.scrape_princeton_review_rankings),
+                    ("niche_", self.scrape_niche_rankings))
+        for prefix, scraper in scrapers:
+            if filename.startswith(prefix):
+                return scraper(filename[len(prefix):-len(".json")])
+        
+        # Custom rankings are created together from the other sources
+        self.create_custom_rankings()
+        return self.load_json_data(filename)
+    
     def run_all_scrapers(self):
         """Run all scrapers to collect comprehensive data"""
         # US News rankings
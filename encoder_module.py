@@ -0,0 +1,132 @@
+import os
+import itertools
+import threading
+from metrics_module import CACHE_HITS
+from compositing_module import PipeEncoder
+
+# libx264 settings per use case. Ranking videos are still backgrounds with
+# text that changes every couple of seconds, so tune=stillimage and CRF
+# (quality-targeted) rate control spend almost nothing on unchanged frames.
+# keyint is the keyframe interval in seconds; threads 0 lets x264 use every
+# core, which only pays off at full resolution.
+ENCODER_PROFILES = {
+    # Fast layout checks: speed over size
+    "preview": {"preset": "ultrafast", "tune": "stillimage", "crf": 30, "maxrate": None, "keyint": 5,
+                "threads": 2},
+    # Upload to TikTok/Shorts/Reels: capped bitrate, keyframes every 2s for seeking and ingest
+    "publish": {"preset": "fast", "tune": "stillimage", "crf": 23, "maxrate": "4M", "keyint": 2, "threads": 4},
+    # Masters kept for re-editing: near-transparent quality, compression over speed
+    "archive": {"preset": "slow", "tune": "stillimage", "crf": 18, "maxrate": None, "keyint": 10, "threads": 0}
+}
+
+
+def encoder_params(profile, fps):
+    """ffmpeg output options of an encoder profile at a frame rate, other than the preset"""
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile {profile!r}; expected one of {', '.join(ENCODER_PROFILES)}")
+    settings = ENCODER_PROFILES[profile]
+    keyint = max(1, round(settings["keyint"] * fps))
+    params = ["-tune", settings["tune"], "-crf", str(settings["crf"]), "-g", str(keyint),
+              "-threads", str(settings["threads"])]
+    if settings["maxrate"]:
+        # A two-second VBV buffer keeps the cap without starving the text changes
+        bufsize = f"{2 * int(settings['maxrate'][:-1])}{settings['maxrate'][-1]}"
+        params += ["-maxrate", settings["maxrate"], "-bufsize", bufsize]
+    return params
+
+
+def start_encoder(output_file, width, height, fps, profile, codec="libx264", ffmpeg_params=(),
+                  encoder_class=PipeEncoder):
+    """Start an ffmpeg pipe encoder for raw RGB frames with an encoder profile's settings"""
+    return encoder_class(output_file, width, height, fps, codec, ENCODER_PROFILES[profile]["preset"],
+                         encoder_params(profile, fps) + list(ffmpeg_params))
+
+
+class PooledEncoder(PipeEncoder):
+    """
+    A PipeEncoder started before its output is named. ffmpeg writes to a
+    spare file in the output directory, renamed to destination when the
+    encode finishes and removed if it is aborted.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.destination = None
+    
+    def close(self):
+        super().close()
+        os.replace(self.output_file, self.destination)
+    
+    def abort(self):
+        super().abort()
+        if os.path.exists(self.output_file):
+            os.unlink(self.output_file)
+
+
+class EncoderPool:
+    """
+    Keeps ffmpeg encoders started ahead of need, so by the time a render's
+    first frame is ready its encoder has already loaded, parsed its options
+    and opened its output. An ffmpeg process is bound to its settings and
+    output file, so idle encoders are kept per (output directory, frame
+    size, fps, profile, codec, options), each writing to a spare file that
+    is renamed into place (see PooledEncoder). Taking an encoder starts its
+    replacement, whose startup overlaps the current render.
+    """
+    def __init__(self, spares=1):
+        self.spares = spares
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+    
+    def _start(self, key):
+        directory, width, height, fps, profile, codec, ffmpeg_params = key
+        # Hidden and without an .mp4 extension, so listings of rendered videos skip it
+        spare_file = os.path.join(directory, f".encoder-{os.getpid()}-{next(self.counter)}.spare")
+        return start_encoder(spare_file, width, height, fps, profile, codec, ["-f", "mp4"] + list(ffmpeg_params),
+                             encoder_class=PooledEncoder)
+    
+    def prewarm(self, directory, width, height, fps, profile, codec="libx264", ffmpeg_params=()):
+        """Start idle encoders for these settings until spares are waiting"""
+        key = (os.path.abspath(directory), width, height, fps, profile, codec, tuple(ffmpeg_params))
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            while len(idle) < self.spares:
+                idle.append(self._start(key))
+    
+    def encoder(self, output_file, width, height, fps, profile, codec="libx264", ffmpeg_params=()):
+        """
+        PooledEncoder for output_file: an idle one when available, else a
+        new one. Use it as a context manager, like a PipeEncoder.
+        """
+        directory = os.path.dirname(os.path.abspath(output_file))
+        key = (directory, width, height, fps, profile, codec, tuple(ffmpeg_params))
+        with self.lock:
+            idle = self.idle.get(key)
+            encoder = idle.pop(0) if idle else None
+        
+        if encoder is not None and encoder.process.poll() is None:
+            CACHE_HITS.inc(cache="encoder")
+        else:
+            if encoder is not None:
+                # Exited while idle; clean up and start afresh
+                encoder.abort()
+            encoder = self._start(key)
+        encoder.destination = output_file
+        
+        self.prewarm(directory, width, height, fps, profile, codec, ffmpeg_params)
+        return encoder
+    
+    def close(self):
+        """Stop the idle encoders and remove their spare files"""
+        with self.lock:
+            idle = [encoder for encoders in self.idle.values() for encoder in encoders]
+            self.idle.clear()
+        for encoder in idle:
+            encoder.abort()
@@ -37,25 +37,104 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Fetch initial status
+    // Apply a full status object to the page
+    function applyStatus(data) {
+        updateStatusBadge(dataCollectionStatus, data.data_collection);
+        updateStatusBadge(videoGenerationStatus, data.video_generation);
+        
+        if (data.last_run) {
+            lastRun.textContent = data.last_run;
+        }
+        
+        if (data.videos_generated && data.videos_generated.length > 0) {
+            displayVideos(data.videos_generated);
+        }
+    }
+
+    // Fetch the full status, revalidating with the last ETag so an unchanged
+    // status costs a 304. Resolves to the status, or null if it is unchanged
+    // (lastStatus then still holds it).
+    let statusEtag = null;
+    let lastStatus = null;
+    
     function fetchStatus() {
-        fetch('/api/status')
-            .then(response => response.json())
-            .then(data => {
-                updateStatusBadge(dataCollectionStatus, data.data_collection);
-                updateStatusBadge(videoGenerationStatus, data.video_generation);
-                
-                if (data.last_run) {
-                    lastRun.textContent = data.last_run;
+        const headers = statusEtag ? {'If-None-Match': statusEtag} : {};
+        return fetch('/api/status', {headers: headers, cache: 'no-store'})
+            .then(response => {
+                if (response.status === 304) {
+                    return null;
                 }
-                
-                if (data.videos_generated && data.videos_generated.length > 0) {
-                    displayVideos(data.videos_generated);
+                if (!response.ok) {
+                    throw new Error('Network response was not ok');
                 }
-            })
-            .catch(error => {
-                console.error('Error fetching status:', error);
+                statusEtag = response.headers.get('ETag');
+                return response.json().then(data => {
+                    lastStatus = data;
+                    applyStatus(data);
+                    return data;
+                });
+            });
+    }
+
+    // Build the gallery entry for a single video
+    function createVideoElement(video) {
+        const videoElement = document.createElement('div');
+        videoElement.className = 'video-container';
+        videoElement.style.opacity = '0';
+        videoElement.style.transform = 'translateY(20px)';
+        const thumbnail = video.thumbnail_url
+            ? `<img class="video-thumb" src="${video.thumbnail_url}" data-preview="${video.preview_url}" alt="${video.category}" loading="lazy" width="270" height="480">`
+            : '';
+        videoElement.innerHTML = `
+            <div class="video-preview">
+                ${thumbnail}
+                <div>
+                    <h5>${video.category}</h5>
+                    <p>Audio: ${video.audio_mood}</p>
+                </div>
+            </div>
+            <div class="d-flex justify-content-between align-items-center">
+                <div>
+                    <h6>${video.category}</h6>
+                    <small class="text-muted">Generated: ${video.timestamp}</small>
+                </div>
+                <div>
+                    <a href="${video.url}" class="btn btn-sm btn-outline-primary" target="_blank">View Details</a>
+                    <button class="btn btn-sm btn-outline-success download-btn" data-url="${video.url}">Download</button>
+                </div>
+            </div>
+        `;
+        
+        // Swap the poster for the animated preview while hovering
+        const thumbElement = videoElement.querySelector('.video-thumb');
+        if (thumbElement) {
+            const posterUrl = thumbElement.getAttribute('src');
+            videoElement.addEventListener('mouseenter', function() {
+                thumbElement.src = thumbElement.getAttribute('data-preview');
             });
+            videoElement.addEventListener('mouseleave', function() {
+                thumbElement.src = posterUrl;
+            });
+        }
+        
+        // Add event listener to the download button
+        videoElement.querySelector('.download-btn').addEventListener('click', function() {
+            const url = this.getAttribute('data-url');
+            // In a real implementation, this would trigger a download
+            // For this demo, we'll just open the URL in a new tab
+            window.open(url, '_blank');
+        });
+        
+        return videoElement;
+    }
+
+    // Animate a gallery entry into view
+    function showVideoElement(videoElement, delay) {
+        setTimeout(() => {
+            videoElement.style.transition = 'opacity 0.5s ease, transform 0.5s ease';
+            videoElement.style.opacity = '1';
+            videoElement.style.transform = 'translateY(0)';
+        }, delay);
     }
 
     // Display generated videos with animation
@@ -69,64 +148,139 @@ document.addEventListener('DOMContentLoaded', function() {
         videosContainer.innerHTML = '';
         
         videos.forEach((video, index) => {
-            const videoElement = document.createElement('div');
-            videoElement.className = 'video-container';
-            videoElement.style.opacity = '0';
-            videoElement.style.transform = 'translateY(20px)';
-            videoElement.innerHTML = `
-                <div class="video-preview">
-                    <div>
-                        <h5>${video.category}</h5>
-                        <p>Audio: ${video.audio_mood}</p>
-                    </div>
-                </div>
-                <div class="d-flex justify-content-between align-items-center">
-                    <div>
-                        <h6>${video.category}</h6>
-                        <small class="text-muted">Generated: ${video.timestamp}</small>
-                    </div>
-                    <div>
-                        <a href="${video.url}" class="btn btn-sm btn-outline-primary" target="_blank">View Details</a>
-                        <button class="btn btn-sm btn-outline-success download-btn" data-url="${video.url}">Download</button>
-                    </div>
-                </div>
-            `;
+            const videoElement = createVideoElement(video);
             videosContainer.appendChild(videoElement);
             
             // Animate entry with delay based on index
-            setTimeout(() => {
-                videoElement.style.transition = 'opacity 0.5s ease, transform 0.5s ease';
-                videoElement.style.opacity = '1';
-                videoElement.style.transform = 'translateY(0)';
-            }, 100 * index);
+            showVideoElement(videoElement, 100 * index);
         });
+    }
+
+    // Append a single newly generated video to the gallery
+    function appendVideo(video) {
+        noVideosMessage.style.display = 'none';
+        if (!videosContainer.contains(noVideosMessage)) {
+            videosContainer.appendChild(noVideosMessage);
+        }
         
-        // Add event listeners to download buttons
-        document.querySelectorAll('.download-btn').forEach(button => {
-            button.addEventListener('click', function() {
-                const url = this.getAttribute('data-url');
-                // In a real implementation, this would trigger a download
-                // For this demo, we'll just open the URL in a new tab
-                window.open(url, '_blank');
-            });
-        });
+        const videoElement = createVideoElement(video);
+        videosContainer.appendChild(videoElement);
+        showVideoElement(videoElement, 0);
     }
 
-    // Poll for status updates every 3 seconds when pipeline is running
-    let statusInterval = null;
+    // Clear the gallery at the start of a new run
+    function clearVideos() {
+        videosContainer.innerHTML = '';
+        videosContainer.appendChild(noVideosMessage);
+        noVideosMessage.style.display = 'block';
+    }
+
+    // Subscribe to status deltas pushed by the server. The server only writes
+    // when something changes and closes the stream every few minutes;
+    // EventSource reconnects and resumes from Last-Event-ID. Deltas are
+    // applied only for the job the last snapshot or reset showed.
+    let statusSource = null;
+    let currentJobId = null;
+    
+    // Polling fallback for browsers without SSE support. The delay doubles
+    // while the status is unchanged or unreachable, and polling stops once
+    // no stage is in progress and no submitted job is awaiting its response;
+    // submitting a job starts it again.
+    const POLL_MIN_DELAY = 3000;
+    const POLL_MAX_DELAY = 30000;
+    let pollTimer = null;
+    let pollDelay = POLL_MIN_DELAY;
+    let jobPending = false;
+    let pollRun = 0;
     
-    function startStatusPolling() {
-        if (statusInterval) {
-            clearInterval(statusInterval);
+    function pollStatus(run) {
+        fetchStatus()
+            .then(data => {
+                // A newer startPolling() took over
+                if (run !== pollRun) {
+                    return;
+                }
+                const status = data || lastStatus;
+                if (status && !jobPending && status.data_collection !== 'in_progress' &&
+                        status.video_generation !== 'in_progress') {
+                    return;
+                }
+                pollDelay = data ? POLL_MIN_DELAY : Math.min(pollDelay * 2, POLL_MAX_DELAY);
+                pollTimer = setTimeout(pollStatus, pollDelay, run);
+            })
+            .catch(error => {
+                console.error('Error fetching status:', error);
+                if (run === pollRun) {
+                    pollDelay = Math.min(pollDelay * 2, POLL_MAX_DELAY);
+                    pollTimer = setTimeout(pollStatus, pollDelay, run);
+                }
+            });
+    }
+    
+    function startPolling() {
+        clearTimeout(pollTimer);
+        pollDelay = POLL_MIN_DELAY;
+        pollRun += 1;
+        pollStatus(pollRun);
+    }
+    
+    // The job is now on the server; polling picks up its state from here
+    function finishSubmission() {
+        jobPending = false;
+        if (!statusSource) {
+            startPolling();
         }
-        statusInterval = setInterval(fetchStatus, 3000);
     }
     
-    function stopStatusPolling() {
-        if (statusInterval) {
-            clearInterval(statusInterval);
-            statusInterval = null;
+    function startStatusStream() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
         }
+        
+        statusSource = new EventSource('/api/status/stream');
+        
+        statusSource.addEventListener('snapshot', function(e) {
+            const data = JSON.parse(e.data);
+            currentJobId = data.status.job_id;
+            clearVideos();
+            applyStatus(data.status);
+        });
+        
+        statusSource.addEventListener('reset', function(e) {
+            const data = JSON.parse(e.data);
+            currentJobId = data.status.job_id;
+            clearVideos();
+            applyStatus(data.status);
+        });
+        
+        statusSource.addEventListener('status', function(e) {
+            const data = JSON.parse(e.data);
+            if (data.job_id !== currentJobId) {
+                return;
+            }
+            const changes = data.changes;
+            if (changes.data_collection) {
+                updateStatusBadge(dataCollectionStatus, changes.data_collection);
+            }
+            if (changes.video_generation) {
+                updateStatusBadge(videoGenerationStatus, changes.video_generation);
+            }
+            if (changes.last_run) {
+                lastRun.textContent = changes.last_run;
+            }
+        });
+        
+        statusSource.addEventListener('video', function(e) {
+            const data = JSON.parse(e.data);
+            if (data.job_id === currentJobId) {
+                appendVideo(data.video);
+            }
+        });
+        
+        statusSource.onerror = function(error) {
+            console.error('Status stream error:', error);
+        };
     }
 
     // Handle form submission with validation
@@ -147,6 +301,10 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Show loading spinner
         loadingSpinner.style.display = 'block';
+        jobPending = true;
+        if (!statusSource) {
+            startPolling();
+        }
         
         // Disable form
         const formElements = pipelineForm.elements;
@@ -154,9 +312,6 @@ document.addEventListener('DOMContentLoaded', function() {
             formElements[i].disabled = true;
         }
         
-        // Start polling for status updates
-        startStatusPolling();
-        
         // Run pipeline
         fetch('/api/run_pipeline', {
             method: 'POST',
@@ -177,24 +332,27 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
             // Hide loading spinner
             loadingSpinner.style.display = 'none';
+            finishSubmission();
             
             // Enable form
             for (let i = 0; i < formElements.length; i++) {
                 formElements[i].disabled = false;
             }
             
+            // In queue mode the job is only accepted here; its progress
+            // arrives over the status stream as render workers pick it up
+            if (data.status === 'queued') {
+                showAlert('Your videos are queued for rendering. Progress will appear below.', 'info');
+                return;
+            }
+            
             // Show success message
             showAlert(`Successfully generated ${data.videos.length} videos!`, 'success');
-            
-            // Stop polling after a short delay to ensure we get the final status
-            setTimeout(() => {
-                stopStatusPolling();
-                fetchStatus(); // One final status check
-            }, 3000);
         })
         .catch(error => {
             console.error('Error:', error);
             loadingSpinner.style.display = 'none';
+            finishSubmission();
             
             // Enable form
             for (let i = 0; i < formElements.length; i++) {
@@ -203,9 +361,6 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // Show error message
             showAlert('An error occurred while generating videos. Please try again.', 'danger');
-            
-            // Stop polling
-            stopStatusPolling();
         });
     });
 
@@ -259,6 +414,6 @@ document.addEventListener('DOMContentLoaded', function() {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
 
-    // Fetch initial status on page load
-    fetchStatus();
+    // Subscribe to status updates on page load; the first event is a snapshot
+    startStatusStream();
 });
@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import atexit
+import socket
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Default histogram buckets in seconds, from sub-frame work to full pipeline runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    """Render a Prometheus label set such as {stage="render",le="0.5"}"""
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    """Render a sample value the way Prometheus expects"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels
+    """
+    kind = "counter"
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, amount=1, **labels):
+        """Increase the counter for the given label values"""
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def get(self, **labels):
+        """Current value for the given label values"""
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            return self.values.get(key, 0)
+    
+    def collect(self):
+        """Copy of the values, as {label values: value}"""
+        with self.lock:
+            return dict(self.values)
+    
+    def merge(self, values, other):
+        """Add another process's collected values into values"""
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+    
+    def render(self, values=None):
+        """Prometheus text exposition lines for this counter, or for values collected from it"""
+        if values is None:
+            values = self.collect()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative histogram with optional labels, usable as a timer
+    """
+    kind = "histogram"
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        """Record one observation for the given label values"""
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def timed(self, func):
+        """Decorator that observes the duration of every call"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.time():
+                return func(*args, **kwargs)
+        return wrapper
+    
+    def collect(self):
+        """Copy of the values, as {label values: {"counts", "sum", "count"}}"""
+        with self.lock:
+            return {key: dict(series, counts=list(series["counts"])) for key, series in self.values.items()}
+    
+    def merge(self, values, other):
+        """Add another process's collected values into values"""
+        for key, series in other.items():
+            total = values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            total["counts"] = [a + b for a, b in zip(total["counts"], series["counts"])]
+            total["sum"] += series["sum"]
+            total["count"] += series["count"]
+    
+    def render(self, values=None):
+        """Prometheus text exposition lines for this histogram, or for values collected from it"""
+        if values is None:
+            values = self.collect()
+        return histogram_lines(self.name, self.documentation, self.labelnames, self.buckets, values)
+
+
+def histogram_lines(name, documentation, labelnames, buckets, values):
+    """
+    Prometheus lines for a histogram given as {label values: {"counts", "sum",
+    "count"}}, with per-bucket (non-cumulative) counts aligned with buckets
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"]
+    for key, series in sorted(values.items()):
+        cumulative = 0
+        for bound, count in zip(buckets, series["counts"]):
+            cumulative += count
+            labels = _format_labels(labelnames, key, [("le", _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_value(series['sum'])}")
+        lines.append(f"{name}_count{labels} {series['count']}")
+    return lines
+
+
+def gauge_lines(name, documentation, labelnames, values):
+    """Prometheus lines for a gauge given as {label values: value}"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+    return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together on the /metrics endpoint.
+    Counters and histograms are kept per process, so by default a scrape
+    only sees the process that served it. With share(), every process
+    writes its values to a shared directory and a scrape sums them all.
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+        self.directory = None
+        self.interval = None
+    
+    def register(self, metric):
+        """Add a metric, or return the already registered one with that name"""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+    
+    def counter(self, name, documentation, labelnames=()):
+        """Create or fetch a counter"""
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Create or fetch a histogram"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def add_collector(self, collector):
+        """
+        Register a function returning exposition lines at scrape time, for
+        metrics kept outside this process (e.g. in a shared database)
+        """
+        with self.lock:
+            self.collectors.append(collector)
+    
+    def share(self, directory, interval=5):
+        """
+        Aggregate counters and histograms across processes (web workers and
+        render workers) through a directory they all share. Each process
+        writes its values there every `interval` seconds and at exit, and
+        render() adds up the files of every process that ever wrote one, so
+        totals include other processes (as of their last write) and survive
+        restarts.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = interval
+        self._start_writer()
+        atexit.register(self.write_shared)
+        os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _shared_file(self):
+        """This process's file in the shared directory"""
+        return os.path.join(self.directory, f"{socket.gethostname()}-{os.getpid()}.json")
+    
+    def _start_writer(self):
+        def write_periodically():
+            while True:
+                time.sleep(self.interval)
+                self.write_shared()
+        threading.Thread(target=write_periodically, name="metrics-writer", daemon=True).start()
+    
+    def _after_fork(self):
+        # A forked child starts from zero, since its parent reports its own
+        # values; locks are recreated as they may have been held at the fork
+        self.lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric.lock = threading.Lock()
+            metric.values.clear()
+        self._start_writer()
+    
+    def write_shared(self):
+        """Write this process's counter and histogram values to the shared directory"""
+        if self.directory is None:
+            return
+        with self.lock:
+            metrics = list(self.metrics.values())
+        data = {metric.name: [[list(key), value] for key, value in metric.collect().items()] for metric in metrics}
+        path = self._shared_file()
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+    
+    def _read_shared(self):
+        """Values written by other processes, as [{metric name: {label values: value}}]"""
+        own_file = os.path.basename(self._shared_file())
+        shared = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name == own_file:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            shared.append({metric: {tuple(key): value for key, value in values} for metric, values in data.items()})
+        return shared
+    
+    def render(self):
+        """Prometheus text exposition format for every registered metric"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+        shared = self._read_shared() if self.directory else []
+        lines = []
+        for metric in metrics:
+            values = metric.collect()
+            for other in shared:
+                metric.merge(values, other.get(metric.name, {}))
+            lines.extend(metric.render(values))
+        for collector in collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry and the pipeline's metrics. Processes that call
+# REGISTRY.share() report totals across all of them.
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Duration of each pipeline stage", ["stage"])
+RENDER_LATENCY = REGISTRY.histogram(
+    "video_render_duration_seconds", "Duration of each create_ranking_video call")
+VIDEOS_RENDERED = REGISTRY.counter(
+    "videos_rendered_total", "Videos rendered by VideoCompositionEngine")
+PIPELINE_RUNS = REGISTRY.counter(
+    "pipeline_runs_total", "Pipeline runs by outcome", ["status"])
+CACHE_HITS = REGISTRY.counter(
+    "cache_hits_total", "Work skipped because a cached result was reused", ["cache"])
+BYTES_WRITTEN = REGISTRY.counter(
+    "bytes_written_total", "Bytes written to disk by the pipeline", ["kind"])
+FRAME_BYTES_ALLOCATED = REGISTRY.counter(
+    "frame_buffer_allocated_bytes_total", "Bytes allocated for composited frames", ["path"])
+FIRST_VIDEO_LATENCY = REGISTRY.histogram(
+    "pipeline_first_video_seconds", "Time from the start of a pipeline run to its first published video",
+    ["mode"])
+
+
+@contextmanager
+def span(stage, logger=None):
+    """Time a pipeline stage, record it in STAGE_DURATION and log its duration"""
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, stage=stage)
+        if logger:
+            logger.info(f"span stage={stage} status={status} duration_s={duration:.3f}")
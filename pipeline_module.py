@@ -0,0 +1,569 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from video_index_module import VideoIndex
+from publishing_module import VideoPublisher
+from metrics_module import PIPELINE_RUNS, CACHE_HITS, FIRST_VIDEO_LATENCY, span
+from pipeline_state_module import PipelineStateStore, compute_input_hash
+from render_queue_module import RenderQueue
+from category_registry_module import CategoryRegistry, category_id
+from stage_pipeline_module import Stage, StagePipeline
+
+# The pipeline shared by the web app (inline runs) and render_worker.py
+# (queued runs): the shared stores, the stages and the jobs built from them.
+# It does not import Flask, and the pipeline modules (and the pandas/cv2/
+# MoviePy stack behind them) are imported by the stages that use them.
+# Messages go to the web app's log when imported by it.
+logger = logging.getLogger('college_video_app')
+
+# Published videos, thumbnails and animated previews, served by the web app
+VIDEOS_DIR = '/home/ubuntu/web_interface/static/videos'
+
+# Persistent index of every generated video, shared by all runs and workers
+video_index = VideoIndex('/home/ubuntu/web_interface/data/video_index.db')
+video_publisher = VideoPublisher(VIDEOS_DIR)
+
+# Shared pipeline state. Every worker process reads and writes the same
+# SQLite database, and each change is recorded as a versioned status delta
+# (stage transition, new video, or reset at the start of a run) for the
+# push-based status stream.
+state_store = PipelineStateStore('/home/ubuntu/web_interface/data/pipeline_state.db')
+
+def update_pipeline_status(job_id, **changes):
+    """Apply stage transitions to a job and broadcast them"""
+    state_store.update_job(job_id, **changes)
+
+def add_generated_video(job_id, video_info):
+    """Record a newly generated video for a job and broadcast it"""
+    state_store.add_job_video(job_id, video_info)
+
+def reset_pipeline_status(job_id, params, last_run):
+    """Start a new job as the current pipeline status and broadcast the reset"""
+    state_store.create_job(job_id, params, last_run)
+
+# Render tasks of jobs run in queue mode, leased by render_worker.py processes
+render_queue = RenderQueue('/home/ubuntu/web_interface/data/render_queue.db')
+
+# Processes that report metrics (see MetricsRegistry.share) write them here
+METRICS_DIR = '/home/ubuntu/web_interface/data/metrics'
+
+# Formatted rankings are written as one JSON file each ("json") or appended
+# to a single JSON Lines stream ("jsonl") for large batches
+RANKINGS_DIR = '/home/ubuntu/formatted_rankings'
+RANKINGS_FORMAT = os.environ.get('RANKINGS_FORMAT', 'json')
+RANKINGS_STREAM = os.path.join(RANKINGS_DIR, 'rankings.jsonl')
+
+# Runs select rankings by canonical category id through the registry the
+# formatter maintains next to the rankings
+category_registry = CategoryRegistry(os.path.join(RANKINGS_DIR, 'categories.jsonl'))
+
+# Inline pipeline mode. "staged" runs each stage over every ranking before
+# the next stage starts; "streaming" hands each ranking on through bounded
+# queues as soon as it is ready, so the first video is published after one
+# ranking's latency. STREAM_BUFFER bounds each queue, and
+# STREAM_RENDER_WORKERS engines render in parallel.
+PIPELINE_MODE = os.environ.get('PIPELINE_MODE', 'staged')
+STREAM_BUFFER = int(os.environ.get('STREAM_BUFFER', '2'))
+STREAM_RENDER_WORKERS = int(os.environ.get('STREAM_RENDER_WORKERS', '1'))
+
+# Pipeline stages. Each stage, or each unit of work within a stage, records a
+# checkpoint with the hash of its inputs and a manifest of its outputs, so a
+# resumed job skips everything that already completed with the same inputs.
+def run_checkpointed(job_id, stage, unit, input_hash, func, *args):
+    """Run func(*args) unless the job already completed this unit with the same inputs"""
+    checkpoint = state_store.get_checkpoint(job_id, stage, unit)
+    if (checkpoint and checkpoint["input_hash"] == input_hash
+            and all(os.path.exists(path) for path in checkpoint["manifest"].get("outputs", []))):
+        CACHE_HITS.inc(cache="checkpoint")
+        logger.info(f"Job {job_id}: reusing {stage} checkpoint {unit}".rstrip())
+        return checkpoint["manifest"]
+    
+    manifest = func(*args)
+    # Failed units return None and are not checkpointed, so a resume retries them
+    if manifest is not None:
+        state_store.save_checkpoint(job_id, stage, unit, input_hash, manifest)
+    return manifest
+
+def require_all_videos(generated_videos, expected):
+    """Fail a run in which any video failed, so the job is marked failed and a resume retries it"""
+    failed = expected - len(generated_videos)
+    if failed > 0:
+        raise RuntimeError(f"{failed} of {expected} videos failed; the others were checkpointed")
+
+def list_files(directory, extension):
+    """Paths of the files in a directory with the given extension"""
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(extension))
+
+def collect_assets():
+    """Collect the campus images and audio tracks videos are composed from"""
+    from data_collection_module import CampusImageCollector, TrendingAudioTracker
+    
+    image_collector = CampusImageCollector()
+    image_collector.download_sample_images()
+    
+    audio_tracker = TrendingAudioTracker()
+    audio_tracker.collect_trending_audio()
+    
+    return {"outputs": [
+        '/home/ubuntu/campus_images/metadata.json',
+        '/home/ubuntu/trending_audio/metadata.json'
+    ]}
+
+def run_data_collection():
+    from data_collection_module import CollegeDataScraper
+    
+    logger.info("Starting data collection")
+    college_scraper = CollegeDataScraper()
+    college_scraper.run_all_scrapers()
+    assets = collect_assets()
+    logger.info("Data collection completed")
+    
+    return {"outputs": list_files('/home/ubuntu/college_data', '.json') + assets["outputs"]}
+
+def scrape_ranking(scraper, source_file):
+    """Collect one raw ranking; a unit of the streaming pipeline"""
+    scraper.scrape_ranking(source_file)
+    return {"outputs": [os.path.join(scraper.output_dir, source_file)]}
+
+def create_custom_rankings(scraper, source_files):
+    """Create the custom rankings, which are built together, in one unit"""
+    scraper.create_custom_rankings()
+    return {"outputs": [os.path.join(scraper.output_dir, source_file) for source_file in source_files]}
+
+def new_ranking_formatter():
+    """RankingFormatter that writes rankings in the configured format"""
+    from video_generation_module import RankingFormatter
+    return RankingFormatter(output_dir=RANKINGS_DIR, output_format=RANKINGS_FORMAT)
+
+def new_video_engine(encoder_pool=None, **kwargs):
+    """
+    VideoCompositionEngine that reads rankings in the configured format.
+    Long-lived engines pass an encoder_module.EncoderPool, which they must
+    close when done; it only starts encoders once the engine encodes MP4s.
+    """
+    from video_generation_module import VideoCompositionEngine
+    rankings_stream = RANKINGS_STREAM if RANKINGS_FORMAT == 'jsonl' else None
+    video_engine = VideoCompositionEngine(rankings_dir=RANKINGS_DIR, rankings_stream=rankings_stream, **kwargs)
+    video_engine.encoder_pool = encoder_pool
+    return video_engine
+
+def run_ranking_formatting():
+    logger.info("Starting ranking formatting")
+    formatter = new_ranking_formatter()
+    formatter.format_all_rankings()
+    logger.info("Ranking formatting completed")
+    
+    if RANKINGS_FORMAT == 'jsonl':
+        return {"outputs": [formatter.stream_file, formatter.registry.path]}
+    return {"outputs": list_files(RANKINGS_DIR, '.json') + [formatter.registry.path]}
+
+def format_ranking(formatter, source_file, category, template_type):
+    """Format and save one ranking; a unit of the streaming pipeline"""
+    ranking = formatter.build_ranking(formatter.load_ranking_data(source_file), category, template_type)
+    output_file = formatter.save_ranking(ranking)
+    return {"ranking_file": formatter.get_ranking_id(category.lower().replace(' ', '_')), "outputs": [output_file]}
+
+def select_ranking_files(selected_categories):
+    """
+    Formatted rankings of the selected categories, looked up by canonical
+    category id in the registry; one exact lookup per selected category
+    """
+    selected_ranking_files = []
+    for selected_category in dict.fromkeys(selected_categories):
+        ranking_file = category_registry.lookup(selected_category)
+        if ranking_file:
+            selected_ranking_files.append(ranking_file)
+        else:
+            logger.warning(f"No formatted ranking for category: {selected_category}")
+    
+    return selected_ranking_files
+
+def render_video(video_engine, ranking_file, selected_audio_mood, output_name=None):
+    rendered_video = video_engine.create_ranking_video(ranking_file, selected_audio_mood, output_name)
+    if not rendered_video:
+        return None
+    return {"rendered_video": rendered_video,
+            "outputs": [rendered_video] + list(video_engine.get_thumbnail_paths(rendered_video))}
+
+def render_input_hash(video_engine, ranking_file, audio_mood):
+    """Inputs of one render: the ranking's content (from a file or the stream), mood and render settings"""
+    return compute_input_hash(audio_mood, video_engine.render_mp4, video_engine.load_ranking_data(ranking_file))
+
+def run_video_generation(job_id, video_engine, ranking_files, selected_audio_mood):
+    logger.info("Starting video generation")
+    rendered_videos = []
+    for ranking_file in ranking_files:
+        input_hash = render_input_hash(video_engine, ranking_file, selected_audio_mood)
+        manifest = run_checkpointed(job_id, "video_generation", ranking_file, input_hash,
+                                    render_video, video_engine, ranking_file, selected_audio_mood)
+        if manifest:
+            rendered_videos.append(manifest["rendered_video"])
+    
+    logger.info("Video generation completed")
+    return rendered_videos
+
+def add_audio(audio_system, rendered_video):
+    final_videos = audio_system.process_all_videos([rendered_video])
+    if not final_videos:
+        return None
+    return {"final_video": final_videos[0], "outputs": final_videos}
+
+def run_audio_integration(job_id, rendered_videos, share_tracks=False):
+    from video_generation_module import AudioIntegrationSystem
+    
+    # Add audio to the videos rendered by this run only
+    logger.info("Starting audio integration")
+    audio_system = AudioIntegrationSystem(share_tracks=share_tracks)
+    final_videos = []
+    for rendered_video in rendered_videos:
+        input_hash = compute_input_hash(files=[rendered_video])
+        manifest = run_checkpointed(job_id, "audio_integration", os.path.basename(rendered_video), input_hash,
+                                    add_audio, audio_system, rendered_video)
+        if manifest:
+            final_videos.append(manifest["final_video"])
+    logger.info("Audio integration completed")
+    return final_videos
+
+def publish_video(job_id, video_engine, final_video, rendered_video, selected_audio_mood, variant=None):
+    video_file = os.path.basename(final_video)
+    video_name = video_file.split('_with_')[0]
+    
+    # Extract category from filename; batch variants append "__<template>__<mood>"
+    category = video_name.split('__')[0].replace('_', ' ').title()
+    
+    # The id is derived from the artifact's content, so publishing the
+    # same artifact again maps to the same file and index entry
+    content_hash = video_publisher.content_hash(final_video)
+    video_id = f"video_{content_hash[:12]}_{category.lower().replace(' ', '_')}"
+    video_path, method = video_publisher.publish(final_video, f"{video_id}.txt")
+    logger.info(f"Published {video_file} as {video_id} ({method})")
+    outputs = [video_path]
+    
+    # Create video info
+    video_info = {
+        "id": video_id,
+        "category": category,
+        "audio_mood": selected_audio_mood,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "url": f"/static/videos/{video_id}.txt"
+    }
+    if variant:
+        video_info.update(variant)
+    
+    # Publish the poster frame and animated preview next to the video
+    if rendered_video:
+        poster_file, preview_file = video_engine.get_thumbnail_paths(rendered_video)
+        if os.path.exists(poster_file) and os.path.exists(preview_file):
+            outputs.append(video_publisher.publish(poster_file, f"{video_id}_poster.webp")[0])
+            outputs.append(video_publisher.publish(preview_file, f"{video_id}_preview.webp")[0])
+            video_info["thumbnails"] = {
+                "poster": f"{video_id}_poster.webp",
+                "preview": f"{video_id}_preview.webp"
+            }
+            video_info["thumbnail_url"] = f"/api/videos/{video_id}/thumb"
+            video_info["preview_url"] = f"/api/videos/{video_id}/thumb?kind=preview"
+    
+    video_index.add_video(video_info)
+    add_generated_video(job_id, video_info)
+    return {"video_info": video_info, "outputs": outputs}
+
+def publish_videos(job_id, video_engine, rendered_videos, final_videos, selected_audio_mood, variants=None):
+    """
+    Publish this run's final videos to the web static directory. variants maps
+    a rendered video's name to the fields that distinguish it in a batch
+    (audio_mood, template_type).
+    """
+    rendered_by_name = {os.path.splitext(os.path.basename(v))[0]: v for v in rendered_videos}
+    generated_videos = []
+    for final_video in final_videos:
+        video_name = os.path.basename(final_video).split('_with_')[0]
+        rendered_video = rendered_by_name.get(video_name)
+        variant = (variants or {}).get(video_name)
+        audio_mood = variant["audio_mood"] if variant else selected_audio_mood
+        input_hash = compute_input_hash(audio_mood, variant, files=[final_video])
+        manifest = run_checkpointed(job_id, "publishing", os.path.basename(final_video), input_hash,
+                                    publish_video, job_id, video_engine, final_video, rendered_video,
+                                    audio_mood, variant)
+        generated_videos.append(manifest["video_info"])
+    
+    return generated_videos
+
+def create_pipeline_dirs():
+    """Create the pipeline's output directories if they don't exist"""
+    os.makedirs('/home/ubuntu/college_data', exist_ok=True)
+    os.makedirs('/home/ubuntu/campus_images', exist_ok=True)
+    os.makedirs('/home/ubuntu/trending_audio', exist_ok=True)
+    os.makedirs('/home/ubuntu/formatted_rankings', exist_ok=True)
+    os.makedirs('/home/ubuntu/generated_videos', exist_ok=True)
+    os.makedirs('/home/ubuntu/final_videos', exist_ok=True)
+
+def prepare_rankings(job_id):
+    """Collect data and format rankings; the stages every run starts with"""
+    create_pipeline_dirs()
+    
+    # Each stage is timed as a span and recorded in the stage histogram
+    with span("data_collection", logger):
+        run_checkpointed(job_id, "data_collection", "", compute_input_hash("data_collection"),
+                         run_data_collection)
+    update_pipeline_status(job_id, data_collection="completed", video_generation="in_progress")
+    
+    with span("ranking_formatting", logger):
+        raw_files = list_files('/home/ubuntu/college_data', '.json')
+        run_checkpointed(job_id, "ranking_formatting", "", compute_input_hash(files=raw_files),
+                         run_ranking_formatting)
+
+# Run the actual pipeline. Returns the generated videos, or None if the run
+# or any of its videos failed; a failed job can be resumed from its checkpoints.
+def run_actual_pipeline(job_id, selected_categories, selected_audio_mood):
+    try:
+        logger.info(f"Starting pipeline with categories: {selected_categories}, audio mood: {selected_audio_mood}")
+        start = time.perf_counter()
+        prepare_rankings(job_id)
+        
+        # Generate videos for selected categories only
+        video_engine = new_video_engine()
+        with span("video_generation", logger):
+            selected_ranking_files = select_ranking_files(selected_categories)
+            rendered_videos = run_video_generation(job_id, video_engine, selected_ranking_files, selected_audio_mood)
+        
+        with span("audio_integration", logger):
+            final_videos = run_audio_integration(job_id, rendered_videos)
+        
+        with span("publishing", logger):
+            generated_videos = publish_videos(job_id, video_engine, rendered_videos, final_videos, selected_audio_mood)
+        # Every video is published in the last stage, so the first one waits for all of them
+        if generated_videos:
+            FIRST_VIDEO_LATENCY.observe(time.perf_counter() - start, mode="staged")
+        require_all_videos(generated_videos, len(selected_ranking_files))
+        
+        PIPELINE_RUNS.inc(status="completed")
+        logger.info(f"Pipeline completed successfully, generated {len(generated_videos)} videos")
+        return generated_videos
+    
+    except Exception as e:
+        PIPELINE_RUNS.inc(status="failed")
+        logger.error(f"Error running pipeline {job_id}: {e}")
+        return None
+
+# Run the pipeline as a stream: scraping, formatting and rendering overlap,
+# connected by bounded queues, and each selected ranking moves on as soon as
+# it is ready. Renders use the same per-video checkpoints as the other modes.
+# With a profiler, the stage threads are profiled along with the job's own.
+def run_streaming_pipeline(job_id, selected_categories, selected_audio_mood, profiler=None):
+    from concurrent.futures import ThreadPoolExecutor
+    from data_collection_module import CollegeDataScraper
+    from video_generation_module import RANKING_SOURCES, AudioIntegrationSystem
+    
+    try:
+        logger.info(f"Starting streaming pipeline with categories: {selected_categories}, "
+                    f"audio mood: {selected_audio_mood}")
+        start = time.perf_counter()
+        create_pipeline_dirs()
+        update_pipeline_status(job_id, video_generation="in_progress")
+        
+        scraper = CollegeDataScraper()
+        formatter = new_ranking_formatter()
+        engines = threading.local()
+        
+        def scrape(source):
+            source_file = source[0]
+            # Custom rankings were all created before the stream started
+            if not scraper.is_custom_ranking(source_file):
+                run_checkpointed(job_id, "data_collection", source_file,
+                                 compute_input_hash("data_collection", source_file),
+                                 scrape_ranking, scraper, source_file)
+            return source
+        
+        def format_source(source):
+            source_file, category, template_type = source
+            input_hash = compute_input_hash(category, template_type,
+                                            files=[os.path.join(scraper.output_dir, source_file)])
+            manifest = run_checkpointed(job_id, "ranking_formatting", source_file, input_hash,
+                                        format_ranking, formatter, source_file, category, template_type)
+            return {"ranking_file": manifest["ranking_file"], "audio_mood": selected_audio_mood,
+                    "output_name": None, "variant": None}
+        
+        def render(task):
+            # Each render worker keeps its own engine, whose caches are not thread-safe
+            assets.result()
+            if not hasattr(engines, "video_engine"):
+                engines.video_engine = new_video_engine()
+                engines.audio_system = AudioIntegrationSystem()
+            return run_render_task(job_id, engines.video_engine, engines.audio_system, task)
+        
+        pipeline = StagePipeline([
+            Stage("data_collection", scrape),
+            Stage("ranking_formatting", format_source),
+            Stage("video_generation", render, workers=STREAM_RENDER_WORKERS)
+        ], buffer=STREAM_BUFFER, thread_context=profiler.profile_thread if profiler else None)
+        selected_ids = {category_id(category) for category in selected_categories}
+        sources = [source for source in RANKING_SOURCES if category_id(source[1]) in selected_ids]
+        
+        # Creating one custom ranking rewrites all of them, so they are created
+        # once up front rather than per source, while formatting reads them
+        if any(scraper.is_custom_ranking(source[0]) for source in sources):
+            custom_files = [source[0] for source in RANKING_SOURCES if scraper.is_custom_ranking(source[0])]
+            run_checkpointed(job_id, "data_collection", "custom", compute_input_hash("data_collection", "custom"),
+                             create_custom_rankings, scraper, custom_files)
+        
+        generated_videos = []
+        with ThreadPoolExecutor(max_workers=1) as executor, span("streaming", logger):
+            # Images and audio are collected alongside the rankings
+            assets = executor.submit(run_checkpointed, job_id, "data_collection", "assets",
+                                     compute_input_hash("assets"), collect_assets)
+            for video_info in pipeline.run(sources):
+                if not generated_videos:
+                    latency = time.perf_counter() - start
+                    FIRST_VIDEO_LATENCY.observe(latency, mode="streaming")
+                    logger.info(f"Job {job_id}: first video published after {latency:.3f}s")
+                generated_videos.append(video_info)
+            assets.result()
+        require_all_videos(generated_videos, len(sources))
+        
+        PIPELINE_RUNS.inc(status="completed")
+        logger.info(f"Streaming pipeline completed successfully, generated {len(generated_videos)} videos")
+        return generated_videos
+    
+    except Exception as e:
+        PIPELINE_RUNS.inc(status="failed")
+        logger.error(f"Error running streaming pipeline {job_id}: {e}")
+        return None
+
+def format_variants(categories, template_types):
+    """Format every category × template variant; returns {ranking_file: template_type} and outputs"""
+    formatter = new_ranking_formatter()
+    ranking_files = {}
+    for category in categories:
+        for template_type in template_types:
+            ranking_file = formatter.format_variant(category, template_type)
+            if ranking_file:
+                ranking_files[ranking_file] = template_type
+    
+    if RANKINGS_FORMAT == 'jsonl':
+        return {"ranking_files": ranking_files, "outputs": [formatter.stream_file]}
+    return {"ranking_files": ranking_files,
+            "outputs": [os.path.join(formatter.output_dir, f) for f in ranking_files]}
+
+def plan_render_tasks(job_id, params, video_engine):
+    """
+    The videos a job renders, as tasks with ranking_file, audio_mood,
+    output_name and variant. Rankings must already be prepared.
+    """
+    if "template_types" not in params:
+        return [{"ranking_file": ranking_file, "audio_mood": params["audio_mood"],
+                 "output_name": None, "variant": None}
+                for ranking_file in select_ranking_files(params["categories"])]
+    
+    with span("ranking_variants", logger):
+        raw_files = list_files('/home/ubuntu/college_data', '.json')
+        input_hash = compute_input_hash(params["categories"], params["template_types"], files=raw_files)
+        manifest = run_checkpointed(job_id, "ranking_variants", "", input_hash,
+                                    format_variants, params["categories"], params["template_types"])
+        ranking_files = manifest["ranking_files"]
+    
+    # The plan keeps variants that share work next to each other
+    return [{"ranking_file": ranking_file, "audio_mood": audio_mood, "output_name": output_name,
+             "variant": {"audio_mood": audio_mood, "template_type": ranking_files[ranking_file]}}
+            for ranking_file, audio_mood, output_name in video_engine.plan_batch(ranking_files, params["audio_moods"])]
+
+def run_render_task(job_id, video_engine, audio_system, task):
+    """
+    Render, add audio to and publish one video; returns its video info or
+    None. Uses the same checkpoints as the staged pipeline, so a job can be
+    resumed in either render mode.
+    """
+    ranking_file = task["ranking_file"]
+    audio_mood = task["audio_mood"]
+    output_name = task["output_name"]
+    
+    input_hash = render_input_hash(video_engine, ranking_file, audio_mood)
+    manifest = run_checkpointed(job_id, "video_generation", output_name or ranking_file, input_hash,
+                                render_video, video_engine, ranking_file, audio_mood, output_name)
+    if not manifest:
+        return None
+    rendered_video = manifest["rendered_video"]
+    
+    input_hash = compute_input_hash(files=[rendered_video])
+    manifest = run_checkpointed(job_id, "audio_integration", os.path.basename(rendered_video), input_hash,
+                                add_audio, audio_system, rendered_video)
+    if not manifest:
+        return None
+    final_video = manifest["final_video"]
+    
+    input_hash = compute_input_hash(audio_mood, task["variant"], files=[final_video])
+    manifest = run_checkpointed(job_id, "publishing", os.path.basename(final_video), input_hash,
+                                publish_video, job_id, video_engine, final_video, rendered_video,
+                                audio_mood, task["variant"])
+    return manifest["video_info"]
+
+# Run a batch: every category × template × audio mood variant in one job.
+# Variants share setup: backgrounds per category, text overlays, the picture
+# of a ranking across moods, and one audio bed per mood.
+def run_batch_pipeline(job_id, params):
+    try:
+        logger.info(f"Starting batch with categories: {params['categories']}, audio moods: {params['audio_moods']}, "
+                    f"templates: {params['template_types']}")
+        prepare_rankings(job_id)
+        
+        video_engine = new_video_engine()
+        tasks = plan_render_tasks(job_id, params, video_engine)
+        
+        with span("video_generation", logger):
+            rendered_videos = []
+            variants = {}
+            for task in tasks:
+                input_hash = render_input_hash(video_engine, task["ranking_file"], task["audio_mood"])
+                manifest = run_checkpointed(job_id, "video_generation", task["output_name"], input_hash,
+                                            render_video, video_engine, task["ranking_file"],
+                                            task["audio_mood"], task["output_name"])
+                if manifest:
+                    rendered_videos.append(manifest["rendered_video"])
+                    variants[task["output_name"]] = task["variant"]
+        
+        with span("audio_integration", logger):
+            final_videos = run_audio_integration(job_id, rendered_videos, share_tracks=True)
+        
+        with span("publishing", logger):
+            generated_videos = publish_videos(job_id, video_engine, rendered_videos, final_videos,
+                                              None, variants)
+        require_all_videos(generated_videos, len(tasks))
+        
+        PIPELINE_RUNS.inc(status="completed")
+        logger.info(f"Batch completed successfully, generated {len(generated_videos)} videos")
+        return generated_videos
+    
+    except Exception as e:
+        PIPELINE_RUNS.inc(status="failed")
+        logger.error(f"Error running batch {job_id}: {e}")
+        return None
+
+def run_job(job_id, params, profiler=None):
+    """Run the pipeline or batch pipeline a job's params describe"""
+    if "template_types" in params:
+        return run_batch_pipeline(job_id, params)
+    if PIPELINE_MODE == 'streaming':
+        return run_streaming_pipeline(job_id, params["categories"], params["audio_mood"], profiler)
+    return run_actual_pipeline(job_id, params["categories"], params["audio_mood"])
+
+def finish_queued_job(job_id):
+    """
+    Set a queued job's final status once none of its tasks are pending.
+    Returns False if tasks are pending or another worker already did it.
+    """
+    summary = render_queue.finalize_job(job_id)
+    if summary is None:
+        return False
+    
+    job = state_store.get_job(job_id)
+    if summary["failed"]:
+        PIPELINE_RUNS.inc(status="failed")
+        if job["data_collection"] != "completed":
+            update_pipeline_status(job_id, data_collection="failed", video_generation="failed")
+        else:
+            update_pipeline_status(job_id, video_generation="failed")
+    else:
+        PIPELINE_RUNS.inc(status="completed")
+        update_pipeline_status(job_id, data_collection="completed", video_generation="completed")
+    return True
@@ -0,0 +1,273 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class PipelineStateStore:
+    """
+    Shared pipeline state backed by SQLite in WAL mode. Every worker process
+    reads and writes the same database, so status is consistent across
+    gunicorn workers and survives restarts. Each update is one transaction
+    that also appends a versioned status event for the status stream.
+    """
+    def __init__(self, db_path="/home/ubuntu/web_interface/data/pipeline_state.db",
+                 max_events=500, poll_interval=0.25):
+        self.db_path = db_path
+        self.max_events = max_events
+        self.poll_interval = poll_interval
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        
+        # One watcher thread per process polls the version and wakes waiters,
+        # so waiting stream clients cost nothing per connection
+        self.condition = threading.Condition()
+        self.known_version = None
+        self.watcher = None
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    data_collection TEXT NOT NULL,
+                    video_generation TEXT NOT NULL,
+                    last_run TEXT,
+                    params TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_videos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    info TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_videos_job ON job_videos (job_id, seq)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT,
+                    delta TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    job_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    unit TEXT NOT NULL,
+                    input_hash TEXT NOT NULL,
+                    manifest TEXT NOT NULL,
+                    completed_at TEXT NOT NULL,
+                    PRIMARY KEY (job_id, stage, unit)
+                )
+            """)
+    
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection; one per call keeps the store thread-safe"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def _transaction(self, write=True):
+        """
+        Run a block in one transaction. Writes take the lock up front
+        (BEGIN IMMEDIATE); reads see a single consistent WAL snapshot.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    
+    def _append_event(self, conn, job_id, delta):
+        """Append a status event inside the caller's transaction; returns its version"""
+        cursor = conn.execute("INSERT INTO events (job_id, delta) VALUES (?, ?)", (job_id, json.dumps(delta)))
+        version = cursor.lastrowid
+        conn.execute("DELETE FROM events WHERE version <= ?", (version - self.max_events,))
+        return version
+    
+    def _read_job(self, conn, job_id):
+        """Status dict for one job, in the shape the web interface expects"""
+        row = conn.execute("""
+            SELECT data_collection, video_generation, last_run, params FROM jobs WHERE job_id = ?
+        """, (job_id,)).fetchone()
+        if not row:
+            return None
+        videos = conn.execute("SELECT info FROM job_videos WHERE job_id = ? ORDER BY seq", (job_id,)).fetchall()
+        return {
+            "job_id": job_id,
+            "data_collection": row[0],
+            "video_generation": row[1],
+            "last_run": row[2],
+            "params": json.loads(row[3]),
+            "videos_generated": [json.loads(info) for (info,) in videos]
+        }
+    
+    def _notify(self, version):
+        """Wake waiters in this process right away after a local write"""
+        with self.condition:
+            if self.known_version is None or version > self.known_version:
+                self.known_version = version
+            self.condition.notify_all()
+    
+    def create_job(self, job_id, params, last_run):
+        """
+        Register a new job, or restart an existing one for a resume, make it
+        the current job and broadcast a reset. A restarted job keeps its
+        videos and checkpoints.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._transaction() as conn:
+            conn.execute("""
+                INSERT INTO jobs (job_id, data_collection, video_generation, last_run, params, created_at, updated_at)
+                VALUES (?, 'in_progress', 'not_started', ?, ?, ?, ?)
+                ON CONFLICT(job_id) DO UPDATE SET
+                    data_collection = 'in_progress',
+                    video_generation = 'not_started',
+                    last_run = excluded.last_run,
+                    updated_at = excluded.updated_at
+            """, (job_id, last_run, json.dumps(params), now, now))
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('current_job', ?)", (job_id,))
+            status = self._read_job(conn, job_id)
+            version = self._append_event(conn, job_id, {"type": "reset", "job_id": job_id, "status": status})
+        self._notify(version)
+        return version
+    
+    def update_job(self, job_id, **changes):
+        """Atomically apply stage transitions to a job and broadcast them"""
+        allowed = {"data_collection", "video_generation", "last_run"}
+        unknown = set(changes) - allowed
+        if unknown:
+            raise ValueError(f"Unknown status fields: {sorted(unknown)}")
+        
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        assignments = ", ".join(f"{field} = ?" for field in changes)
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                         list(changes.values()) + [now, job_id])
+            version = self._append_event(conn, job_id, {"type": "status", "job_id": job_id, "changes": changes})
+        self._notify(version)
+        return version
+    
+    def add_job_video(self, job_id, video_info):
+        """Atomically record a generated video for a job and broadcast it"""
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO job_videos (job_id, info) VALUES (?, ?)", (job_id, json.dumps(video_info)))
+            version = self._append_event(conn, job_id, {"type": "video", "job_id": job_id, "video": video_info})
+        self._notify(version)
+        return version
+    
+    def save_checkpoint(self, job_id, stage, unit, input_hash, manifest):
+        """Record that a stage (or one unit of it) completed for these inputs"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._transaction() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO checkpoints (job_id, stage, unit, input_hash, manifest, completed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (job_id, stage, unit, input_hash, json.dumps(manifest), now))
+    
+    def get_checkpoint(self, job_id, stage, unit=""):
+        """Checkpoint for a stage unit as {"input_hash", "manifest", "completed_at"}, or None"""
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT input_hash, manifest, completed_at FROM checkpoints
+                WHERE job_id = ? AND stage = ? AND unit = ?
+            """, (job_id, stage, unit)).fetchone()
+        if not row:
+            return None
+        return {"input_hash": row[0], "manifest": json.loads(row[1]), "completed_at": row[2]}
+    
+    def get_job(self, job_id):
+        """Status of a single job, or None"""
+        with self._transaction(write=False) as conn:
+            return self._read_job(conn, job_id)
+    
+    def get_version(self):
+        """Latest status version; a single indexed lookup"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(version) FROM events").fetchone()
+        return row[0] or 0
+    
+    def get_snapshot(self, job_id=None):
+        """Return (version, status of job_id or else the current job) from one consistent read"""
+        with self._transaction(write=False) as conn:
+            row = conn.execute("SELECT MAX(version) FROM events").fetchone()
+            version = row[0] or 0
+            if job_id is None:
+                current = conn.execute("SELECT value FROM meta WHERE key = 'current_job'").fetchone()
+                job_id = current[0] if current else None
+            status = self._read_job(conn, job_id) if job_id else None
+        
+        if status is None:
+            status = {
+                "job_id": job_id,
+                "data_collection": "not_started",
+                "video_generation": "not_started",
+                "last_run": None,
+                "videos_generated": []
+            }
+        return version, status
+    
+    def get_events(self, since):
+        """
+        Events newer than `since`, oldest first. Returns None when `since` is
+        outside the retained window, so the caller should resend a snapshot.
+        """
+        with self._transaction(write=False) as conn:
+            oldest, latest = conn.execute("SELECT MIN(version), MAX(version) FROM events").fetchone()
+            if latest is None or since > latest:
+                return None if since > (latest or 0) else []
+            if since < oldest - 1:
+                return None
+            rows = conn.execute("SELECT version, delta FROM events WHERE version > ? ORDER BY version",
+                                (since,)).fetchall()
+        return [(version, json.loads(delta)) for version, delta in rows]
+    
+    def _watch(self):
+        """Poll the version and wake waiters when another process writes"""
+        while True:
+            version = self.get_version()
+            with self.condition:
+                if self.known_version is None or version > self.known_version:
+                    self.known_version = version
+                    self.condition.notify_all()
+                self.condition.wait(self.poll_interval)
+    
+    def wait_for_events(self, since, timeout):
+        """Block until there are events newer than `since` or `timeout` passes"""
+        with self.condition:
+            if self.watcher is None:
+                self.watcher = threading.Thread(target=self._watch, name="state-watcher", daemon=True)
+                self.watcher.start()
+            if self.known_version is None or self.known_version <= since:
+                self.condition.wait_for(lambda: self.known_version is not None and self.known_version > since,
+                                        timeout)
+        return self.get_events(since)
+
+
+def compute_input_hash(*parts, files=()):
+    """
+    Hash the inputs of a pipeline unit: JSON-serializable values plus the
+    contents of any files, so a checkpoint is only reused for identical inputs
+    """
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode())
+    for path in files:
+        digest.update(path.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Functions whose timings are reported separately in hot_paths.json. With the
+# default "ring" compositor the compositing loop is FrameCompositor.render_into
+# (and get_frame for thumbnails) blending through AlphaBlender, driven by
+# encode_compositions; with "moviepy" it runs in CompositeVideoClip.make_frame/blit.
+HOT_FUNCTIONS = (
+    "create_ranking_video",
+    "create_text_clip",
+    "get_placeholder_image",
+    "create_thumbnails",
+    "write_video_file",
+    "write_video_files",
+    "encode_compositions",
+    "render_into",
+    "get_frame",
+    "blend",
+    "blend_faded",
+    "make_frame",
+    "blit"
+)
+
+
+class JobProfiler:
+    """
+    Opt-in profiler for a single pipeline job. cProfile gives exact per-function
+    timings, and a sampling thread records collapsed stacks that flamegraph.pl
+    or speedscope can render directly. Work the job hands to other threads is
+    included when those threads run inside profile_thread().
+    """
+    def __init__(self, output_dir, interval=0.005, hot_functions=HOT_FUNCTIONS):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.hot_functions = hot_functions
+        self.profile = cProfile.Profile()
+        self.samples = Counter()
+        self.target_thread = None
+        self.worker_threads = set()
+        self.worker_profiles = []
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.stopped = threading.Event()
+        self.started_at = None
+        self.duration = None
+    
+    def __enter__(self):
+        self.target_thread = threading.get_ident()
+        self.stopped.clear()
+        self.sampler = threading.Thread(target=self._sample, name="job-profiler", daemon=True)
+        self.sampler.start()
+        self.started_at = time.perf_counter()
+        self.profile.enable()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.disable()
+        self.duration = time.perf_counter() - self.started_at
+        self.stopped.set()
+        self.sampler.join()
+        return False
+    
+    @contextmanager
+    def profile_thread(self):
+        """
+        Profile the calling thread for the duration of the block, for worker
+        threads started by the profiled job. Its cProfile timings are merged
+        into the job's at save(). Where only one profiler can be active per
+        process (cProfile on Python 3.12+), the thread is sampled only.
+        """
+        ident = threading.get_ident()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None
+        with self.lock:
+            self.worker_threads.add(ident)
+            if profile is not None:
+                self.worker_profiles.append(profile)
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self.lock:
+                self.worker_threads.discard(ident)
+    
+    def _sample(self):
+        """Record the stacks of the profiled thread and its workers every `interval` seconds"""
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                threads = [self.target_thread] + list(self.worker_threads)
+            for thread in threads:
+                frame = frames.get(thread)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[";".join(reversed(stack))] += 1
+    
+    def get_stats(self):
+        """cProfile statistics of the job's thread merged with its profiled worker threads"""
+        stats = pstats.Stats(self.profile)
+        for profile in self.worker_profiles:
+            stats.add(profile)
+        return stats
+    
+    def get_hot_path_timings(self):
+        """Aggregate cProfile timings for the functions in hot_functions"""
+        stats = self.get_stats()
+        timings = {}
+        for (filename, line, name), (cc, nc, tottime, cumtime, callers) in stats.stats.items():
+            if name not in self.hot_functions:
+                continue
+            entry = timings.setdefault(name, {"calls": 0, "tottime_s": 0.0, "cumtime_s": 0.0})
+            entry["calls"] += nc
+            entry["tottime_s"] += tottime
+            entry["cumtime_s"] += cumtime
+        for entry in timings.values():
+            entry["percall_s"] = entry["cumtime_s"] / entry["calls"] if entry["calls"] else 0.0
+        return timings
+    
+    def save(self):
+        """Write profile.prof, profile.folded and hot_paths.json; returns their paths"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        files = {
+            "pstats": os.path.join(self.output_dir, "profile.prof"),
+            "folded": os.path.join(self.output_dir, "profile.folded"),
+            "hot_paths": os.path.join(self.output_dir, "hot_paths.json")
+        }
+        
+        self.get_stats().dump_stats(files["pstats"])
+        
+        with open(files["folded"], 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        
+        with open(files["hot_paths"], 'w') as f:
+            json.dump({
+                "duration_s": self.duration,
+                "sample_interval_s": self.interval,
+                "samples": sum(self.samples.values()),
+                "functions": self.get_hot_path_timings()
+            }, f, indent=4)
+        
+        return files
@@ -0,0 +1,125 @@
+import os
+import json
+import tempfile
+
+
+class JsonlWriter:
+    """
+    Appends records to a JSON Lines file, one compact line per record. Each
+    record is a single write to an O_APPEND descriptor, so concurrent writers
+    never interleave lines. With replace, records go to a temporary file that
+    atomically replaces the stream on close.
+    """
+    def __init__(self, path, replace=False):
+        self.path = path
+        self.replace = replace
+        self.temp_path = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        
+        if replace:
+            fd, self.temp_path = tempfile.mkstemp(prefix=".stream-", dir=os.path.dirname(path) or ".")
+            os.close(fd)
+            self.fd = os.open(self.temp_path, os.O_WRONLY | os.O_APPEND)
+        else:
+            self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+        return False
+    
+    def write(self, record):
+        """Append one record"""
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        os.write(self.fd, line.encode("utf-8"))
+    
+    def close(self, commit=True):
+        """Close the stream; a replacing writer publishes its file only on commit"""
+        if self.fd is None:
+            return
+        os.close(self.fd)
+        self.fd = None
+        if self.temp_path:
+            if commit:
+                os.replace(self.temp_path, self.path)
+            else:
+                os.unlink(self.temp_path)
+
+
+def iter_records(path, offset=0):
+    """
+    Yield (offset, record) for each complete line from a byte offset onwards.
+    A trailing line without a newline is still being written and is skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            if line.strip():
+                yield offset, json.loads(line)
+            offset += len(line)
+
+
+def read_records(path):
+    """Iterate over the records in a JSON Lines file, one parsed line at a time"""
+    for _, record in iter_records(path):
+        yield record
+
+
+class JsonlIndex:
+    """
+    Byte offset of the latest record per key in a JSON Lines file, for
+    lookups without parsing the whole stream. Appended records are indexed
+    incrementally; a replaced file is re-indexed from the start.
+    """
+    def __init__(self, path, key="id"):
+        self.path = path
+        self.key = key
+        self.offsets = {}
+        self.file_id = None
+        self.indexed_to = 0
+    
+    def refresh(self):
+        """Index records appended since the last refresh"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.offsets, self.file_id, self.indexed_to = {}, None, 0
+            return
+        
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self.file_id or stat.st_size < self.indexed_to:
+            self.offsets, self.file_id, self.indexed_to = {}, file_id, 0
+        if stat.st_size == self.indexed_to:
+            return
+        
+        with open(self.path, 'rb') as f:
+            f.seek(self.indexed_to)
+            offset = self.indexed_to
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    self.offsets[json.loads(line)[self.key]] = offset
+                offset += len(line)
+        self.indexed_to = offset
+    
+    def keys(self):
+        """Keys in the stream, in the order they were first written"""
+        self.refresh()
+        return list(self.offsets)
+    
+    def get(self, key):
+        """Latest record for a key, or None"""
+        self.refresh()
+        offset = self.offsets.get(key)
+        if offset is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
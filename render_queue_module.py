@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from metrics_module import DEFAULT_BUCKETS, histogram_lines, gauge_lines
+
+# Priority classes, most urgent first. A queued task of a more urgent class
+# is always claimed before any task of a less urgent one.
+PRIORITY_CLASSES = {"preview": 0, "batch": 1}
+
+# Columns added to the tasks table after its first release, with their definitions
+SCHEDULING_COLUMNS = {
+    "priority_class": "TEXT NOT NULL DEFAULT 'batch'",
+    "priority": "INTEGER NOT NULL DEFAULT 1",
+    "user_id": "TEXT NOT NULL DEFAULT 'anonymous'",
+    "cost": "REAL NOT NULL DEFAULT 1.0",
+    "started_at": "REAL",
+    "unit": "TEXT"
+}
+
+
+class RenderQueue:
+    """
+    Render task queue shared by the API server and render workers, backed by
+    SQLite in WAL mode. A worker claims a task by taking a lease on it and
+    heartbeats while it works; when a lease expires (the worker died or hung)
+    the task goes back to the queue until it runs out of attempts.
+    
+    Claims are scheduled rather than first come, first served: by priority
+    class, then fair share (the user who used the least render cost within
+    fair_share_window seconds goes first), then shortest job first. A task's
+    cost is reduced by aging_rate per second it waits, so long jobs still run.
+    
+    A job is finalized exactly once, by whichever worker first sees it with
+    no queued or leased tasks left (finalize_job); jobs whose last task was
+    failed by lease expiry are found by unfinalized_jobs.
+    """
+    def __init__(self, db_path="/home/ubuntu/web_interface/data/render_queue.db",
+                 lease_seconds=60, max_attempts=3, fair_share_window=600, aging_rate=0.05):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.fair_share_window = fair_share_window
+        self.aging_rate = aging_rate
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, definition in SCHEDULING_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, priority, task_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks (job_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_started ON tasks (started_at)")
+            # A job has at most one live task per unit of work, so a retried
+            # fan-out cannot enqueue the same render twice
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_unit ON tasks (job_id, kind, unit)
+                WHERE unit IS NOT NULL AND status != 'discarded'
+            """)
+            
+            new_jobs_table = conn.execute("""
+                SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs'
+            """).fetchone() is None
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    finalized_at REAL NOT NULL
+                )
+            """)
+            if new_jobs_table:
+                # Jobs that finished before finalization was recorded are not finalized again
+                conn.execute("""
+                    INSERT OR IGNORE INTO jobs (job_id, finalized_at)
+                    SELECT job_id, ? FROM tasks GROUP BY job_id
+                    HAVING SUM(status IN ('queued', 'leased')) = 0
+                """, (time.time(),))
+    
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection; one per call keeps the queue thread-safe"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """Run a block in one write transaction, taking the lock up front"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    
+    def _row_to_task(self, row):
+        """
+        Task dict from a (task_id, job_id, kind, payload, status, attempts,
+        worker_id, priority_class, user_id, cost) row
+        """
+        return {
+            "task_id": row[0],
+            "job_id": row[1],
+            "kind": row[2],
+            "payload": json.loads(row[3]),
+            "status": row[4],
+            "attempts": row[5],
+            "worker_id": row[6],
+            "priority_class": row[7],
+            "user_id": row[8],
+            "cost": row[9]
+        }
+    
+    def _expire_leases(self, conn, now):
+        """Requeue tasks whose lease ran out, or fail them after max_attempts"""
+        conn.execute("""
+            UPDATE tasks SET status = 'failed', worker_id = NULL, lease_expires = NULL,
+                error = 'lease expired', updated_at = ?
+            WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+        """, (now, now, self.max_attempts))
+        conn.execute("""
+            UPDATE tasks SET status = 'queued', worker_id = NULL, lease_expires = NULL, updated_at = ?
+            WHERE status = 'leased' AND lease_expires < ?
+        """, (now, now))
+    
+    def enqueue(self, job_id, kind, payload, priority_class="batch", user_id="anonymous", cost=1.0, unit=None):
+        """
+        Add a task to the queue; returns its task id. cost is the estimated
+        render cost used for fair share and shortest-job-first ordering.
+        A task with a unit is only added if the job has no task of this kind
+        for the unit yet (other than discarded ones); returns None if it has.
+        """
+        if priority_class not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority_class}")
+        
+        now = time.time()
+        with self._transaction() as conn:
+            # A resumed job gets new tasks, and is finalized again when they finish
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO tasks (job_id, kind, payload, status, priority_class, priority, user_id, cost,
+                                             unit, created_at, updated_at)
+                VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?)
+            """, (job_id, kind, json.dumps(payload), priority_class, PRIORITY_CLASSES[priority_class],
+                  user_id, cost, unit, now, now))
+            return cursor.lastrowid if cursor.rowcount == 1 else None
+    
+    def claim(self, worker_id):
+        """Lease the next task to a worker as the scheduler orders them; returns the task or None"""
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute("""
+                WITH usage AS (
+                    SELECT user_id, SUM(cost) AS used FROM tasks
+                    WHERE started_at >= ? AND status IN ('leased', 'done', 'failed')
+                    GROUP BY user_id
+                )
+                SELECT t.task_id, t.job_id, t.kind, t.payload, t.status, t.attempts, t.worker_id,
+                       t.priority_class, t.user_id, t.cost
+                FROM tasks t LEFT JOIN usage u ON u.user_id = t.user_id
+                WHERE t.status = 'queued'
+                ORDER BY t.priority, COALESCE(u.used, 0), t.cost - (? - t.created_at) * ?, t.task_id
+                LIMIT 1
+            """, (now - self.fair_share_window, now, self.aging_rate)).fetchone()
+            if not row:
+                return None
+            # started_at keeps the first claim, so retries don't hide queue wait
+            conn.execute("""
+                UPDATE tasks SET status = 'leased', worker_id = ?, lease_expires = ?,
+                    attempts = attempts + 1, started_at = COALESCE(started_at, ?), updated_at = ?
+                WHERE task_id = ?
+            """, (worker_id, now + self.lease_seconds, now, now, row[0]))
+        
+        task = self._row_to_task(row)
+        task.update(status="leased", worker_id=worker_id, attempts=task["attempts"] + 1)
+        return task
+    
+    def heartbeat(self, task_id, worker_id):
+        """Extend a worker's lease; returns False if the worker no longer holds it"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET lease_expires = ?, updated_at = ?
+                WHERE task_id = ? AND worker_id = ? AND status = 'leased'
+            """, (now + self.lease_seconds, now, task_id, worker_id))
+            return cursor.rowcount == 1
+    
+    def complete(self, task_id, worker_id, result=None):
+        """Mark a leased task done; returns False if the worker lost the lease"""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET status = 'done', result = ?, lease_expires = NULL, updated_at = ?
+                WHERE task_id = ? AND worker_id = ? AND status = 'leased'
+            """, (json.dumps(result), now, task_id, worker_id))
+            return cursor.rowcount == 1
+    
+    def fail(self, task_id, worker_id, error):
+        """
+        Give up a leased task after an error. It is retried by the next free
+        worker until max_attempts, then marked failed. Returns False if the
+        worker lost the lease.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute("""
+                UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                    worker_id = NULL, lease_expires = NULL, error = ?, updated_at = ?
+                WHERE task_id = ? AND worker_id = ? AND status = 'leased'
+            """, (self.max_attempts, str(error), now, task_id, worker_id))
+            return cursor.rowcount == 1
+    
+    def discard_failed(self, job_id):
+        """Set aside a job's failed tasks before it is resumed with fresh ones"""
+        with self._transaction() as conn:
+            conn.execute("""
+                UPDATE tasks SET status = 'discarded', updated_at = ? WHERE job_id = ? AND status = 'failed'
+            """, (time.time(), job_id))
+    
+    def get_job_summary(self, job_id):
+        """Number of a job's tasks in each status"""
+        summary = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        with self._connect() as conn:
+            for status, count in conn.execute("""
+                SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status
+            """, (job_id,)):
+                summary[status] = count
+        return summary
+    
+    def finalize_job(self, job_id):
+        """
+        Claim the right to set a job's final status: returns its summary if
+        none of its tasks are queued or leased and no one finalized it yet,
+        else None. Only one caller ever gets the summary for a run of a job.
+        """
+        with self._transaction() as conn:
+            self._expire_leases(conn, time.time())
+            summary = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+            for status, count in conn.execute("""
+                SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status
+            """, (job_id,)):
+                summary[status] = count
+            if summary["queued"] or summary["leased"]:
+                return None
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO jobs (job_id, finalized_at) VALUES (?, ?)
+            """, (job_id, time.time()))
+            return summary if cursor.rowcount == 1 else None
+    
+    def unfinalized_jobs(self):
+        """
+        Jobs with no queued or leased tasks left that were never finalized,
+        e.g. because their last task's worker died and its lease expired
+        """
+        with self._transaction() as conn:
+            self._expire_leases(conn, time.time())
+            rows = conn.execute("""
+                SELECT t.job_id FROM tasks t LEFT JOIN jobs j ON j.job_id = t.job_id
+                WHERE j.job_id IS NULL GROUP BY t.job_id
+                HAVING SUM(t.status IN ('queued', 'leased')) = 0
+            """).fetchall()
+        return [job_id for (job_id,) in rows]
+    
+    def get_job_results(self, job_id):
+        """Results of a job's completed tasks, in the order they were enqueued"""
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT result FROM tasks WHERE job_id = ? AND status = 'done' ORDER BY task_id
+            """, (job_id,)).fetchall()
+        return [json.loads(result) for (result,) in rows if result is not None]
+    
+    def render_metrics(self, buckets=DEFAULT_BUCKETS):
+        """
+        Exposition lines for queue depth and queue wait (enqueue to first claim)
+        per priority class, computed from the shared database so every
+        worker's claims are included
+        """
+        buckets = tuple(sorted(buckets)) + (float("inf"),)
+        bucket_sums = ", ".join("SUM(CASE WHEN wait > ? AND wait <= ? THEN 1 ELSE 0 END)" for _ in buckets)
+        bounds = []
+        lower = float("-inf")
+        for bound in buckets:
+            bounds.extend([lower, bound])
+            lower = bound
+        
+        with self._connect() as conn:
+            depth_rows = conn.execute("""
+                SELECT priority_class, status, COUNT(*) FROM tasks
+                WHERE status IN ('queued', 'leased') GROUP BY priority_class, status
+            """).fetchall()
+            wait_rows = conn.execute(f"""
+                SELECT priority_class, SUM(wait), COUNT(*), {bucket_sums}
+                FROM (SELECT priority_class, started_at - created_at AS wait FROM tasks
+                      WHERE started_at IS NOT NULL)
+                GROUP BY priority_class
+            """, bounds).fetchall()
+            oldest_rows = conn.execute("""
+                SELECT priority_class, ? - MIN(created_at) FROM tasks WHERE status = 'queued' GROUP BY priority_class
+            """, (time.time(),)).fetchall()
+        
+        depth = {(priority_class, status): 0 for priority_class in PRIORITY_CLASSES for status in ("queued", "leased")}
+        for priority_class, status, count in depth_rows:
+            depth[(priority_class, status)] = count
+        waits = {(row[0],): {"sum": row[1], "count": row[2], "counts": list(row[3:])} for row in wait_rows}
+        oldest = {(priority_class,): 0 for priority_class in PRIORITY_CLASSES}
+        for priority_class, age in oldest_rows:
+            oldest[(priority_class,)] = age
+        
+        lines = gauge_lines("render_queue_tasks", "Render tasks queued or leased",
+                            ["priority_class", "status"], depth)
+        lines.extend(gauge_lines("render_queue_oldest_wait_seconds", "Age of the oldest queued render task",
+                                 ["priority_class"], oldest))
+        lines.extend(histogram_lines("render_queue_wait_seconds", "Time from enqueue to first claim",
+                                     ["priority_class"], buckets, waits))
+        return lines
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Render worker for the AI Video Pipeline for College Rankings
+Pulls tasks from the shared render queue and runs them. Start one or more
+workers per node (with RENDER_MODE=queue on the API server) to add render
+capacity; all nodes must share the /home/ubuntu data directories.
+
+A "prepare" task collects data, formats rankings and enqueues one "render"
+task per video. A "render" task renders, adds audio to and publishes one
+video. Tasks are checkpointed, so a task retried after a worker dies only
+redoes the units that had not finished. Workers share their metrics (render
+latency, videos rendered, cache hits) with the web app, whose /metrics
+endpoint reports them.
+
+Example:
+    python render_worker.py
+    python render_worker.py --worker-id render-2 --poll-interval 0.5
+"""
+
+import os
+import sys
+import socket
+import logging
+import argparse
+import threading
+import time
+
+sys.path.append('/home/ubuntu')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Only the pipeline is imported, not the web app, its routes or its log file
+from metrics_module import REGISTRY
+from pipeline_module import (logger, render_queue, prepare_rankings, plan_render_tasks, run_render_task,
+                             finish_queued_job, new_video_engine, METRICS_DIR)
+
+
+class Heartbeat:
+    """Keep a task's lease alive from a background thread while it runs"""
+    def __init__(self, task, worker_id, interval):
+        self.task = task
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self._beat, name="heartbeat", daemon=True)
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+        return False
+    
+    def _beat(self):
+        while not self.stopped.wait(self.interval):
+            if not render_queue.heartbeat(self.task["task_id"], self.worker_id):
+                # Another worker took the task over; its result will be used
+                logger.warning(f"Worker {self.worker_id} lost the lease on task {self.task['task_id']}")
+                self.lost = True
+                return
+
+
+class RenderWorker:
+    """
+    Runs queued pipeline tasks. The engine, its encoder pool and the audio
+    system are kept across tasks, so consecutive renders share backgrounds,
+    overlays, prestarted encoders and audio beds.
+    """
+    def __init__(self, worker_id, poll_interval=1.0):
+        from video_generation_module import AudioIntegrationSystem
+        from encoder_module import EncoderPool
+        
+        self.worker_id = worker_id
+        self.poll_interval = poll_interval
+        self.encoder_pool = EncoderPool()
+        self.video_engine = new_video_engine(encoder_pool=self.encoder_pool)
+        self.audio_system = AudioIntegrationSystem(share_tracks=True)
+    
+    def close(self):
+        """Stop the encoders the pool keeps waiting"""
+        self.encoder_pool.close()
+    
+    def run_prepare(self, job_id, params):
+        """
+        Prepare rankings and fan the job out into render tasks. A retried
+        prepare only adds the render tasks the job doesn't have yet.
+        """
+        prepare_rankings(job_id)
+        tasks = plan_render_tasks(job_id, params, self.video_engine)
+        # Render tasks inherit the job's priority class and user, and are
+        # costed by the number of items they show
+        queued = 0
+        for task in tasks:
+            ranking_data = self.video_engine.load_ranking_data(task["ranking_file"])
+            cost = self.video_engine.estimate_render_cost(len(ranking_data["items"]) if ranking_data else 0)
+            # Keyed like the render's checkpoint
+            unit = task["output_name"] or task["ranking_file"]
+            if render_queue.enqueue(job_id, "render", task, params.get("priority_class", "batch"),
+                                    params.get("user_id", "anonymous"), cost, unit) is not None:
+                queued += 1
+        logger.info(f"Worker {self.worker_id}: queued {queued} of {len(tasks)} render tasks for {job_id}")
+        return {"render_tasks": len(tasks)}
+    
+    def run_task(self, task):
+        """Run one leased task and record the outcome in the queue"""
+        job_id = task["job_id"]
+        logger.info(f"Worker {self.worker_id}: running {task['kind']} task {task['task_id']} "
+                    f"for {job_id} (attempt {task['attempts']})")
+        
+        with Heartbeat(task, self.worker_id, render_queue.lease_seconds / 3) as heartbeat:
+            try:
+                if task["kind"] == "prepare":
+                    result = self.run_prepare(job_id, task["payload"])
+                else:
+                    result = run_render_task(job_id, self.video_engine, self.audio_system, task["payload"])
+                    if result is None:
+                        raise RuntimeError(f"Rendering {task['payload']['ranking_file']} failed")
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id}: task {task['task_id']} failed: {e}")
+                render_queue.fail(task["task_id"], self.worker_id, e)
+                finish_queued_job(job_id)
+                return False
+        
+        if heartbeat.lost or not render_queue.complete(task["task_id"], self.worker_id, result):
+            return False
+        finish_queued_job(job_id)
+        return True
+    
+    def run(self, once=False):
+        """Claim and run tasks until interrupted (or the queue is empty with once)"""
+        logger.info(f"Render worker {self.worker_id} started")
+        while True:
+            # Jobs whose last task failed with a dead worker have no one else to finish them
+            for job_id in render_queue.unfinalized_jobs():
+                finish_queued_job(job_id)
+            
+            task = render_queue.claim(self.worker_id)
+            if task is None:
+                if once:
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            self.run_task(task)
+
+
+def main():
+    """Start a render worker"""
+    parser = argparse.ArgumentParser(description="Run queued render tasks")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Name recorded on leased tasks (default: host-pid)")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds to wait when the queue is empty")
+    parser.add_argument("--once", action="store_true",
+                        help="Exit when the queue is empty instead of waiting for work")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    REGISTRY.share(METRICS_DIR)
+    
+    worker = RenderWorker(args.worker_id, args.poll_interval)
+    try:
+        worker.run(once=args.once)
+    except KeyboardInterrupt:
+        logger.info(f"Render worker {args.worker_id} stopped")
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import queue
+import threading
+from contextlib import nullcontext
+
+# Marks the end of a stage's input
+_END = object()
+
+
+class Stage:
+    """
+    One step of a StagePipeline: func(item) returns the item passed to the
+    next stage, or None to drop it (a unit that failed without raising)
+    """
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+class StagePipeline:
+    """
+    Runs items through stages connected by bounded queues, each stage on its
+    own threads. An item moves on as soon as its stage finishes with it, so
+    the first result arrives after one item's latency rather than after every
+    stage has processed every item. A full queue blocks the stage feeding it
+    (backpressure), so a fast stage never runs more than buffer items ahead
+    of a slow one.
+    
+    The first exception raised by a stage stops the remaining work and is
+    re-raised to the consumer. thread_context, if given, is a context manager
+    factory every stage thread runs inside (e.g. JobProfiler.profile_thread).
+    """
+    def __init__(self, stages, buffer=1, thread_context=None):
+        self.stages = stages
+        self.buffer = buffer
+        self.thread_context = thread_context or nullcontext
+        self.error = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+    
+    def _fail(self, error):
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.stopped.set()
+    
+    def _feed(self, items, outbox, consumers):
+        try:
+            for item in items:
+                if self.stopped.is_set():
+                    break
+                outbox.put(item)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(consumers):
+                outbox.put(_END)
+    
+    def _work(self, stage, inbox, outbox, running, consumers):
+        with self.thread_context():
+            while True:
+                item = inbox.get()
+                if item is _END:
+                    break
+                # After a failure, inputs are drained without being processed
+                if self.stopped.is_set():
+                    continue
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    self._fail(e)
+                    continue
+                if result is not None:
+                    outbox.put(result)
+        
+        # The stage's last worker to finish ends the next stage's input
+        with self.lock:
+            running[0] -= 1
+            last = running[0] == 0
+        if last:
+            for _ in range(consumers):
+                outbox.put(_END)
+    
+    def run(self, items):
+        """Yield the last stage's results in completion order while items flow through"""
+        queues = [queue.Queue(maxsize=self.buffer) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0], self.stages[0].workers),
+                                    name="stage-feed", daemon=True)]
+        for i, stage in enumerate(self.stages):
+            consumers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            running = [stage.workers]
+            for n in range(stage.workers):
+                threads.append(threading.Thread(target=self._work,
+                                                args=(stage, queues[i], queues[i + 1], running, consumers),
+                                                name=f"stage-{stage.name}-{n}", daemon=True))
+        for thread in threads:
+            thread.start()
+        
+        result = None
+        try:
+            while True:
+                result = queues[-1].get()
+                if result is _END:
+                    break
+                if not self.stopped.is_set():
+                    yield result
+        finally:
+            # A consumer that stops early stops the stages; draining the last
+            # queue lets blocked workers see the end of their input
+            self.stopped.set()
+            while result is not _END:
+                result = queues[-1].get()
+            for thread in threads:
+                thread.join()
+        
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,137 @@
+import string
+
+# Raw data keys each template field is read from, first present wins. Custom
+# rankings name their score after what was scored.
+FIELD_ALIASES = {
+    "score": ("score", "beauty_score", "student_life_score")
+}
+
+# Values used when a field outside an optional segment is missing
+FIELD_DEFAULTS = {
+    "rank": 0,
+    "name": "Unknown",
+    "location": "",
+    "score": ""
+}
+
+
+class TemplateSyntaxError(ValueError):
+    """Raised when a template cannot be compiled"""
+
+
+def _split_segments(source):
+    """
+    Split a template into (optional, text) segments. [...] marks an optional
+    segment; [[ and ]] are literal brackets.
+    """
+    segments = []
+    text = []
+    optional = False
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char in "[]" and source[i + 1:i + 2] == char:
+            text.append(char)
+            i += 2
+            continue
+        if char == "[":
+            if optional:
+                raise TemplateSyntaxError(f"Nested optional segment in {source!r}")
+            segments.append((False, "".join(text)))
+            text, optional = [], True
+        elif char == "]":
+            if not optional:
+                raise TemplateSyntaxError(f"Unmatched ']' in {source!r}")
+            segments.append((True, "".join(text)))
+            text, optional = [], False
+        else:
+            text.append(char)
+        i += 1
+    if optional:
+        raise TemplateSyntaxError(f"Unclosed optional segment in {source!r}")
+    segments.append((False, "".join(text)))
+    return [(optional, text) for optional, text in segments if text]
+
+
+class CompiledTemplate:
+    """
+    A str.format-style template compiled once into a Python function. Fields
+    are declared up front (self.fields), aliases and defaults are resolved at
+    compile time, and a [...] segment is dropped when any field in it is
+    missing or empty, so "#{rank}. {name}[ - {score}/100]" never renders as
+    "#1. Yale - /100". A missing required field renders its default without
+    the field's format spec, so "{score:.1f}" gives "" rather than failing.
+    """
+    def __init__(self, source, aliases=FIELD_ALIASES, defaults=FIELD_DEFAULTS):
+        self.source = source
+        self.aliases = aliases
+        self.defaults = defaults
+        self.fields = set()
+        self.render = self._compile()
+    
+    def __call__(self, item):
+        """Render the template for one item (a dict of raw fields)"""
+        return self.render(item)
+    
+    def _compile(self):
+        """Generate and compile the render function; each segment becomes an f-string"""
+        formatter = string.Formatter()
+        body = []
+        required = set()
+        # (variable, field, spec) for required fields used with a format spec
+        formatted = []
+        for optional, text in _split_segments(self.source):
+            fstring = []
+            segment_fields = []
+            try:
+                parsed = list(formatter.parse(text))
+            except ValueError as e:
+                raise TemplateSyntaxError(f"{e} in {self.source!r}") from e
+            for literal, field, spec, conversion in parsed:
+                fstring.append(literal.replace("{", "{{").replace("}", "}}"))
+                if field is None:
+                    continue
+                if not field.isidentifier() or conversion or "{" in spec:
+                    raise TemplateSyntaxError(f"Unsupported field {{{field}}} in {self.source!r}")
+                self.fields.add(field)
+                segment_fields.append(field)
+                if optional:
+                    fstring.append(f"{{f_{field}:{spec}}}" if spec else f"{{f_{field}}}")
+                    continue
+                # Required uses read the field with its default applied
+                required.add(field)
+                if spec:
+                    name = f"s_{len(formatted)}"
+                    formatted.append((name, field, spec))
+                    fstring.append(f"{{{name}}}")
+                else:
+                    fstring.append(f"{{d_{field}}}")
+            
+            expr = "f" + repr("".join(fstring))
+            if optional and segment_fields:
+                present = " and ".join(f"f_{field} not in (None, '')" for field in segment_fields)
+                expr = f"({expr} if {present} else '')"
+            body.append(expr)
+        
+        lines = ["def render(item):"]
+        for field in sorted(self.fields):
+            keys = self.aliases.get(field, (field,))
+            lines.append(f"    f_{field} = item.get({keys[0]!r})")
+            for key in keys[1:]:
+                lines.append(f"    if f_{field} is None:")
+                lines.append(f"        f_{field} = item.get({key!r})")
+            if field in required:
+                default = self.defaults.get(field, "")
+                lines.append(f"    d_{field} = {default!r} if f_{field} is None else f_{field}")
+        for name, field, spec in formatted:
+            lines.append(f"    {name} = d_{field} if f_{field} is None else format(f_{field}, {spec!r})")
+        lines.append(f"    return {' + '.join(body) or repr('')}")
+        
+        namespace = {}
+        exec(compile("\n".join(lines), f"<template {self.source!r}>", "exec"), namespace)
+        return namespace["render"]
+
+
+def compile_template(source):
+    """Compile a template string into a CompiledTemplate"""
+    return CompiledTemplate(source)
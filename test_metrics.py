@@ -0,0 +1,49 @@
+"""
+Tests for the metrics registry: exposition format and totals across processes
+Run with: python -m pytest test_metrics.py
+"""
+
+import json
+import os
+
+from metrics_module import MetricsRegistry
+
+
+def test_render_counters_and_histograms():
+    registry = MetricsRegistry()
+    runs = registry.counter("runs_total", "Runs", ["status"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(1, 5))
+    runs.inc(status="completed")
+    runs.inc(2, status="failed")
+    latency.observe(0.5)
+    latency.observe(3)
+    
+    lines = registry.render().splitlines()
+    assert 'runs_total{status="completed"} 1' in lines
+    assert 'runs_total{status="failed"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 1' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_sum 3.5" in lines
+
+def test_shared_metrics_are_summed_across_processes(tmp_path):
+    registry = MetricsRegistry()
+    runs = registry.counter("runs_total", "Runs", ["status"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(1, 5))
+    registry.share(str(tmp_path), interval=60)
+    runs.inc(status="completed")
+    latency.observe(0.5)
+    
+    # Values written by another (possibly exited) process
+    with open(os.path.join(tmp_path, "other-1.json"), "w") as f:
+        json.dump({"runs_total": [[["completed"], 2], [["failed"], 1]],
+                   "latency_seconds": [[[], {"counts": [0, 1, 0], "sum": 3.0, "count": 1}]]}, f)
+    
+    lines = registry.render().splitlines()
+    assert 'runs_total{status="completed"} 3' in lines
+    assert 'runs_total{status="failed"} 1' in lines
+    assert 'latency_seconds_bucket{le="5"} 2' in lines
+    assert "latency_seconds_count 2" in lines
+    
+    # This process's own file is not counted twice
+    registry.write_shared()
+    assert 'runs_total{status="completed"} 3' in registry.render().splitlines()
@@ -0,0 +1,97 @@
+"""
+Tests for the shared pipeline state: jobs, status events and checkpoints
+Run with: python -m pytest test_pipeline_state.py
+"""
+
+import os
+
+import pytest
+
+from pipeline_state_module import PipelineStateStore, compute_input_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PipelineStateStore(os.path.join(tmp_path, "pipeline_state.db"))
+
+def test_snapshot_without_jobs(store):
+    version, status = store.get_snapshot()
+    assert version == 0
+    assert status["job_id"] is None
+    assert status["videos_generated"] == []
+
+def test_new_job_becomes_current(store):
+    store.create_job("job_1", {"categories": ["a"]}, "2024-01-01 00:00:00")
+    store.create_job("job_2", {"categories": ["b"]}, "2024-01-01 00:01:00")
+    
+    _, status = store.get_snapshot()
+    assert status["job_id"] == "job_2"
+    assert status["data_collection"] == "in_progress"
+    
+    _, status = store.get_snapshot("job_1")
+    assert status["job_id"] == "job_1"
+    assert status["params"] == {"categories": ["a"]}
+
+def test_changes_are_recorded_as_events(store):
+    since = store.create_job("job_1", {}, "2024-01-01 00:00:00")
+    store.update_job("job_1", data_collection="completed")
+    store.add_job_video("job_1", {"id": "video_1"})
+    
+    events = store.get_events(since)
+    assert [delta["type"] for _, delta in events] == ["status", "video"]
+    assert all(delta["job_id"] == "job_1" for _, delta in events)
+    assert events[0][1]["changes"] == {"data_collection": "completed"}
+    assert store.get_job("job_1")["videos_generated"] == [{"id": "video_1"}]
+    assert store.get_events(events[-1][0]) == []
+
+def test_events_outside_retained_window_need_a_snapshot(tmp_path):
+    store = PipelineStateStore(os.path.join(tmp_path, "pipeline_state.db"), max_events=2)
+    first = store.create_job("job_1", {}, "2024-01-01 00:00:00")
+    for _ in range(3):
+        store.update_job("job_1", video_generation="in_progress")
+    
+    assert store.get_events(first) is None
+
+def test_unknown_status_fields_are_rejected(store):
+    store.create_job("job_1", {}, "2024-01-01 00:00:00")
+    with pytest.raises(ValueError):
+        store.update_job("job_1", videos="done")
+
+def test_wait_for_events_returns_new_events(store):
+    since = store.create_job("job_1", {}, "2024-01-01 00:00:00")
+    assert store.wait_for_events(since, 0.01) == []
+    
+    store.update_job("job_1", video_generation="completed")
+    events = store.wait_for_events(since, 1)
+    assert [delta["type"] for _, delta in events] == ["status"]
+
+def test_checkpoints(store):
+    assert store.get_checkpoint("job_1", "video_generation", "a.json") is None
+    store.save_checkpoint("job_1", "video_generation", "a.json", "hash", {"outputs": ["a.mp4"]})
+    
+    checkpoint = store.get_checkpoint("job_1", "video_generation", "a.json")
+    assert checkpoint["input_hash"] == "hash"
+    assert checkpoint["manifest"] == {"outputs": ["a.mp4"]}
+    assert store.get_checkpoint("job_2", "video_generation", "a.json") is None
+
+def test_resumed_job_keeps_videos(store):
+    store.create_job("job_1", {}, "2024-01-01 00:00:00")
+    store.add_job_video("job_1", {"id": "video_1"})
+    store.update_job("job_1", data_collection="failed", video_generation="failed")
+    store.create_job("job_1", {}, "2024-01-01 00:05:00")
+    
+    status = store.get_job("job_1")
+    assert status["video_generation"] == "not_started"
+    assert status["videos_generated"] == [{"id": "video_1"}]
+
+def test_input_hash_depends_on_file_contents(tmp_path):
+    path = os.path.join(tmp_path, "ranking.json")
+    with open(path, "w") as f:
+        f.write("one")
+    first = compute_input_hash("calm", files=[path])
+    assert compute_input_hash("calm", files=[path]) == first
+    assert compute_input_hash("sad", files=[path]) != first
+    
+    with open(path, "w") as f:
+        f.write("two")
+    assert compute_input_hash("calm", files=[path]) != first
@@ -0,0 +1,146 @@
+"""
+Tests for the render queue: leases, retries, finalization and claim order
+Run with: python -m pytest test_render_queue.py
+"""
+
+import os
+import time
+
+import pytest
+
+from render_queue_module import RenderQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return RenderQueue(os.path.join(tmp_path, "render_queue.db"), lease_seconds=60, max_attempts=2)
+
+def expire_lease(queue, task_id):
+    """Backdate a task's lease as if its worker had stopped heartbeating"""
+    with queue._transaction() as conn:
+        conn.execute("UPDATE tasks SET lease_expires = ? WHERE task_id = ?", (time.time() - 1, task_id))
+
+def test_claim_leases_each_task_once(queue):
+    task_id = queue.enqueue("job_1", "render", {"ranking_file": "a.json"})
+    
+    task = queue.claim("worker_1")
+    assert task["task_id"] == task_id
+    assert task["payload"] == {"ranking_file": "a.json"}
+    assert task["status"] == "leased"
+    assert task["attempts"] == 1
+    assert queue.claim("worker_2") is None
+
+def test_expired_lease_is_requeued(queue):
+    task_id = queue.enqueue("job_1", "render", {})
+    queue.claim("worker_1")
+    expire_lease(queue, task_id)
+    
+    task = queue.claim("worker_2")
+    assert task["task_id"] == task_id
+    assert task["attempts"] == 2
+    # The first worker lost its lease and can no longer report the task
+    assert not queue.heartbeat(task_id, "worker_1")
+    assert not queue.complete(task_id, "worker_1")
+    assert queue.complete(task_id, "worker_2", {"video": "a"})
+    assert queue.get_job_results("job_1") == [{"video": "a"}]
+
+def test_expired_lease_fails_task_after_max_attempts(queue):
+    task_id = queue.enqueue("job_1", "render", {})
+    for worker_id in ("worker_1", "worker_2"):
+        assert queue.claim(worker_id)["task_id"] == task_id
+        expire_lease(queue, task_id)
+    
+    assert queue.claim("worker_3") is None
+    assert queue.get_job_summary("job_1") == {"queued": 0, "leased": 0, "done": 0, "failed": 1}
+
+def test_fail_retries_until_max_attempts(queue):
+    task_id = queue.enqueue("job_1", "render", {})
+    queue.claim("worker_1")
+    assert queue.fail(task_id, "worker_1", "render failed")
+    assert queue.get_job_summary("job_1")["queued"] == 1
+    
+    queue.claim("worker_1")
+    assert queue.fail(task_id, "worker_1", "render failed")
+    assert queue.get_job_summary("job_1")["failed"] == 1
+    assert queue.claim("worker_1") is None
+
+def test_job_is_finalized_once(queue):
+    task_id = queue.enqueue("job_1", "render", {})
+    assert queue.finalize_job("job_1") is None
+    
+    queue.claim("worker_1")
+    assert queue.finalize_job("job_1") is None
+    queue.complete(task_id, "worker_1")
+    
+    assert queue.finalize_job("job_1") == {"queued": 0, "leased": 0, "done": 1, "failed": 0}
+    assert queue.finalize_job("job_1") is None
+    assert queue.unfinalized_jobs() == []
+
+def test_job_failed_by_lease_expiry_is_unfinalized(queue):
+    task_id = queue.enqueue("job_1", "render", {})
+    for worker_id in ("worker_1", "worker_2"):
+        queue.claim(worker_id)
+        expire_lease(queue, task_id)
+    
+    assert queue.unfinalized_jobs() == ["job_1"]
+    assert queue.finalize_job("job_1")["failed"] == 1
+    assert queue.unfinalized_jobs() == []
+    
+    # A resume enqueues fresh tasks and reopens the job
+    queue.discard_failed("job_1")
+    queue.enqueue("job_1", "render", {})
+    assert queue.unfinalized_jobs() == []
+    assert queue.finalize_job("job_1") is None
+
+def test_preview_class_is_claimed_first(queue):
+    queue.enqueue("job_1", "render", {}, priority_class="batch", cost=1.0)
+    preview_id = queue.enqueue("job_2", "render", {}, priority_class="preview", cost=100.0)
+    
+    assert queue.claim("worker_1")["task_id"] == preview_id
+
+def test_unknown_priority_class_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue("job_1", "render", {}, priority_class="urgent")
+
+def test_fair_share_claims_least_served_user_first(queue):
+    # alice has already used render time; bob's later task goes first
+    queue.enqueue("job_1", "render", {}, user_id="alice", cost=5.0)
+    queue.complete(queue.claim("worker_1")["task_id"], "worker_1")
+    alice_id = queue.enqueue("job_1", "render", {}, user_id="alice", cost=1.0)
+    bob_id = queue.enqueue("job_2", "render", {}, user_id="bob", cost=1.0)
+    
+    assert queue.claim("worker_1")["task_id"] == bob_id
+    assert queue.claim("worker_1")["task_id"] == alice_id
+
+def test_shortest_job_first_within_a_user(queue):
+    long_id = queue.enqueue("job_1", "render", {}, cost=10.0)
+    short_id = queue.enqueue("job_1", "render", {}, cost=1.0)
+    
+    assert queue.claim("worker_1")["task_id"] == short_id
+    assert queue.claim("worker_1")["task_id"] == long_id
+
+def test_task_is_enqueued_once_per_unit(queue):
+    queue.enqueue("job_1", "render", {}, unit="a.json")
+    assert queue.enqueue("job_1", "render", {}, unit="a.json") is None
+    assert queue.enqueue("job_2", "render", {}, unit="a.json") is not None
+    assert queue.get_job_summary("job_1")["queued"] == 1
+    
+    # Tasks without a unit are never deduplicated
+    assert queue.enqueue("job_1", "prepare", {}) is not None
+    assert queue.enqueue("job_1", "prepare", {}) is not None
+
+def test_done_unit_is_not_enqueued_again(queue):
+    task_id = queue.enqueue("job_1", "render", {}, unit="a.json")
+    queue.claim("worker_1")
+    queue.complete(task_id, "worker_1")
+    
+    assert queue.enqueue("job_1", "render", {}, unit="a.json") is None
+
+def test_discarded_unit_can_be_enqueued_again(queue):
+    task_id = queue.enqueue("job_1", "render", {}, unit="a.json")
+    for _ in range(2):
+        queue.claim("worker_1")
+        queue.fail(task_id, "worker_1", "render failed")
+    
+    queue.discard_failed("job_1")
+    assert queue.enqueue("job_1", "render", {}, unit="a.json") is not None
@@ -0,0 +1,63 @@
+"""
+Tests for compiled ranking templates: optional segments, aliases and defaults
+Run with: python -m pytest test_template.py
+"""
+
+import pytest
+
+from template_module import compile_template, TemplateSyntaxError
+
+
+def test_fields_are_declared():
+    template = compile_template("#{rank}. {name}[ - {score}/100]")
+    assert template.fields == {"rank", "name", "score"}
+
+def test_optional_segment_is_kept_when_fields_are_present():
+    template = compile_template("#{rank}. {name}[ - {score}/100]")
+    assert template({"rank": 1, "name": "Yale", "score": 98}) == "#1. Yale - 98/100"
+
+def test_optional_segment_is_dropped_when_a_field_is_missing_or_empty():
+    template = compile_template("#{rank}. {name}[ - {score}/100]")
+    assert template({"rank": 1, "name": "Yale"}) == "#1. Yale"
+    assert template({"rank": 1, "name": "Yale", "score": ""}) == "#1. Yale"
+    assert template({"rank": 1, "name": "Yale", "score": None}) == "#1. Yale"
+
+def test_optional_segment_needs_every_field():
+    template = compile_template("{name}[ ({location}, {score})]")
+    assert template({"name": "Yale", "location": "New Haven"}) == "Yale"
+    assert template({"name": "Yale", "location": "New Haven", "score": 98}) == "Yale (New Haven, 98)"
+
+def test_zero_is_present():
+    template = compile_template("{name}[: {score}]")
+    assert template({"name": "Yale", "score": 0}) == "Yale: 0"
+
+def test_required_fields_fall_back_to_defaults():
+    template = compile_template("#{rank}. {name}")
+    assert template({}) == "#0. Unknown"
+
+def test_score_aliases():
+    template = compile_template("{name}[ - {score}]")
+    assert template({"name": "Yale", "beauty_score": 9.5}) == "Yale - 9.5"
+    assert template({"name": "Yale", "student_life_score": 8}) == "Yale - 8"
+
+def test_format_spec_applies_to_present_values_only():
+    template = compile_template("{name}: {score:.1f}[ ({score:.0f})]")
+    assert template({"name": "Yale", "score": 9.46}) == "Yale: 9.5 (9)"
+    # The default is rendered as is rather than with the numeric spec
+    assert template({"name": "Yale"}) == "Yale: "
+
+def test_literal_brackets_and_braces():
+    template = compile_template("[[{rank}]] {{{name}}}")
+    assert template({"rank": 1, "name": "Yale"}) == "[1] {Yale}"
+
+@pytest.mark.parametrize("source", [
+    "{name}[ - [{score}]]",
+    "{name}]",
+    "{name}[ - {score}",
+    "{name!r}",
+    "{items[0]}",
+    "{name"
+])
+def test_invalid_templates_are_rejected(source):
+    with pytest.raises(TemplateSyntaxError):
+        compile_template(source)
@@ -0,0 +1,134 @@
+from collections import namedtuple
+from functools import lru_cache
+
+# Fonts tried in order when no font file is configured. Bare file names are
+# looked up by Pillow in the system font directories.
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+    "DejaVuSans-Bold.ttf",
+    "Arial Bold.ttf"
+]
+
+ELLIPSIS = "..."
+
+# A measured, wrapped block of text. Layouts are cached and shared, so they
+# are immutable; line_widths are advance widths in pixels.
+TextLayout = namedtuple("TextLayout", ["lines", "line_widths", "font_path", "font_size", "line_height",
+                                       "width", "height"])
+
+
+@lru_cache(maxsize=None)
+def find_font(font_path=None):
+    """
+    Font file to draw with: font_path if it loads, else the first candidate
+    that does, or None for Pillow's built-in font
+    """
+    from PIL import ImageFont
+    
+    for candidate in ([font_path] if font_path else []) + FONT_CANDIDATES:
+        try:
+            ImageFont.truetype(candidate, 12)
+            return candidate
+        except OSError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=128)
+def get_font(font_path, size):
+    """FreeType font at a pixel size; each (font, size) is loaded once per process"""
+    from PIL import ImageFont
+    
+    if font_path is None:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            # Pillow before 10.1 only has a fixed-size bitmap font
+            return ImageFont.load_default()
+    return ImageFont.truetype(font_path, size)
+
+
+def _wrap(font, words, max_width):
+    """Greedy word wrap by measured width; a word wider than max_width gets a line of its own"""
+    lines = []
+    current = ""
+    for word in words:
+        candidate = f"{current} {word}" if current else word
+        if not current or font.getlength(candidate) <= max_width:
+            current = candidate
+        else:
+            lines.append(current)
+            current = word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def _ellipsize(font, text, max_width):
+    """Shorten text to fit max_width, marking the cut with an ellipsis"""
+    if font.getlength(text) <= max_width:
+        return text
+    while text and font.getlength(text + ELLIPSIS) > max_width:
+        text = text[:-1]
+    return text.rstrip() + ELLIPSIS
+
+
+@lru_cache(maxsize=4096)
+def layout_text(text, font_size, max_width, max_lines=2, min_font_size=None, font_path=None, line_spacing=0.15):
+    """
+    Wrap text into at most max_lines lines no wider than max_width pixels,
+    shrinking the font from font_size towards min_font_size (default: half
+    of font_size) until it fits. Text that still does not fit at the
+    smallest size is cut with an ellipsis. Layouts are cached per string,
+    size and width, so repeated names cost a dictionary lookup.
+    """
+    path = find_font(font_path)
+    words = text.split()
+    min_font_size = min_font_size or max(1, font_size // 2)
+    
+    size = font_size
+    while True:
+        font = get_font(path, size)
+        lines = _wrap(font, words, max_width)
+        fits = len(lines) <= max_lines and all(font.getlength(line) <= max_width for line in lines)
+        if fits or size <= min_font_size:
+            break
+        size = max(min_font_size, min(size - 1, int(size * 0.9)))
+    
+    if len(lines) > max_lines:
+        lines = lines[:max_lines - 1] + [" ".join(lines[max_lines - 1:])]
+    lines = [_ellipsize(font, line, max_width) for line in lines]
+    
+    if hasattr(font, "getmetrics"):
+        ascent, descent = font.getmetrics()
+    else:
+        ascent, descent = font.getbbox("Ag")[3], 0
+    line_height = ascent + descent + int(size * line_spacing)
+    line_widths = tuple(font.getlength(line) for line in lines)
+    height = line_height * len(lines) - int(size * line_spacing) if lines else 0
+    return TextLayout(tuple(lines), line_widths, path, size, line_height,
+                      int(max(line_widths, default=0) + 0.5), height)
+
+
+def draw_text_mask(layout, width, height=None):
+    """
+    Coverage mask (uint8, height x width) of a layout, each line centered
+    horizontally and the block centered vertically; height defaults to the
+    layout's own
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+    
+    height = height or layout.height
+    image = Image.new("L", (width, max(height, 1)), 0)
+    draw = ImageDraw.Draw(image)
+    font = get_font(layout.font_path, layout.font_size)
+    
+    y = (height - layout.height) // 2
+    for line, line_width in zip(layout.lines, layout.line_widths):
+        draw.text(((width - line_width) / 2, y), line, font=font, fill=255)
+        y += layout.line_height
+    return np.array(image)
@@ -0,0 +1,73 @@
+from functools import lru_cache
+
+# Transition kinds between overlays; "cut" switches with no transition
+TRANSITIONS = ("cut", "crossfade", "slide", "wipe")
+
+
+def smoothstep(p):
+    """Ease in and out: 0 -> 0, 1 -> 1, with zero slope at both ends"""
+    return p * p * (3 - 2 * p)
+
+
+@lru_cache(maxsize=None)
+def fade_tables():
+    """
+    Lookup tables for fading uint8 premultiplied overlays by a weight w in
+    0..255: scale[w, x] = round(x * w / 255) fades a premultiplied pixel,
+    inverse[w, v] = 255 - scale[w, 255 - v] fades an inverse alpha. Built
+    once per process (128 KB), so a fade is two table lookups per pixel.
+    """
+    import numpy as np
+    
+    levels = np.arange(256, dtype=np.uint32)
+    scale = ((levels[:, np.newaxis] * levels[np.newaxis, :] + 127) // 255).astype(np.uint8)
+    inverse = (255 - scale[:, ::-1]).astype(np.uint8)
+    scale.flags.writeable = False
+    inverse.flags.writeable = False
+    return scale, inverse
+
+
+class Transition:
+    """
+    Per-frame tables for one kind of transition at a duration and frame
+    rate, computed once and shared by every overlay and render that uses
+    them. On the n-th frame after a cut, an overlay coming in is drawn as
+    entering[n] and the one going out as leaving[n], each a (weight, shift,
+    reveal) state: opacity 0..255, horizontal offset as a fraction of the
+    frame width, and the (from, to) fraction of the overlay's columns shown.
+    """
+    def __init__(self, kind, duration, fps):
+        if kind not in TRANSITIONS or kind == "cut":
+            raise ValueError(f"Unknown transition {kind!r}; expected one of {', '.join(TRANSITIONS[1:])}")
+        self.kind = kind
+        self.fps = fps
+        self.frames = max(1, round(duration * fps))
+        self.duration = self.frames / fps
+        
+        # Both sides use the same eased progress, so the weights of a
+        # crossfade sum to 255 on every frame
+        progress = [smoothstep((n + 1) / (self.frames + 1)) for n in range(self.frames)]
+        self.entering = tuple(self._state(p, leaving=False) for p in progress)
+        self.leaving = tuple(self._state(p, leaving=True) for p in progress)
+    
+    def _state(self, p, leaving):
+        if self.kind == "crossfade":
+            weight = round(255 * p)
+            return 255 - weight if leaving else weight, 0.0, (0.0, 1.0)
+        if self.kind == "slide":
+            # In from the right, out to the left
+            return 255, -p if leaving else 1 - p, (0.0, 1.0)
+        # Wipe: the edge sweeps left to right, hiding the old overlay as it reveals the new one
+        return 255, 0.0, (p, 1.0) if leaving else (0.0, p)
+    
+    def step(self, elapsed):
+        """Index of the frame shown elapsed seconds after the cut"""
+        return min(self.frames - 1, max(0, round(elapsed * self.fps)))
+
+
+@lru_cache(maxsize=64)
+def get_transition(kind, duration, fps):
+    """Shared Transition for a kind, duration and frame rate; None for cuts"""
+    if not kind or kind == "cut" or duration <= 0:
+        return None
+    return Transition(kind, duration, fps)
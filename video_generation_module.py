@@ -1,41 +1,127 @@
 import os
 import json
 import random
-import textwrap
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
-import cv2
-import moviepy.editor as mp
-from moviepy.editor import *
 import time
+import shutil
+from contextlib import ExitStack
+from functools import lru_cache
+from metrics_module import RENDER_LATENCY, VIDEOS_RENDERED, BYTES_WRITTEN, CACHE_HITS
+from template_module import compile_template
+from record_stream_module import JsonlWriter, JsonlIndex, read_records
+from category_registry_module import CategoryRegistry, category_id
+from compositing_module import (FrameCompositor, FrameRing, AlphaBlender, prepare_overlay, encode_compositions,
+                                crop_canvas)
+from text_layout_module import layout_text, draw_text_mask
+from transition_module import get_transition
+from encoder_module import ENCODER_PROFILES, encoder_params, start_encoder
+
+# Raw ranking files with the category and default template each is formatted as
+RANKING_SOURCES = [
+    # US News rankings
+    ("us_news_national-universities.json", "Top National Universities", "score_based"),
+    # Princeton Review rankings
+    ("princeton_review_most-beautiful-campus.json", "Most Beautiful Campuses", "standard"),
+    ("princeton_review_happiest-students.json", "Happiest Students", "standard"),
+    # Niche rankings
+    ("niche_best-college-campuses.json", "Best College Campuses", "standard"),
+    ("niche_best-food.json", "Best Campus Food", "standard"),
+    ("niche_best-dorms.json", "Best College Dorms", "standard"),
+    # Custom rankings
+    ("custom_ivy_league_beauty.json", "Most Beautiful Ivy League Campuses", "score_based"),
+    ("custom_best_student_life.json", "Best Student Life", "score_based")
+]
+# Render modes. Layout is defined at full resolution and scaled to the mode's
+# frame size; previews trade quality for speed to check layout and text.
+# profile is the default encoder_module.ENCODER_PROFILES entry.
+RENDER_MODES = {
+    "full": {"width": 1080, "height": 1920, "fps": 30, "profile": "publish"},
+    "preview": {"width": 270, "height": 480, "fps": 10, "profile": "preview"}
+}
+# Output aspects at full resolution, scaled like the render mode. "vertical"
+# (TikTok/Shorts) is the main video; the others are extra cuts of it.
+ASPECT_FORMATS = {
+    "vertical": (1080, 1920),
+    "square": (1080, 1080),
+    "landscape": (1920, 1080)
+}
+
+
+def estimate_render_cost(item_count, render_mode="full", duration=15):
+    """
+    Relative cost of one render for scheduling: frames times the layers
+    composited per frame (background, title, item and description overlays).
+    Needs no engine, so jobs can be costed before one is constructed.
+    """
+    layers = 2 + 2 * min(item_count, 5)
+    return duration * RENDER_MODES[render_mode]["fps"] * layers / 1000
+
+
+@lru_cache(maxsize=256)
+def build_layout_plan(title, items, title_font_size, item_font_size, description_font_size):
+    """
+    Overlay plan for a ranking: (text, font size, start, duration, position)
+    per overlay, in full-resolution units. It does not depend on the render
+    mode, so a full render reuses the plan of a previewed ranking.
+    items is a tuple of (text, description) pairs.
+    """
+    plan = [(title, title_font_size, 0, 3, "top")]
+    for i, (item_text, item_desc) in enumerate(items[:5]):  # Show top 5 for demo
+        # Start after title, 2 seconds per item
+        start_time = 3 + i * 2
+        plan.append((item_text, item_font_size, start_time, 2, "center"))
+        plan.append((item_desc, description_font_size, start_time, 2, "bottom"))
+    return tuple(plan)
+
+# Templates for different ranking categories. Fields in [...] are optional:
+# the segment is left out when a field is missing.
+RANKING_TEMPLATES = {
+    "standard": {
+        "title_format": "{category} Rankings",
+        "item_format": "#{rank}. {name}",
+        "description_format": "[Located in {location}]"
+    },
+    "score_based": {
+        "title_format": "Top {count} {category}",
+        "item_format": "#{rank}. {name}[ - {score}/100]",
+        "description_format": "{location}"
+    },
+    "comparison": {
+        "title_format": "{category} Comparison",
+        "item_format": "#{rank}. {name}",
+        "description_format": "[Score: {score}]"
+    }
+}
+
 
 class RankingFormatter:
     """
     Converts raw ranking data into visually appealing ranking sequences
     """
-    def __init__(self, data_dir="/home/ubuntu/college_data", output_dir="/home/ubuntu/formatted_rankings"):
+    def __init__(self, data_dir="/home/ubuntu/college_data", output_dir="/home/ubuntu/formatted_rankings",
+                 output_format="json"):
         self.data_dir = data_dir
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         
-        # Define templates for different ranking categories
-        self.templates = {
-            "standard": {
-                "title_format": "{category} Rankings",
-                "item_format": "#{rank}. {name}",
-                "description_format": "Located in {location}"
-            },
-            "score_based": {
-                "title_format": "Top {count} {category}",
-                "item_format": "#{rank}. {name} - {score}/100",
-                "description_format": "{location}"
-            },
-            "comparison": {
-                "title_format": "{category} Comparison",
-                "item_format": "#{rank}. {name}",
-                "description_format": "{metric}: {value}"
-            }
+        # "json" writes one indented file per ranking; "jsonl" appends compact
+        # records keyed by id to a single stream for large batches
+        self.output_format = output_format
+        self.stream_file = os.path.join(output_dir, "rankings.jsonl")
+        
+        # Each category's default ranking is registered under its canonical id
+        self.registry = CategoryRegistry(os.path.join(output_dir, "categories.jsonl"))
+        
+        # Templates for different ranking categories, copied so a formatter
+        # can add or change its own
+        self.templates = {name: dict(template) for name, template in RANKING_TEMPLATES.items()}
+        self.compile_templates()
+    
+    def compile_templates(self):
+        """Compile every template once; call again after changing self.templates"""
+        self.compiled_templates = {
+            name: {part: compile_template(source) for part, source in template.items()}
+            for name, template in self.templates.items()
         }
     
     def load_ranking_data(self, filename):
@@ -47,115 +133,277 @@ class RankingFormatter:
             print(f"File not found: {filename}")
             return []
     
-    def format_ranking(self, data, category, template_type="standard", count=10):
-        """Format ranking data using specified template"""
-        print(f"Formatting {category} ranking...")
-        
-        # Select template
-        template = self.templates.get(template_type, self.templates["standard"])
+    def build_ranking(self, data, category, template_type="standard", count=10, created_at=None):
+        """Format ranking data using the compiled template, without saving it"""
+        template = self.compiled_templates.get(template_type, self.compiled_templates["standard"])
+        render_item = template["item_format"].render
+        render_description = template["description_format"].render
         
-        # Format title
-        title = template["title_format"].format(category=category, count=count)
-        
-        # Format items
-        items = []
-        for item in data[:count]:
-            rank = item.get("rank", 0)
-            name = item.get("name", "Unknown")
-            location = item.get("location", "")
-            score = item.get("score", "")
-            
-            formatted_item = {
-                "rank": rank,
-                "text": template["item_format"].format(rank=rank, name=name, score=score),
-                "description": template["description_format"].format(location=location, metric="Score", value=score)
-            }
-            items.append(formatted_item)
-        
-        # Create formatted ranking
-        formatted_ranking = {
-            "title": title,
+        return {
+            "title": template["title_format"].render({"category": category, "count": count}),
             "category": category,
             "count": count,
-            "items": items,
+            "items": [
+                {"rank": item.get("rank", 0), "text": render_item(item), "description": render_description(item)}
+                for item in data[:count]
+            ],
             "template_type": template_type,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "created_at": created_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
+    
+    def get_ranking_id(self, output_name):
+        """Name consumers use to load a saved ranking: its file, or its record id in the stream"""
+        return output_name if self.output_format == "jsonl" else f"{output_name}.json"
+    
+    def registry_entry(self, formatted_ranking, output_name=None):
+        """Registry entry for a ranking saved under its default name, or None for a named variant"""
+        if output_name is not None:
+            return None
+        ranking_file = self.get_ranking_id(formatted_ranking["category"].lower().replace(' ', '_'))
+        return self.registry.entry(formatted_ranking["category"], ranking_file, formatted_ranking["template_type"])
+    
+    def save_ranking(self, formatted_ranking, output_name=None, writer=None, register=True):
+        """
+        Save a formatted ranking as output_name (default: the category slug);
+        returns the path. In jsonl mode the ranking is appended to the stream,
+        through writer if one is open. With register, a ranking saved under
+        its default name is then registered for its category.
+        """
+        entry = self.registry_entry(formatted_ranking, output_name)
+        if output_name is None:
+            output_name = formatted_ranking["category"].lower().replace(' ', '_')
         
-        # Save formatted ranking
-        output_file = os.path.join(self.output_dir, f"{category.lower().replace(' ', '_')}.json")
-        with open(output_file, 'w') as f:
-            json.dump(formatted_ranking, f, indent=4)
+        if self.output_format == "jsonl":
+            record = dict(formatted_ranking, id=output_name)
+            if writer:
+                writer.write(record)
+            else:
+                with JsonlWriter(self.stream_file) as stream:
+                    stream.write(record)
+            output_file = self.stream_file
+        else:
+            output_file = os.path.join(self.output_dir, f"{output_name}.json")
+            with open(output_file, 'w') as f:
+                json.dump(formatted_ranking, f, indent=4)
         
+        if register and entry:
+            self.registry.register([entry])
+        return output_file
+    
+    def format_ranking(self, data, category, template_type="standard", count=10, output_name=None):
+        """
+        Format ranking data using specified template. The result is saved as
+        output_name (default: the category slug) in the output directory.
+        """
+        print(f"Formatting {category} ranking...")
+        formatted_ranking = self.build_ranking(data, category, template_type, count)
+        output_file = self.save_ranking(formatted_ranking, output_name)
         print(f"Formatted ranking saved to {output_file}")
         return formatted_ranking
     
-    def format_all_rankings(self):
-        """Format all available rankings"""
-        # Format US News rankings
-        us_news_data = self.load_ranking_data("us_news_national-universities.json")
-        self.format_ranking(us_news_data, "Top National Universities", "score_based")
-        
-        # Format Princeton Review rankings
-        princeton_beautiful = self.load_ranking_data("princeton_review_most-beautiful-campus.json")
-        self.format_ranking(princeton_beautiful, "Most Beautiful Campuses", "standard")
-        
-        princeton_happy = self.load_ranking_data("princeton_review_happiest-students.json")
-        self.format_ranking(princeton_happy, "Happiest Students", "standard")
-        
-        # Format Niche rankings
-        niche_campuses = self.load_ranking_data("niche_best-college-campuses.json")
-        self.format_ranking(niche_campuses, "Best College Campuses", "standard")
+    def format_rankings(self, rankings, save=True, replace=False):
+        """
+        Format many ranking lists in one call. rankings yields (data, category,
+        template_type) tuples, optionally followed by count and output_name.
+        Returns the formatted rankings; with save they are also written out
+        and registered. In jsonl mode the batch shares one stream writer, and
+        replace swaps in a fresh stream (and registry) instead of appending to
+        the existing one.
+        """
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        writer = None
+        if save and self.output_format == "jsonl":
+            writer = JsonlWriter(self.stream_file, replace=replace)
         
-        niche_food = self.load_ranking_data("niche_best-food.json")
-        self.format_ranking(niche_food, "Best Campus Food", "standard")
+        formatted_rankings = []
+        entries = []
+        try:
+            for data, category, template_type, *options in rankings:
+                count = options[0] if options else 10
+                output_name = options[1] if len(options) > 1 else None
+                formatted_ranking = self.build_ranking(data, category, template_type, count, created_at)
+                if save:
+                    self.save_ranking(formatted_ranking, output_name, writer, register=False)
+                    entry = self.registry_entry(formatted_ranking, output_name)
+                    if entry:
+                        entries.append(entry)
+                formatted_rankings.append(formatted_ranking)
+        except Exception:
+            if writer:
+                writer.close(commit=False)
+            raise
+        if writer:
+            writer.close()
+        # Registered once the batch is written, so the registry never points
+        # at uncommitted records
+        if entries or (save and replace):
+            self.registry.register(entries, replace=replace)
         
-        niche_dorms = self.load_ranking_data("niche_best-dorms.json")
-        self.format_ranking(niche_dorms, "Best College Dorms", "standard")
+        print(f"Formatted {len(formatted_rankings)} rankings")
+        return formatted_rankings
+    
+    def format_all_rankings(self):
+        """Format all available rankings"""
+        self.format_rankings(((self.load_ranking_data(source_file), category, template_type)
+                              for source_file, category, template_type in RANKING_SOURCES), replace=True)
         
-        # Format custom rankings
-        ivy_beauty = self.load_ranking_data("custom_ivy_league_beauty.json")
-        self.format_ranking(ivy_beauty, "Most Beautiful Ivy League Campuses", "score_based")
+        print("All rankings formatted successfully!")
+    
+    def build_variant(self, category, template_type):
+        """
+        Format one category with a specific template without saving it.
+        Returns (output_name, formatted ranking), or None for an unknown
+        category or template.
+        """
+        if template_type not in self.templates:
+            print(f"Unknown template type: {template_type}")
+            return None
         
-        student_life = self.load_ranking_data("custom_best_student_life.json")
-        self.format_ranking(student_life, "Best Student Life", "score_based")
+        for source_file, source_category, _ in RANKING_SOURCES:
+            if category_id(source_category) == category_id(category):
+                output_name = f"{source_category.lower().replace(' ', '_')}__{template_type}"
+                data = self.load_ranking_data(source_file)
+                return output_name, self.build_ranking(data, source_category, template_type)
         
-        print("All rankings formatted successfully!")
+        print(f"No ranking source for category: {category}")
+        return None
+    
+    def format_variant(self, category, template_type):
+        """
+        Format one category with a specific template for batch renders.
+        Returns the ranking id, or None for an unknown category or template.
+        """
+        variant = self.build_variant(category, template_type)
+        if variant is None:
+            return None
+        output_name, formatted_ranking = variant
+        output_file = self.save_ranking(formatted_ranking, output_name)
+        print(f"Formatted ranking saved to {output_file}")
+        return self.get_ranking_id(output_name)
 
 
 class VideoCompositionEngine:
     """
-    Creates short-form videos by combining campus images with ranking data
+    Creates short-form videos by combining campus images with ranking data.
+    numpy, cv2, PIL and MoviePy are imported inside the methods that use them,
+    so importing this module (e.g. for RankingFormatter) stays cheap.
     """
     def __init__(self, 
                  rankings_dir="/home/ubuntu/formatted_rankings", 
                  images_dir="/home/ubuntu/campus_images",
                  audio_dir="/home/ubuntu/trending_audio",
-                 output_dir="/home/ubuntu/generated_videos"):
+                 output_dir="/home/ubuntu/generated_videos",
+                 render_mode="full",
+                 rankings_stream=None):
         self.rankings_dir = rankings_dir
         self.images_dir = images_dir
         self.audio_dir = audio_dir
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         
-        # Video settings
-        self.video_width = 1080  # TikTok/Shorts vertical format
-        self.video_height = 1920
-        self.fps = 30
+        # With a rankings stream (RankingFormatter's jsonl mode), rankings are
+        # looked up by id through an offset index instead of one file each,
+        # and every render is recorded in a manifest stream for the audio step
+        self.rankings_index = JsonlIndex(rankings_stream) if rankings_stream else None
+        self.manifest_file = os.path.join(output_dir, "renders.jsonl") if rankings_stream else None
+        
+        # Video settings: TikTok/Shorts vertical format at the render mode's
+        # resolution, frame rate and encoder profile
         self.duration = 15  # 15 seconds per video
+        self.set_render_mode(render_mode)
         
-        # Font settings (would use actual font files in real implementation)
+        # Rendering settings. Placeholder mode (the default) describes the video
+        # in a text file; set render_mp4 to encode the composited clip as well.
+        # +faststart moves the moov atom to the front so playback can begin
+        # before the whole file has downloaded.
+        self.render_mp4 = False
+        self.video_codec = "libx264"
+        self.ffmpeg_params = ["-movflags", "+faststart"]
+        
+        # Optional encoder_module.EncoderPool shared between renders; ring
+        # renders then take encoders started ahead of time from it
+        self.encoder_pool = None
+        
+        # Compositing. "ring" composites each frame in place into a ring of
+        # preallocated buffers that an ffmpeg pipe encodes from, blending text
+        # with a uint8 premultiplied-alpha kernel, so a render allocates no
+        # per-frame memory; "moviepy" uses CompositeVideoClip
+        self.compositor = "ring"
+        self.frame_ring_slots = 3
+        self.frame_rings = {}
+        self.alpha_blender = AlphaBlender()
+        
+        # Extra cuts rendered alongside the vertical video when encoding MP4s
+        # (ASPECT_FORMATS names, ring compositor only), written next to the
+        # main video as <name>_<aspect>.mp4; the preview API sets them per
+        # request. The aspects share one frame loop and background, but each
+        # is copied, blended and encoded at its own size, so a render costs
+        # about the sum of its aspects' pixel counts
+        self.extra_aspects = []
+        
+        # Transition between consecutive overlays ("cut", "crossfade", "slide"
+        # or "wipe"), drawn by the ring compositor from per-frame tables
+        # shared across renders; the MoviePy path always cuts
+        self.transition = "crossfade"
+        self.transition_duration = 0.5
+        
+        # Thumbnail settings for the gallery: a WebP poster frame and a small
+        # animated WebP preview, both sampled from the composited clip
+        self.poster_time = 3.5  # First ranked item is on screen
+        self.poster_width = 270
+        self.preview_width = 135
+        self.preview_fps = 2
+        
+        # Font settings in full-resolution pixels, scaled by self.scale when
+        # drawn. Text is wrapped to the frame width less the margins and
+        # shrunk (to half size at most) to fit text_max_lines; font_path
+        # None uses the first of text_layout_module.FONT_CANDIDATES found.
         self.title_font_size = 70
         self.item_font_size = 60
         self.description_font_size = 40
+        self.font_path = None
+        self.text_margin = 50
+        self.text_max_lines = 2
         
         # Colors
         self.background_color = (0, 0, 0)  # Black
         self.text_color = (255, 255, 255)  # White
         self.highlight_color = (255, 0, 0)  # Red
+        
+        # Setup shared between renders made by this engine: backgrounds per
+        # category, text overlays per (text, style), and the outputs of the
+        # last composition so mood variants of a ranking reuse its encode
+        self.background_cache = {}
+        self.text_mask_cache = {}
+        self.text_overlay_cache = {}
+        self.text_clip_cache = {}
+        self.last_composition = None
+    
+    def set_render_mode(self, render_mode):
+        """Switch between full-quality and fast preview rendering"""
+        settings = RENDER_MODES[render_mode]
+        self.render_mode = render_mode
+        self.video_width = settings["width"]
+        self.video_height = settings["height"]
+        self.fps = settings["fps"]
+        self.encoder_profile = settings["profile"]
+        # Positions and font sizes are laid out at full resolution
+        self.scale = self.video_width / RENDER_MODES["full"]["width"]
+    
+    def list_rankings(self):
+        """Names of the available formatted rankings"""
+        if self.rankings_index:
+            return self.rankings_index.keys()
+        return sorted(f for f in os.listdir(self.rankings_dir) if f.endswith('.json'))
     
     def load_ranking_data(self, filename):
         """Load formatted ranking data"""
+        if self.rankings_index:
+            ranking_data = self.rankings_index.get(filename)
+            if ranking_data is None:
+                print(f"Ranking not found in stream: {filename}")
+            return ranking_data
+        
         try:
             with open(os.path.join(self.rankings_dir, filename), 'r') as f:
                 return json.load(f)
@@ -163,13 +411,30 @@ class VideoCompositionEngine:
             print(f"Ranking file not found: {filename}")
             return None
     
-    def get_placeholder_image(self, category):
+    def get_aspect_size(self, aspect):
+        """Frame size of an output aspect in the current render mode, rounded to even for yuv420p"""
+        width, height = ASPECT_FORMATS[aspect]
+        return 2 * round(width * self.scale / 2), 2 * round(height * self.scale / 2)
+    
+    def get_placeholder_image(self, category, width=None, height=None):
         """
         In a real implementation, this would select an appropriate image.
         For this demo, we'll create a placeholder image.
+        width and height default to the video frame; a larger canvas keeps
+        the image centered, so every aspect can be cropped from it.
         """
+        import numpy as np
+        import cv2
+        
+        width = width or self.video_width
+        height = height or self.video_height
+        key = (category, width, height)
+        if key in self.background_cache:
+            CACHE_HITS.inc(cache="background")
+            return self.background_cache[key]
+        
         # Create a blank image
-        img = np.zeros((self.video_height, self.video_width, 3), dtype=np.uint8)
+        img = np.zeros((height, width, 3), dtype=np.uint8)
         
         # Fill with a color based on category
         if "beautiful" in category.lower():
@@ -185,11 +450,16 @@ class VideoCompositionEngine:
         
         # Add text to indicate this is a placeholder
         font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(img, f"Campus Image for", (int(self.video_width/2) - 200, int(self.video_height/2) - 50), 
-                   font, 1, (255, 255, 255), 2, cv2.LINE_AA)
-        cv2.putText(img, f"{category}", (int(self.video_width/2) - 200, int(self.video_height/2) + 50), 
-                   font, 1, (255, 255, 255), 2, cv2.LINE_AA)
+        scale = self.scale
+        thickness = max(1, round(2 * scale))
+        cv2.putText(img, f"Campus Image for", (int(width/2 - 200 * scale), int(height/2 - 50 * scale)), 
+                   font, scale, (255, 255, 255), thickness, cv2.LINE_AA)
+        cv2.putText(img, f"{category}", (int(width/2 - 200 * scale), int(height/2 + 50 * scale)), 
+                   font, scale, (255, 255, 255), thickness, cv2.LINE_AA)
         
+        # Clips only read the array, so one copy can back every render
+        img.flags.writeable = False
+        self.background_cache[key] = img
         return img
     
     def apply_camera_movement(self, clip, movement_type="pan"):
@@ -215,33 +485,262 @@ class VideoCompositionEngine:
         else:
             return clip
     
-    def create_text_clip(self, text, font_size, color, duration, position="center"):
-        """Create a text clip with the specified properties"""
-        # In a real implementation, this would create actual text clips
-        # For this demo, we'll create a placeholder image with text
-        img = np.zeros((200, self.video_width, 3), dtype=np.uint8)
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(img, text, (50, 100), font, font_size/30, color, 2, cv2.LINE_AA)
+    def render_text_mask(self, text, font_size, width=None):
+        """
+        Draw text into the coverage mask (uint8 alpha) of an overlay band,
+        wrapped and fitted by text_layout_module to a frame width (default:
+        the video's). font_size is in full-resolution pixels and scaled to
+        the render mode. Masks are read-only and cached, since the same text
+        recurs across renders and across aspects of the same width.
+        """
+        scale = self.scale
+        width = width or self.video_width
+        key = (text, font_size, self.font_path, width, scale)
+        if key in self.text_mask_cache:
+            CACHE_HITS.inc(cache="text_mask")
+            return self.text_mask_cache[key]
         
-        # Convert to MoviePy clip
-        text_clip = ImageClip(img).set_duration(duration)
+        layout = layout_text(text, max(1, round(font_size * scale)), width - 2 * int(self.text_margin * scale),
+                             self.text_max_lines, font_path=self.font_path)
+        # Bands are at least as tall as one 200px row, so positions don't shift with line count
+        mask = draw_text_mask(layout, width, max(int(200 * scale), layout.height))
         
-        # Set position
-        if position == "top":
-            text_clip = text_clip.set_position(("center", 100))
-        elif position == "bottom":
-            text_clip = text_clip.set_position(("center", self.video_height - 300))
+        mask.flags.writeable = False
+        self.text_mask_cache[key] = mask
+        return mask
+    
+    def get_text_overlay(self, text, font_size, color, width=None):
+        """
+        Premultiplied text overlay for the blending kernel, cropped to the
+        drawn pixels: (premultiplied, inverse_alpha, x_offset, y_offset)
+        within the band, or None for blank text
+        """
+        width = width or self.video_width
+        key = (text, font_size, tuple(color), self.font_path, width, self.scale)
+        if key not in self.text_overlay_cache:
+            self.text_overlay_cache[key] = prepare_overlay(self.render_text_mask(text, font_size, width), color)
         else:
-            text_clip = text_clip.set_position("center")
+            CACHE_HITS.inc(cache="text_overlay")
+        return self.text_overlay_cache[key]
+    
+    def get_overlay_position(self, image, position="center", frame_size=None):
+        """
+        Top-left (x, y) of an overlay in a frame (default: the video's):
+        centered horizontally, placed at the top, bottom or center
+        """
+        frame_width, frame_height = frame_size or (self.video_width, self.video_height)
+        height, width = image.shape[:2]
+        x = (frame_width - width) // 2
+        if position == "top":
+            return x, int(100 * self.scale)
+        if position == "bottom":
+            return x, frame_height - int(300 * self.scale)
+        return x, (frame_height - height) // 2
+    
+    def create_text_clip(self, text, font_size, color, duration, position="center"):
+        """
+        Create a text clip with the specified properties. font_size and the
+        positions are in full-resolution pixels and scaled to the render mode.
+        """
+        import numpy as np
+        import moviepy.editor as mp
+        
+        # Clips are immutable (set_start returns a copy), so identical
+        # overlays are rendered once and shared
+        key = (text, font_size, tuple(color), duration, position, self.video_width, self.video_height)
+        if key in self.text_clip_cache:
+            CACHE_HITS.inc(cache="text_clip")
+            return self.text_clip_cache[key]
+        
+        # A solid color band shown through the text's coverage mask
+        mask = self.render_text_mask(text, font_size)
+        band = np.empty(mask.shape + (3,), dtype=np.uint8)
+        band[:] = color
+        text_clip = (mp.ImageClip(band).set_mask(mp.ImageClip(mask / 255.0, ismask=True))
+                     .set_duration(duration).set_position(self.get_overlay_position(mask, position)))
         
+        self.text_clip_cache[key] = text_clip
         return text_clip
     
-    def create_ranking_video(self, ranking_file, audio_mood="calm"):
-        """Create a short-form video for the specified ranking"""
+    def get_frame_ring(self, width, height):
+        """Frame ring for a frame size, allocated once per engine and reused by every render"""
+        key = (width, height)
+        if key not in self.frame_rings:
+            self.frame_rings[key] = FrameRing(width, height, self.frame_ring_slots)
+        return self.frame_rings[key]
+    
+    def encode_frames(self, compositors, output_files):
+        """
+        Encode FrameCompositors in one pass, each through its own frame ring
+        and ffmpeg pipe, so the encodes run in parallel
+        """
+        with ExitStack() as stack:
+            outputs = []
+            for compositor, output_file in zip(compositors, output_files):
+                size = (compositor.width, compositor.height)
+                if self.encoder_pool:
+                    encoder = self.encoder_pool.encoder(output_file, *size, self.fps, self.encoder_profile,
+                                                        self.video_codec, self.ffmpeg_params)
+                else:
+                    encoder = start_encoder(output_file, *size, self.fps, self.encoder_profile, self.video_codec,
+                                            self.ffmpeg_params)
+                outputs.append((compositor, self.get_frame_ring(*size), stack.enter_context(encoder)))
+            encode_compositions(outputs, self.fps)
+    
+    def write_video_files(self, videos, output_files):
+        """
+        Encode composited videos to MP4 with the moov atom at the front;
+        FrameCompositors are encoded together in a single pass
+        """
+        # Encode under temporary names and rename, so a half-written file is
+        # never picked up by the audio or publishing steps
+        temp_files = [output_file.replace(".mp4", ".partial.mp4") for output_file in output_files]
+        if all(isinstance(video, FrameCompositor) for video in videos):
+            self.encode_frames(videos, temp_files)
+        else:
+            preset = ENCODER_PROFILES[self.encoder_profile]["preset"]
+            params = encoder_params(self.encoder_profile, self.fps) + self.ffmpeg_params
+            for video, temp_file in zip(videos, temp_files):
+                video.write_videofile(temp_file, fps=self.fps, codec=self.video_codec, preset=preset,
+                                      audio=False, ffmpeg_params=params, logger=None)
+        for temp_file, output_file in zip(temp_files, output_files):
+            os.replace(temp_file, output_file)
+        return output_files
+    
+    def write_video_file(self, video, output_file):
+        """Encode a composited clip to MP4 with the moov atom at the front"""
+        return self.write_video_files([video], [output_file])[0]
+    
+    def get_thumbnail_paths(self, video_file):
+        """Return the (poster, preview) paths that belong to a rendered video"""
+        base = os.path.splitext(video_file)[0]
+        return f"{base}_poster.webp", f"{base}_preview.webp"
+    
+    def create_thumbnails(self, video, output_file):
+        """
+        Save a WebP poster frame and an animated WebP preview. Frames come from
+        the composited clip in memory, so the encoded video is never decoded.
+        """
+        import numpy as np
+        from PIL import Image
+        
+        poster_file, preview_file = self.get_thumbnail_paths(output_file)
+        aspect = self.video_height / self.video_width
+        
+        # Written under temporary names and renamed: published thumbnails are
+        # hard links to these files, so they must get a new inode rather than
+        # be overwritten in place
+        poster_size = (self.poster_width, int(self.poster_width * aspect))
+        poster = Image.fromarray(video.get_frame(self.poster_time)).resize(poster_size, Image.BILINEAR)
+        poster.save(poster_file + ".tmp", "WEBP", quality=70, method=4)
+        os.replace(poster_file + ".tmp", poster_file)
+        
+        preview_size = (self.preview_width, int(self.preview_width * aspect))
+        frames = [Image.fromarray(video.get_frame(t)).resize(preview_size, Image.BILINEAR)
+                  for t in np.arange(0, video.duration, 1 / self.preview_fps)]
+        frames[0].save(preview_file + ".tmp", "WEBP", save_all=True, append_images=frames[1:],
+                       duration=int(1000 / self.preview_fps), loop=0, quality=40, method=4)
+        os.replace(preview_file + ".tmp", preview_file)
+        
+        return poster_file, preview_file
+    
+    def get_aspect_outputs(self, output_file):
+        """MP4 path per aspect rendered: the vertical video, plus extra_aspects with the ring compositor"""
+        outputs = {"vertical": output_file}
+        if self.compositor == "ring":
+            base = os.path.splitext(output_file)[0]
+            for aspect in self.extra_aspects:
+                if aspect != "vertical":
+                    outputs[aspect] = f"{base}_{aspect}.mp4"
+        return outputs
+    
+    def compose_overlays(self, plan, frame_size):
+        """Timed text overlays of a layout plan laid out for a frame size, in FrameCompositor's format"""
+        overlays = []
+        for text, font_size, start_time, duration, position in plan:
+            overlay = self.get_text_overlay(text, font_size, self.text_color, frame_size[0])
+            if overlay is None:
+                continue
+            premultiplied, inverse_alpha, dx, dy = overlay
+            x, y = self.get_overlay_position(self.render_text_mask(text, font_size, frame_size[0]), position,
+                                             frame_size)
+            overlays.append((premultiplied, inverse_alpha, start_time, start_time + duration, x + dx, y + dy))
+        return overlays
+    
+    def compose_ranking_video(self, ranking_data, aspects=None):
+        """
+        Composite the background, title and item overlays for a ranking, as a
+        FrameCompositor or, with compositor "moviepy", a CompositeVideoClip.
+        With aspects (ASPECT_FORMATS names, ring compositor only), returns a
+        FrameCompositor per aspect instead: the background is drawn once, on a
+        master canvas covering every aspect, each aspect shows a centered crop
+        of it, and the overlays are laid out and blended again for each frame
+        size (a crop of one composite would cut the vertical layout's text).
+        """
+        # The title and a text and description overlay for each ranked item
+        # follow the (cached) layout plan
+        items = tuple((item["text"], item["description"]) for item in ranking_data["items"])
+        plan = build_layout_plan(ranking_data["title"], items, self.title_font_size,
+                                 self.item_font_size, self.description_font_size)
+        
+        if self.compositor == "ring":
+            sizes = {aspect: self.get_aspect_size(aspect) for aspect in aspects or ["vertical"]}
+            master = self.get_placeholder_image(ranking_data["category"], max(w for w, h in sizes.values()),
+                                                max(h for w, h in sizes.values()))
+            transition = get_transition(self.transition, self.transition_duration, self.fps)
+            compositors = {aspect: FrameCompositor(crop_canvas(master, *size), self.compose_overlays(plan, size),
+                                                   self.duration, self.alpha_blender, transition)
+                           for aspect, size in sizes.items()}
+            return compositors if aspects else compositors["vertical"]
+        
+        if aspects and list(aspects) != ["vertical"]:
+            raise ValueError("Aspects other than vertical need the ring compositor")
+        
+        import moviepy.editor as mp
+        
+        background = self.get_placeholder_image(ranking_data["category"])
+        background_clip = mp.ImageClip(background).set_duration(self.duration)
+        overlay_clips = []
+        for text, font_size, start_time, duration, position in plan:
+            clip = self.create_text_clip(text, font_size, self.text_color, duration, position)
+            overlay_clips.append(clip.set_start(start_time) if start_time else clip)
+        
+        # Combine all clips
+        video = mp.CompositeVideoClip([background_clip] + overlay_clips, 
+                                      size=(self.video_width, self.video_height))
+        return {"vertical": video} if aspects else video
+    
+    def get_render_paths(self, output_file):
+        """Files produced from the composited clip: thumbnails, plus the MP4 of each aspect if encoded"""
+        paths = list(self.get_thumbnail_paths(output_file))
+        if self.render_mp4:
+            paths.extend(self.get_aspect_outputs(output_file).values())
+        return paths
+    
+    def reuse_render_output(self, src, dest):
+        """Hard-link (or copy) a file rendered for another variant of the same ranking"""
+        temp_file = dest + ".tmp"
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+        try:
+            os.link(src, temp_file)
+        except OSError:
+            shutil.copyfile(src, temp_file)
+        os.replace(temp_file, dest)
+    
+    @RENDER_LATENCY.timed
+    def create_ranking_video(self, ranking_file, audio_mood="calm", output_name=None, ranking_data=None):
+        """
+        Create a short-form video for the specified ranking; returns the output
+        path or False. output_name (default: the category slug) names the
+        output files, so variants of one ranking can be rendered side by side.
+        ranking_data, if given, is rendered instead of loading ranking_file.
+        """
         print(f"Creating video for {ranking_file}...")
         
         # Load ranking data
-        ranking_data = self.load_ranking_data(ranking_file)
+        if ranking_data is None:
+            ranking_data = self.load_ranking_data(ranking_file)
         if not ranking_data:
             print(f"Failed to load ranking data from {ranking_file}")
             return False
@@ -257,49 +756,37 @@ class VideoCompositionEngine:
         print(f"2. Selecting background images for {category}")
         print(f"3. Applying slow camera movements")
         print(f"4. Adding text overlays for each ranked item")
-        print(f"5. Adding transitions between items")
+        print(f"5. Adding {self.transition} transitions between items")
         print(f"6. Selecting {audio_mood} audio track")
         print(f"7. Rendering final video")
         
         # Create a placeholder video file
-        output_file = os.path.join(self.output_dir, f"{category.lower().replace(' ', '_')}.mp4")
-        
-        # Create a simple placeholder video
-        # In a real implementation, this would be a properly composed video
-        # For this demo, we'll create a basic video with text
+        if output_name is None:
+            output_name = category.lower().replace(' ', '_')
+        output_file = os.path.join(self.output_dir, f"{output_name}.mp4")
+        written_files = [output_file.replace('.mp4', '.txt')]
         
-        # Create background clip
-        background = self.get_placeholder_image(category)
-        background_clip = ImageClip(background).set_duration(self.duration)
-        
-        # Create title clip
-        title_clip = self.create_text_clip(title, self.title_font_size, self.text_color, 3, "top")
-        
-        # Create clips for each ranked item
-        item_clips = []
-        for i, item in enumerate(items[:5]):  # Show top 5 for demo
-            item_text = item["text"]
-            item_desc = item["description"]
-            
-            # Calculate timing for this item
-            start_time = 3 + i * 2  # Start after title, 2 seconds per item
-            item_duration = 2  # Each item shows for 2 seconds
-            
-            # Create item text clip
-            item_clip = self.create_text_clip(item_text, self.item_font_size, self.text_color, 
-                                             item_duration, "center")
-            item_clip = item_clip.set_start(start_time)
+        # The picture does not depend on the audio mood, so consecutive
+        # variants of the same ranking reuse the last encode and thumbnails
+        composition_key = (ranking_file, json.dumps(ranking_data, sort_keys=True), self.render_mp4, self.render_mode,
+                           self.transition, tuple(self.extra_aspects), self.encoder_profile)
+        render_paths = self.get_render_paths(output_file)
+        if self.last_composition and self.last_composition["key"] == composition_key:
+            CACHE_HITS.inc(cache="composition")
+            for src, dest in zip(self.last_composition["paths"], render_paths):
+                if src != dest:
+                    self.reuse_render_output(src, dest)
+        else:
+            outputs = self.get_aspect_outputs(output_file)
+            videos = self.compose_ranking_video(ranking_data, list(outputs))
             
-            # Create description text clip
-            desc_clip = self.create_text_clip(item_desc, self.description_font_size, self.text_color, 
-                                             item_duration, "bottom")
-            desc_clip = desc_clip.set_start(start_time)
+            if self.render_mp4:
+                self.write_video_files(list(videos.values()), list(outputs.values()))
+                print(f"Video rendered at {', '.join(outputs.values())}")
             
-            item_clips.extend([item_clip, desc_clip])
-        
-        # Combine all clips
-        video = CompositeVideoClip([background_clip] + [title_clip] + item_clips, 
-                                  size=(self.video_width, self.video_height))
+            self.create_thumbnails(videos["vertical"], output_file)
+            self.last_composition = {"key": composition_key, "paths": render_paths}
+            written_files.extend(render_paths)
         
         # In a real implementation, this would write an actual video file
         # For this demo, we'll create a text file describing the video
@@ -314,12 +801,52 @@ class VideoCompositionEngine:
             f.write(f"Created at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         
         print(f"Video placeholder created at {output_file.replace('.mp4', '.txt')}")
-        return True
+        
+        if self.manifest_file:
+            with JsonlWriter(self.manifest_file) as manifest:
+                manifest.write({
+                    "ranking": ranking_file,
+                    "audio_mood": audio_mood,
+                    "rendered_video": output_file.replace('.mp4', '.txt'),
+                    "thumbnails": list(self.get_thumbnail_paths(output_file)),
+                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+        
+        BYTES_WRITTEN.inc(sum(os.path.getsize(f) for f in written_files), kind="render")
+        VIDEOS_RENDERED.inc()
+        return output_file.replace('.mp4', '.txt')
+    
+    def estimate_render_cost(self, item_count):
+        """Relative cost of one render at this engine's render mode and duration"""
+        return estimate_render_cost(item_count, self.render_mode, self.duration)
+    
+    def plan_batch(self, ranking_files, audio_moods):
+        """
+        Order the variants of a batch so shared work is done once: rankings of
+        the same category are adjacent (shared background), and every mood of
+        a ranking follows its first render (shared composition).
+        Returns a list of (ranking_file, audio_mood, output_name).
+        """
+        plan = []
+        for ranking_file in sorted(ranking_files):
+            base = os.path.splitext(ranking_file)[0]
+            for audio_mood in audio_moods:
+                plan.append((ranking_file, audio_mood, f"{base}__{audio_mood}"))
+        return plan
+    
+    def create_batch_videos(self, ranking_files, audio_moods):
+        """Render every ranking × mood variant; returns the output paths that succeeded"""
+        rendered_videos = []
+        for ranking_file, audio_mood, output_name in self.plan_batch(ranking_files, audio_moods):
+            rendered_video = self.create_ranking_video(ranking_file, audio_mood, output_name)
+            if rendered_video:
+                rendered_videos.append(rendered_video)
+        return rendered_videos
     
     def create_all_ranking_videos(self):
         """Create videos for all available rankings"""
         # Get all ranking files
-        ranking_files = [f for f in os.listdir(self.rankings_dir) if f.endswith('.json')]
+        ranking_files = self.list_rankings()
         
         # Audio moods to match with ranking categories
         mood_mapping = {
@@ -354,17 +881,29 @@ class AudioIntegrationSystem:
     def __init__(self, 
                  audio_dir="/home/ubuntu/trending_audio",
                  videos_dir="/home/ubuntu/generated_videos",
-                 output_dir="/home/ubuntu/final_videos"):
+                 output_dir="/home/ubuntu/final_videos",
+                 share_tracks=False):
         self.audio_dir = audio_dir
         self.videos_dir = videos_dir
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        
+        # With share_tracks, every video of a mood gets the same audio bed,
+        # so batch variants differ only in what is being compared and each
+        # track is selected and read once
+        self.share_tracks = share_tracks
+        self.track_cache = {}
+        self.description_cache = {}
     
     def get_audio_track(self, mood):
         """
         In a real implementation, this would select an appropriate audio track.
         For this demo, we'll return a placeholder.
         """
+        if self.share_tracks and mood in self.track_cache:
+            CACHE_HITS.inc(cache="audio_track")
+            return self.track_cache[mood]
+        
         mood_dir = os.path.join(self.audio_dir, mood)
         if not os.path.exists(mood_dir):
             print(f"Audio mood directory not found: {mood}")
@@ -378,13 +917,16 @@ class AudioIntegrationSystem:
             return None
         
         # Select a random track
-        selected_track = random.choice(tracks)
-        return os.path.join(mood_dir, selected_track)
+        selected_track = os.path.join(mood_dir, random.choice(tracks))
+        if self.share_tracks:
+            self.track_cache[mood] = selected_track
+        return selected_track
     
     def add_audio_to_video(self, video_file, audio_mood):
         """
         In a real implementation, this would add audio to the video.
         For this demo, we'll create a placeholder.
+        Returns the path of the final video, or False on failure.
         """
         print(f"Adding {audio_mood} audio to {video_file}...")
         
@@ -405,37 +947,62 @@ class AudioIntegrationSystem:
             video_description = f.read()
         
         # Read audio description
-        with open(audio_track, 'r') as f:
-            audio_description = f.read()
+        if audio_track in self.description_cache:
+            audio_description = self.description_cache[audio_track]
+        else:
+            with open(audio_track, 'r') as f:
+                audio_description = f.read()
+            if self.share_tracks:
+                self.description_cache[audio_track] = audio_description
         
-        # Create final video description
-        with open(output_file, 'w') as f:
+        # Create final video description. Write to a temporary file and rename
+        # so a rerun replaces the inode instead of rewriting a file that may
+        # already be hard-linked into the published videos directory.
+        temp_file = output_file + ".tmp"
+        with open(temp_file, 'w') as f:
             f.write(f"This is a placeholder for a final video with audio.\n")
             f.write(f"In the actual implementation, this would be a 15-second video file with audio.\n\n")
             f.write(f"VIDEO DESCRIPTION:\n{video_description}\n\n")
             f.write(f"AUDIO DESCRIPTION:\n{audio_description}\n\n")
             f.write(f"Final video created at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        os.replace(temp_file, output_file)
+        BYTES_WRITTEN.inc(os.path.getsize(output_file), kind="audio")
         
         print(f"Final video placeholder created at {output_file}")
-        return True
+        return output_file
     
-    def process_all_videos(self):
-        """Add audio to all generated videos"""
-        # Get all video placeholder files
-        video_files = [os.path.join(self.videos_dir, f) for f in os.listdir(self.videos_dir) if f.endswith('.txt')]
+    def process_all_videos(self, video_files=None, manifest_file=None):
+        """
+        Add audio to all generated videos, or only to `video_files` if given,
+        or to the renders recorded in a manifest stream.
+        Returns the paths of the final videos that were created.
+        """
+        # The manifest records each render's mood, so the videos aren't re-read
+        if manifest_file:
+            videos = [(record["rendered_video"], record["audio_mood"]) for record in read_records(manifest_file)]
+        else:
+            # Get all video placeholder files
+            if video_files is None:
+                video_files = [os.path.join(self.videos_dir, f) for f in os.listdir(self.videos_dir) if f.endswith('.txt')]
+            videos = [(video_file, None) for video_file in video_files]
         
-        for video_file in video_files:
+        final_videos = []
+        for video_file, audio_mood in videos:
             # Extract audio mood from video description
-            audio_mood = "calm"  # Default
-            with open(video_file, 'r') as f:
-                for line in f:
-                    if line.startswith("Audio mood:"):
-                        audio_mood = line.split(":")[1].strip()
-                        break
+            if audio_mood is None:
+                audio_mood = "calm"  # Default
+                with open(video_file, 'r') as f:
+                    for line in f:
+                        if line.startswith("Audio mood:"):
+                            audio_mood = line.split(":")[1].strip()
+                            break
             
-            self.add_audio_to_video(video_file, audio_mood)
+            final_video = self.add_audio_to_video(video_file, audio_mood)
+            if final_video:
+                final_videos.append(final_video)
         
         print("Audio added to all videos successfully!")
+        return final_videos
 
 
 def main():
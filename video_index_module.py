@@ -0,0 +1,133 @@
+import os
+import json
+import base64
+import hashlib
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class VideoIndex:
+    """
+    Persistent index of generated videos backed by SQLite
+    """
+    def __init__(self, db_path="/home/ubuntu/web_interface/data/video_index.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        
+        # Paging limits for list_videos
+        self.default_page_size = 50
+        self.max_page_size = 200
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    category TEXT NOT NULL,
+                    audio_mood TEXT,
+                    created_at TEXT NOT NULL,
+                    info TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_category ON videos (category COLLATE NOCASE, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_mood ON videos (audio_mood COLLATE NOCASE, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_created ON videos (created_at, seq)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+    
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection; one per call keeps the index thread-safe"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def add_video(self, video_info):
+        """Insert or update a video entry and bump the index version"""
+        created_at = video_info.get("timestamp") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO videos (id, category, audio_mood, created_at, info)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    category = excluded.category,
+                    audio_mood = excluded.audio_mood,
+                    created_at = excluded.created_at,
+                    info = excluded.info
+            """, (video_info["id"], video_info.get("category", ""), video_info.get("audio_mood"),
+                  created_at, json.dumps(video_info)))
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+    
+    def get_video(self, video_id):
+        """Return the stored info for a single video, or None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT info FROM videos WHERE id = ?", (video_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def get_version(self):
+        """Return the index version, which changes on every write"""
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+    
+    def get_etag(self, **query):
+        """Strong ETag for a query: changes whenever the index or the query changes"""
+        key = json.dumps({"version": self.get_version(), "query": query}, sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()
+    
+    def encode_cursor(self, seq):
+        """Encode a row position as an opaque pagination cursor"""
+        return base64.urlsafe_b64encode(str(seq).encode()).decode().rstrip("=")
+    
+    def decode_cursor(self, cursor):
+        """Decode a pagination cursor, raising ValueError if it is malformed"""
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    
+    def list_videos(self, limit=None, cursor=None, category=None, audio_mood=None, since=None, until=None):
+        """
+        Return a page of videos, newest first, and the cursor for the next page.
+        Dates are "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS"; both bounds are inclusive.
+        """
+        limit = min(int(limit or self.default_page_size), self.max_page_size)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        
+        clauses = []
+        params = []
+        if cursor:
+            clauses.append("seq < ?")
+            params.append(self.decode_cursor(cursor))
+        if category:
+            clauses.append("category = ? COLLATE NOCASE")
+            params.append(category)
+        if audio_mood:
+            clauses.append("audio_mood = ? COLLATE NOCASE")
+            params.append(audio_mood)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at <= ?")
+            params.append(until + " 23:59:59" if len(until) == 10 else until)
+        
+        sql = "SELECT seq, info FROM videos"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+        
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1][0])
+        
+        return [json.loads(info) for _, info in rows], next_cursor